@@ -47,7 +47,10 @@ const gatewayStack = new GatewayStack(app, 'FootballMatchDataProcessorGatewaySta
   env: env,
   networkConfig: networkStack.config,
   mskConfig: mskStack.config,
-  storageConfig: storageStack.config
+  storageConfig: storageStack.config,
+
+  ingestDeliveryMode: 'leader', // sync (all replicas ack), leader (leader ack) or async (202 once buffered)
+  ingestWireFormat: 'binary' // binary (compact Kafka records) or json
 });
 
 // Create Application Stack with processing Step Functions
@@ -57,7 +60,12 @@ new FootballMatchDataProcessorStack(app, 'FootballMatchDataProcessorStack', {
   mskConfig: mskStack.config,
   storageConfig: storageStack.config,
 
-  processingBatchSize: 10, // max number of Match events to process in a batch
+  processingBatchSize: 10000, // max number of Match events to process in a batch, large batches go through S3
   processingBatchWindow: 3, // Wait up to X seconds for a larger batch
-  maxProcessingTime: 300 // 5 minutes, increase if Batch size is large
+  maxProcessingTime: 300, // 5 minutes, increase if Batch size is large
+  consumeEventTypes: [], // Event types to process, all if empty
+  countOnlyEventTypes: [], // Event types only counted per match, e.g. ['pass']
+  processingMode: 'workflow', // workflow (Step Functions, auditable) or fused (in-process, fresher stats)
+  processingShardBytes: 131072, // Split workflow batches into shards of up to X bytes of Match events, at most the claim-check threshold
+  processingMaxConcurrency: 8 // Enrich and store up to X shards of a batch in parallel
 });
@@ -1,15 +1,66 @@
 import os
 import json
-from typing import Any, Dict
-from pydantic import ValidationError
+import time
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import TypeAdapter, ValidationError
 
+from compression import choose_compression
+from backpressure import BACKPRESSURE_MAX_RETRY_AFTER, get_retry_after, should_shed
+import fast_validation
 from data_model import MatchEvent
-from util import get_response, get_success_response
+from idempotency import assign_event_id, get_cache, get_idempotency_key
+from metrics import put_metric
+from wire_format import HEADER_ZSTD_DICTIONARY, JSON_WIRE_FORMAT
+import zstd_dictionary
+from util import (get_response, get_success_response, get_accepted_response,
+                  get_overloaded_response, get_batch_response, get_header)
 
 TEST_ENV = os.getenv('FMDP_TEST_ENV')
 MSK_TOPIC_NAME = os.getenv('MSK_TOPIC_NAME')
 MSK_CLUSTER_ARN = os.getenv('MSK_CLUSTER_ARN')
 
+# Bulk ingestion of Match events: POST matches/events
+BATCH_RESOURCE = '/matches/events'
+MAX_BATCH_SIZE = int(os.getenv('INGEST_MAX_BATCH_SIZE', '5000'))
+
+# Delivery modes and Kafka acknowledgements they require:
+# sync - all in-sync replicas acknowledge Match events
+# leader - the partition leader acknowledges Match events
+# async - responds 202 once Match events are buffered by the producer
+DELIVERY_MODES = {
+    'sync': 'all',
+    'leader': 1,
+    'async': 1
+}
+ASYNC_DELIVERY_MODE = 'async'
+DELIVERY_MODE = os.getenv('INGEST_DELIVERY_MODE', 'leader')
+# Overrides the delivery mode of the deployment per request
+DELIVERY_MODE_HEADER = 'X-Delivery-Mode'
+
+# Kafka record value format: json or binary, see wire_format.py
+WIRE_FORMAT = os.getenv('INGEST_WIRE_FORMAT', 'json')
+# Compresses JSON records one by one with a trained zstd dictionary, see
+# zstd_dictionary.py. Disabled if not configured
+ZSTD_DICTIONARY_ID = int(os.getenv('INGEST_ZSTD_DICTIONARY_ID') or 0) or None
+
+# Logs the full API Gateway event of each request, for debugging. Requests
+# are otherwise logged by their request id and body size
+INGEST_LOG_EVENTS = os.getenv('INGEST_LOG_EVENTS', 'false').lower() == 'true'
+
+# Error of a Match event shed under producer overload
+OVERLOADED_ERROR = "Too many requests, retry later"
+
+# Validates Match events of a batch rejected by the fast path
+match_events_adapter = TypeAdapter(List[MatchEvent])
+
+# Import the producer path in the Lambda init phase, which runs with more CPU
+# than invocations. Tests never send Match events to Kafka
+if not TEST_ENV:
+    import kafka_producer
+    if ZSTD_DICTIONARY_ID is not None:
+        zstd_dictionary.load_dictionary(ZSTD_DICTIONARY_ID)
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Ingests incoming events
@@ -17,12 +68,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     :param context: The context data
     :return: The response data
     """
-    print(f"Started ingesting Match event: {event}")
+    if event.get('resource') == BATCH_RESOURCE:
+        return batch_handler(event, context)
+
+    print(f"Started ingesting Match event: {get_request_summary(event)}")
 
-    # Validate Match event
     try:
-        body = json.loads(event['body'])
-        match_event = MatchEvent(**body)
+        delivery_mode = get_delivery_mode(event)
+    except ValueError as ex:
+        return get_response(400,
+                            "Invalid input data",
+                            { "description": str(ex) })
+
+    # Validate Match event on the fast path, errors come from the model
+    try:
+        match_event = fast_validation.validate_json(event['body'])
     except ValidationError as ex:
         description = None
         errors = ex.errors()
@@ -33,24 +93,72 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return get_response(400,
                             "Invalid input data",
                             { "description": description })
+
+    # Retries of an ingested Match event get the original event_id
+    idempotency_key = get_idempotency_key(event, match_event)
+    if idempotency_key is not None:
+        event_id = get_cache().get(idempotency_key)
+        if event_id is not None:
+            report_duplicate_events([match_event])
+            if delivery_mode == ASYNC_DELIVERY_MODE:
+                return get_accepted_response({
+                    "event_id": event_id})
+            return get_success_response({
+                "event_id": event_id})
+        assign_event_id(match_event, idempotency_key)
     
     if TEST_ENV:
         print(f"Test environment enabled")
+        remember_match_events([(idempotency_key, match_event)])
+        if delivery_mode == ASYNC_DELIVERY_MODE:
+            return get_accepted_response({
+                "event_id": match_event.event_id})
         return get_success_response({
             "event_id": match_event.event_id})
     
     # Send Kafka message
+    acks = DELIVERY_MODES[delivery_mode]
     try:
-        from kafka_producer import KafkaProducerContext
-        from kafka.errors import KafkaError
+        from kafka_producer import get_producer_context, reset_producer_context
+        from kafka.errors import KafkaError, KafkaTimeoutError
+
+        producer = get_producer_context(MSK_CLUSTER_ARN, acks)
 
-        with KafkaProducerContext(MSK_CLUSTER_ARN) as producer:
-            match_event_dict = match_event.model_dump()
+        # Fail fast instead of blocking in send while MSK is slow
+        load = producer.get_load()
+        if should_shed(load, match_event.event_type):
+            report_shed_events([match_event], load)
+            return get_overloaded_response(
+                get_retry_after(load, match_event.event_type),
+                { "event_id": match_event.event_id })
 
-            record_metadata = producer.send(MSK_TOPIC_NAME,
-                                            json.dumps(match_event_dict))
+        _, value, headers = get_message(match_event, int(time.time() * 1000))
+
+        if delivery_mode == ASYNC_DELIVERY_MODE:
+            future = producer.send_async(MSK_TOPIC_NAME, value,
+                                         partial(report_delivery_error, match_event,
+                                                 idempotency_key),
+                                         key=match_event.key_bytes(),
+                                         headers=headers)
+            print(f"Buffered Kafka message: {match_event.event_id}")
+            # Remembered before the flush, a delivery error forgets the Match event
+            remember_match_events([(idempotency_key, match_event)])
+            flush_async_messages(producer, [(future, match_event)])
+            return get_accepted_response({
+                "event_id": match_event.event_id})
+
+        record_metadata = producer.send(MSK_TOPIC_NAME, value,
+                                        key=match_event.key_bytes(),
+                                        headers=headers)
+    except KafkaTimeoutError as ex:
+        # No buffer memory within max_block_ms, the producer is overloaded
+        print(f"Kafka producer timeout: {ex}")
+        report_shed_events([match_event], None)
+        return get_overloaded_response(BACKPRESSURE_MAX_RETRY_AFTER,
+                                       { "event_id": match_event.event_id })
     except KafkaError as ex:
         print(f"Kafka producer error: {ex}")
+        reset_producer_context(acks) # Reconnect on the next invocation
         raise ex # Internal server error
     else:
         extra = {
@@ -59,6 +167,396 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             "offset": record_metadata.offset
         }
         print(f"Sent Kafka message: {extra}")
+        remember_match_events([(idempotency_key, match_event)])
 
     return get_success_response({
         "event_id": match_event.event_id})
+
+def batch_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Ingests a batch of incoming events
+    The body is either a JSON array or NDJSON (one Match event per line)
+    :param event: The event data
+    :param context: The context data
+    :return: The response data
+    """
+    body = event.get('body') or ''
+    print(f"Started ingesting a batch of Match events: {get_request_summary(event)}")
+
+    try:
+        delivery_mode = get_delivery_mode(event)
+    except ValueError as ex:
+        return get_response(400,
+                            "Invalid input data",
+                            { "description": str(ex) })
+
+    # Parse a batch of Match events, oversized batches are rejected before
+    # any Match event is validated
+    try:
+        items, errors = parse_batch_body(body)
+    except ValueError as ex:
+        print(f"Input parsing error: {ex}")
+        return get_response(400,
+                            "Invalid input data",
+                            { "description": "Body must be a JSON array or NDJSON" })
+
+    if len(items) > MAX_BATCH_SIZE:
+        return get_response(413,
+                            "Batch too large",
+                            { "description": f"Batch must contain at most {MAX_BATCH_SIZE} Match events" })
+
+    match_events = validate_batch(items, errors)
+    valid_events = [
+        (index, match_event) for index, match_event in enumerate(match_events)
+        if match_event is not None
+    ]
+    print(f"Validated Match events: {len(valid_events)} of {len(match_events)}")
+
+    if not valid_events:
+        return get_batch_response(400, "Invalid input data", match_events, errors)
+
+    # Retries of ingested Match events get the original event_ids
+    valid_events, idempotency_keys = deduplicate_batch(valid_events)
+    if not valid_events:
+        if delivery_mode == ASYNC_DELIVERY_MODE:
+            return get_batch_response(202, "Match events accepted", match_events, errors)
+        return get_batch_response(200, "Match events ingested OK", match_events, errors)
+
+    if TEST_ENV:
+        print(f"Test environment enabled")
+        remember_match_events([
+            (idempotency_keys.get(index), match_event) for index, match_event in valid_events
+        ])
+        if delivery_mode == ASYNC_DELIVERY_MODE:
+            return get_batch_response(202, "Match events accepted", match_events, errors)
+        return get_batch_response(200, "Match events ingested OK", match_events, errors)
+
+    # Send Kafka messages, a single flush for the whole batch
+    acks = DELIVERY_MODES[delivery_mode]
+    response_headers = None
+    try:
+        from kafka_producer import get_producer_context, reset_producer_context
+        from kafka.errors import KafkaError, KafkaTimeoutError
+
+        # Bulk requests are compressed, the codec depends on the request size.
+        # Records compressed with a dictionary gain little from batch compression
+        compression_type = None
+        if ZSTD_DICTIONARY_ID is None:
+            compression_type = choose_compression(len(valid_events), len(body))
+        producer = get_producer_context(MSK_CLUSTER_ARN, acks, compression_type)
+
+        # Shed passes before goals and fouls while MSK is slow
+        load = producer.get_load()
+        shed_events = [
+            (index, match_event) for index, match_event in valid_events
+            if should_shed(load, match_event.event_type)
+        ]
+        if shed_events:
+            report_shed_events([match_event for _, match_event in shed_events], load)
+            for index, _ in shed_events:
+                match_events[index] = None
+                errors[index] = OVERLOADED_ERROR
+            valid_events = [
+                (index, match_event) for index, match_event in valid_events
+                if match_events[index] is not None
+            ]
+            response_headers = { "Retry-After": str(get_retry_after(load)) }
+            if not valid_events:
+                return get_batch_response(429, OVERLOADED_ERROR, match_events,
+                                          errors, response_headers)
+
+        messages = get_batch_messages(
+            [match_event for _, match_event in valid_events])
+
+        if delivery_mode == ASYNC_DELIVERY_MODE:
+            buffered = []
+            for (index, match_event), (key, value, headers) in zip(valid_events, messages):
+                future = producer.send_async(MSK_TOPIC_NAME, value,
+                                             partial(report_delivery_error, match_event,
+                                                     idempotency_keys.get(index)),
+                                             key=key,
+                                             headers=headers)
+                buffered.append((future, match_event))
+            print(f"Buffered Kafka messages: {len(valid_events)}")
+            # Remembered before the flush, delivery errors forget Match events
+            remember_match_events([
+                (idempotency_keys.get(index), match_event) for index, match_event in valid_events
+            ])
+            flush_async_messages(producer, buffered)
+            return get_batch_response(202, "Match events accepted", match_events,
+                                      errors, response_headers)
+
+        results = producer.send_batch(MSK_TOPIC_NAME, messages)
+    except KafkaTimeoutError as ex:
+        # No buffer memory within max_block_ms, the producer is overloaded
+        print(f"Kafka producer timeout: {ex}")
+        report_shed_events([match_event for _, match_event in valid_events], None)
+        return get_response(429, OVERLOADED_ERROR, None,
+                            { "Retry-After": str(BACKPRESSURE_MAX_RETRY_AFTER) })
+    except KafkaError as ex:
+        print(f"Kafka producer error: {ex}")
+        reset_producer_context(acks) # Reconnect on the next invocation
+        raise ex # Internal server error
+
+    for (index, match_event), result in zip(valid_events, results):
+        if isinstance(result, Exception):
+            print(f"Kafka producer error: {result}")
+            match_events[index] = None
+            errors[index] = "Failed to send Match event"
+        else:
+            remember_match_events([(idempotency_keys.get(index), match_event)])
+
+    sent = sum(1 for result in results if not isinstance(result, Exception))
+    if not sent:
+        reset_producer_context(acks) # Reconnect on the next invocation
+        raise results[0] # Internal server error
+    print(f"Sent Kafka messages: {sent} of {len(results)}")
+
+    return get_batch_response(200, "Match events ingested OK", match_events,
+                              errors, response_headers)
+
+def get_batch_messages(match_events: List[MatchEvent]) -> List[Tuple[bytes, bytes, List[Tuple[str, bytes]]]]:
+    """
+    Returns Kafka messages of a batch of Match events
+    All messages of the batch share the ingest timestamp
+    :param match_events: Match events
+    :return: Message keys, values and headers
+    """
+    ingest_timestamp_ms = int(time.time() * 1000)
+    return [get_message(match_event, ingest_timestamp_ms) for match_event in match_events]
+
+def get_message(match_event: MatchEvent,
+                ingest_timestamp_ms: int) -> Tuple[bytes, bytes, List[Tuple[str, bytes]]]:
+    """
+    Returns the Kafka message of a Match event
+    JSON values are compressed if a zstd dictionary is configured
+    :param match_event: Match event
+    :param ingest_timestamp_ms: Ingest time in epoch milliseconds
+    :return: Message key, value and headers
+    """
+    value = match_event.to_wire_bytes(WIRE_FORMAT)
+    # The schema header describes the value before compression
+    headers = match_event.record_headers(value, ingest_timestamp_ms)
+    if ZSTD_DICTIONARY_ID is not None and WIRE_FORMAT == JSON_WIRE_FORMAT:
+        value = zstd_dictionary.compress(value, ZSTD_DICTIONARY_ID)
+        headers.append((HEADER_ZSTD_DICTIONARY, str(ZSTD_DICTIONARY_ID).encode('utf-8')))
+    return match_event.key_bytes(), value, headers
+
+def get_request_summary(event: Dict[str, Any]) -> Any:
+    """
+    Returns what is logged of a request
+    :param event: The event data
+    :return: The event data if INGEST_LOG_EVENTS is enabled, otherwise the
+        request id and the body size in bytes
+    """
+    if INGEST_LOG_EVENTS:
+        return event
+    return {
+        "request_id": (event.get('requestContext') or {}).get('requestId'),
+        "bytes": len(event.get('body') or '')
+    }
+
+def get_delivery_mode(event: Dict[str, Any]) -> str:
+    """
+    Returns the delivery mode of the request
+    :param event: The event data
+    :return: Delivery mode from the request header or of the deployment
+    :raises ValueError: If the delivery mode is not supported
+    """
+    delivery_mode = get_header(event, DELIVERY_MODE_HEADER) or DELIVERY_MODE
+    delivery_mode = delivery_mode.strip().lower()
+    if delivery_mode not in DELIVERY_MODES:
+        raise ValueError(f"Delivery mode must be one of {list(DELIVERY_MODES)}")
+    return delivery_mode
+
+def deduplicate_batch(valid_events: List[Tuple[int, MatchEvent]]) -> Tuple[List[Tuple[int, MatchEvent]], Dict[int, str]]:
+    """
+    Finds retries of ingested Match events and duplicates within a batch
+    Duplicates get the event_id of the original Match event
+    :param valid_events: Match events by item index
+    :return: Match events to send by item index, and their idempotency keys
+        by item index
+    """
+    cache = get_cache()
+    batch_events: Dict[str, MatchEvent] = {}
+    new_events = []
+    duplicates = []
+    idempotency_keys = {}
+    for index, match_event in valid_events:
+        key = get_idempotency_key(None, match_event)
+        if key is None:
+            new_events.append((index, match_event))
+            continue
+
+        event_id = cache.get(key)
+        if event_id is None and key in batch_events:
+            event_id = batch_events[key].event_id
+        if event_id is not None:
+            match_event.event_id = event_id
+            duplicates.append(match_event)
+            continue
+
+        assign_event_id(match_event, key)
+        batch_events[key] = match_event
+        idempotency_keys[index] = key
+        new_events.append((index, match_event))
+
+    if duplicates:
+        report_duplicate_events(duplicates)
+    return new_events, idempotency_keys
+
+def remember_match_events(match_events: List[Tuple[Optional[str], MatchEvent]]) -> None:
+    """
+    Remembers ingested Match events, their retries get the same event_id
+    :param match_events: Idempotency keys and Match events
+    """
+    cache = get_cache()
+    for key, match_event in match_events:
+        if key is not None:
+            cache.put(key, match_event.event_id)
+
+def put_event_type_metric(name: str, match_events: List[MatchEvent]) -> None:
+    """
+    Publishes a count metric of Match events per event type
+    :param name: Metric name
+    :param match_events: Match events to count
+    """
+    counts: Dict[str, int] = {}
+    for match_event in match_events:
+        counts[match_event.event_type] = counts.get(match_event.event_type, 0) + 1
+    for event_type, count in counts.items():
+        put_metric(name, count, dimensions={ "EventType": event_type })
+
+def report_duplicate_events(match_events: List[MatchEvent]) -> None:
+    """
+    Reports retries of ingested Match events which are not sent again
+    :param match_events: Duplicate Match events
+    """
+    print(f"Duplicate Match events: {[match_event.event_id for match_event in match_events]}")
+    put_event_type_metric("DuplicateEvents", match_events)
+
+def flush_async_messages(producer: Any, buffered: List[Tuple[Any, MatchEvent]]) -> None:
+    """
+    Sends the messages of an async request before it responds
+    Lambda freezes the sandbox after the response and may reclaim it without
+    SIGTERM, buffered messages would be lost without a delivery error. The
+    wait is bounded by KAFKA_ASYNC_FLUSH_MS, messages still buffered after it
+    are sent if the sandbox serves another request and are reported as the
+    UnflushedEvents metric
+    :param producer: Kafka producer context
+    :param buffered: Kafka futures and Match events of the request
+    """
+    from kafka_producer import KAFKA_ASYNC_FLUSH_MS
+
+    if producer.flush(KAFKA_ASYNC_FLUSH_MS / 1000):
+        return
+
+    unflushed = [match_event for future, match_event in buffered if not future.is_done]
+    print(f"Kafka messages still buffered: {[match_event.event_id for match_event in unflushed]}")
+    put_event_type_metric("UnflushedEvents", unflushed)
+
+def report_delivery_error(match_event: MatchEvent, idempotency_key: Optional[str],
+                          ex: Exception) -> None:
+    """
+    Reports a Match event that failed to be delivered asynchronously
+    The Match event is forgotten, a retry of the client is sent again
+    :param match_event: Match event
+    :param idempotency_key: Idempotency key of the Match event
+    :param ex: Delivery error
+    """
+    print(f"Kafka delivery error: {match_event.event_id}, {ex}")
+    if idempotency_key is not None:
+        get_cache().discard(idempotency_key)
+    put_metric("DeliveryErrors", 1,
+               dimensions={ "EventType": match_event.event_type })
+
+def report_shed_events(match_events: List[MatchEvent], load: Optional[float]) -> None:
+    """
+    Reports Match events shed under producer overload
+    :param match_events: Shed Match events
+    :param load: Producer load, None if the producer timed out
+    """
+    extra = {
+        "load": load,
+        "events": len(match_events)
+    }
+    print(f"Shedding Match events: {extra}")
+    put_event_type_metric("ShedEvents", match_events)
+
+def validate_batch_body(body: str) -> Tuple[List[Optional[MatchEvent]], Dict[int, str]]:
+    """
+    Validates a batch of Match events from a JSON array or NDJSON body
+    :param body: Request body
+    :return: Match events by item index, None for invalid items, and errors by item index
+    :raises ValueError: If the body is neither a JSON array nor NDJSON
+    """
+    items, errors = parse_batch_body(body)
+    return validate_batch(items, errors), errors
+
+def parse_batch_body(body: str) -> Tuple[List[Any], Dict[int, str]]:
+    """
+    Parses a batch of Match events from a JSON array or NDJSON body
+    :param body: Request body
+    :return: Parsed items and parsing errors by item index
+    :raises ValueError: If the body is neither a JSON array nor NDJSON
+    """
+    if body.lstrip().startswith('['):
+        items = json.loads(body)
+        if not isinstance(items, list):
+            raise ValueError("JSON body must be an array")
+        return items, {}
+
+    items: List[Any] = []
+    errors: Dict[int, str] = {}
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            errors[len(items)] = "Invalid JSON"
+            items.append(None)
+
+    if not items:
+        raise ValueError("Body contains no Match events")
+    return items, errors
+
+def validate_batch(items: List[Any],
+                   errors: Dict[int, str]) -> List[Optional[MatchEvent]]:
+    """
+    Validates a batch of Match events on the fast path
+    Match events the fast path rejects are validated by the model in a single
+    pass, only the failing rest is validated again without the invalid items
+    :param items: Parsed Match events
+    :param errors: Errors by item index, updated with validation errors
+    :return: Match events by item index, None for invalid items
+    """
+    match_events: List[Optional[MatchEvent]] = [None] * len(items)
+    candidates = []
+    for index, item in enumerate(items):
+        if index in errors:
+            continue
+        match_event = fast_validation.validate_python(item)
+        if match_event is None:
+            candidates.append(index)
+        else:
+            match_events[index] = match_event
+
+    if not candidates:
+        return match_events
+
+    try:
+        validated = match_events_adapter.validate_python(
+            [items[index] for index in candidates])
+    except ValidationError as ex:
+        for error in ex.errors():
+            # The first error of an item is reported, as for a single Match event
+            errors.setdefault(candidates[error['loc'][0]], error['msg'])
+
+        candidates = [index for index in candidates if index not in errors]
+        validated = match_events_adapter.validate_python(
+            [items[index] for index in candidates])
+
+    for index, match_event in zip(candidates, validated):
+        match_events[index] = match_event
+    return match_events
@@ -0,0 +1,82 @@
+import os
+import math
+from typing import Any
+
+# Producer load above which Match events are shed with 429 Too Many Requests
+# Load is the larger of the buffer memory in use and the in-flight batches,
+# each relative to its limit
+BACKPRESSURE_THRESHOLD = float(os.getenv('BACKPRESSURE_THRESHOLD', '0.8'))
+# Goals and fouls are shed last, passes are shed first
+BACKPRESSURE_PRIORITY_THRESHOLD = float(os.getenv('BACKPRESSURE_PRIORITY_THRESHOLD', '0.95'))
+PRIORITY_EVENT_TYPES = frozenset(["goal", "foul"])
+# Max batches buffered or awaiting acknowledgement by the producer
+BACKPRESSURE_MAX_IN_FLIGHT_BATCHES = int(os.getenv('BACKPRESSURE_MAX_IN_FLIGHT_BATCHES', '512'))
+# Retry-After range in seconds, longer the more the producer is overloaded
+BACKPRESSURE_MIN_RETRY_AFTER = 1
+BACKPRESSURE_MAX_RETRY_AFTER = int(os.getenv('BACKPRESSURE_MAX_RETRY_AFTER', '10'))
+
+def get_producer_load(producer: Any) -> float:
+    """
+    Returns the load of a Kafka producer from its record accumulator
+    :param producer: Kafka producer
+    :return: Load, 0 when idle and 1 or more when sends would block
+    """
+    # Private attributes of the vendored client, see test_backpressure.py.
+    # Load parts a new client does not expose count as idle, nothing is shed
+    accumulator = getattr(producer, '_accumulator', None)
+    if accumulator is None:
+        return 0.0
+    pool = getattr(accumulator, '_free', None)
+    free_buffers = getattr(pool, '_free', None)
+
+    # The buffer pool holds buffer_memory / batch_size free buffers when idle
+    total_buffers = int(accumulator.config['buffer_memory'] /
+                        accumulator.config['batch_size'])
+    buffer_load = 0.0
+    if getattr(pool, '_waiters', None):
+        buffer_load = 1.0 # Senders already wait for free memory
+    elif total_buffers and free_buffers is not None:
+        buffer_load = 1.0 - len(free_buffers) / total_buffers
+
+    incomplete = getattr(accumulator, '_incomplete', None)
+    in_flight_load = 0.0
+    if incomplete is not None:
+        in_flight_load = len(incomplete.all()) / BACKPRESSURE_MAX_IN_FLIGHT_BATCHES
+    return max(buffer_load, in_flight_load)
+
+def get_threshold(event_type: str) -> float:
+    """
+    Returns the producer load above which Match events of a type are shed
+    :param event_type: Event type
+    :return: Load threshold
+    """
+    if event_type in PRIORITY_EVENT_TYPES:
+        return BACKPRESSURE_PRIORITY_THRESHOLD
+    return BACKPRESSURE_THRESHOLD
+
+def should_shed(load: float, event_type: str) -> bool:
+    """
+    Checks if a Match event should be rejected to relieve the producer
+    :param load: Producer load
+    :param event_type: Event type
+    :return: True if the Match event should be rejected
+    """
+    return load >= get_threshold(event_type)
+
+def get_retry_after(load: float, event_type: str = None) -> int:
+    """
+    Computes how long a client should wait before retrying a shed Match event
+    Scales linearly from the min at the threshold to the max at full load
+    :param load: Producer load
+    :param event_type: Event type, the lowest threshold is used if not given
+    :return: Retry-After in seconds
+    """
+    threshold = get_threshold(event_type) if event_type else BACKPRESSURE_THRESHOLD
+    if threshold >= 1.0:
+        overload = 1.0
+    else:
+        overload = (load - threshold) / (1.0 - threshold)
+    overload = min(max(overload, 0.0), 1.0)
+
+    return math.ceil(BACKPRESSURE_MIN_RETRY_AFTER +
+                     overload * (BACKPRESSURE_MAX_RETRY_AFTER - BACKPRESSURE_MIN_RETRY_AFTER))
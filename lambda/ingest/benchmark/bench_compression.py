@@ -0,0 +1,131 @@
+"""
+Benchmark of Kafka record batch compression codecs
+Builds the record batches the producer sends for requests of Match events
+with each available codec and reports the compression ratio, compress and
+decompress throughput and producer CPU time per Match event
+
+Run: PYTHONPATH=..:../../process/shared python bench_compression.py [--batch-sizes N,N,...]
+     [--rounds N]
+"""
+import time
+import argparse
+from typing import Callable, Dict, List, Tuple
+
+from data_model import MatchEvent
+from compression import choose_compression, get_available_codecs
+from kafka.record.default_records import DefaultRecordBatch, DefaultRecordBatchBuilder
+from bench_serialization import make_bodies
+
+CODECS = {
+    'none': DefaultRecordBatchBuilder.CODEC_NONE,
+    'gzip': DefaultRecordBatchBuilder.CODEC_GZIP,
+    'snappy': DefaultRecordBatchBuilder.CODEC_SNAPPY,
+    'lz4': DefaultRecordBatchBuilder.CODEC_LZ4,
+    'zstd': DefaultRecordBatchBuilder.CODEC_ZSTD
+}
+# Room for the largest benchmarked batch, the producer splits larger requests
+MAX_BATCH_BYTES = 64 * 1024 * 1024
+
+def make_records(count: int) -> List[Tuple[bytes, bytes, List[Tuple[str, bytes]]]]:
+    """
+    Serializes Match events the way the ingest handler does
+    :param count: Number of Match events
+    :return: Key, value and headers per Match event
+    """
+    timestamp_ms = int(time.time() * 1000)
+    records = []
+    for body in make_bodies(count):
+        match_event = MatchEvent.model_validate_json(body)
+        value = match_event.to_wire_bytes()
+        records.append((match_event.key_bytes(), value,
+                        match_event.record_headers(value, timestamp_ms)))
+    return records
+
+def build_batch(records: List[Tuple[bytes, bytes, List[Tuple[str, bytes]]]],
+                codec: int) -> bytearray:
+    """
+    Builds a record batch like the producer, without idempotence or transactions
+    :param records: Key, value and headers per Match event
+    :param codec: Codec id of the record batch
+    :return: Record batch bytes
+    """
+    builder = DefaultRecordBatchBuilder(
+        magic=2, compression_type=codec, is_transactional=False,
+        producer_id=-1, producer_epoch=-1, base_sequence=-1,
+        batch_size=MAX_BATCH_BYTES)
+    timestamp_ms = int(time.time() * 1000)
+    for offset, (key, value, headers) in enumerate(records):
+        builder.append(offset, timestamp_ms, key, value, headers)
+    return builder.build()
+
+def read_batch(buffer: bytearray) -> int:
+    """
+    Decompresses and reads a record batch like the consumer
+    :param buffer: Record batch bytes
+    :return: Number of records
+    """
+    return sum(1 for _ in DefaultRecordBatch(bytes(buffer)))
+
+def measure(operation: Callable[[], object], rounds: int) -> float:
+    """
+    Measures the best CPU time of an operation
+    :return: CPU time in seconds
+    """
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.process_time()
+        operation()
+        best = min(best, time.process_time() - started)
+    return max(best, 1e-9)
+
+def run(batch_sizes: List[int], rounds: int) -> List[Dict]:
+    """
+    Measures each available codec for each batch size
+    :return: Result per batch size and codec
+    """
+    results = []
+    for batch_size in batch_sizes:
+        records = make_records(batch_size)
+        uncompressed = len(build_batch(records, CODECS['none']))
+        for name in ['none'] + get_available_codecs():
+            codec = CODECS[name]
+            buffer = build_batch(records, codec)
+            assert read_batch(buffer) == batch_size
+
+            build_seconds = measure(lambda: build_batch(records, codec), rounds)
+            read_seconds = measure(lambda: read_batch(buffer), rounds)
+            results.append({
+                "batch_size": batch_size,
+                "codec": name,
+                "bytes": len(buffer),
+                "ratio": uncompressed / len(buffer),
+                "compress_mb_s": uncompressed / build_seconds / 1e6,
+                "decompress_mb_s": uncompressed / read_seconds / 1e6,
+                "cpu_us_per_event": build_seconds / batch_size * 1e6
+            })
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-sizes', default='1,10,100,1000',
+                        help="comma-separated Match events per record batch")
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+    print(f"Available codecs: {', '.join(get_available_codecs())}")
+    print(f"{'events':>7} {'codec':>7} {'bytes':>10} {'ratio':>6} "
+          f"{'comp MB/s':>10} {'decomp MB/s':>12} {'CPU us/event':>13}")
+    for result in run(batch_sizes, args.rounds):
+        print(f"{result['batch_size']:7d} {result['codec']:>7} {result['bytes']:10d} "
+              f"{result['ratio']:6.2f} {result['compress_mb_s']:10.1f} "
+              f"{result['decompress_mb_s']:12.1f} {result['cpu_us_per_event']:13.2f}")
+
+    print("Policy choice per request size:")
+    for batch_size in batch_sizes:
+        body_bytes = sum(len(body) + 1 for body in make_bodies(batch_size))
+        print(f"  {batch_size:7d} events, {body_bytes:8d} bytes: "
+              f"{choose_compression(batch_size, body_bytes) or 'none'}")
+
+if __name__ == '__main__':
+    main()
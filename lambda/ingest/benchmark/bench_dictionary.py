@@ -0,0 +1,86 @@
+"""
+Benchmark of per-record compression of Match events
+Trains a zstd dictionary on a generated corpus and compares it with plain
+zstd and gzip of the Kafka codecs on single records, as sent at linger_ms=0.
+Reports bytes per record, compression ratio and CPU time per record
+
+Run: PYTHONPATH=..:../../process/shared python bench_dictionary.py [--train-events N]
+     [--events N] [--size BYTES]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from typing import Callable, Dict, List
+
+# Dictionaries of the benchmark are written to a scratch directory
+os.environ['ZSTD_DICTIONARY_DIR'] = tempfile.mkdtemp(prefix='zstd_dictionaries_')
+
+from data_model import MatchEvent
+from kafka import codec
+import zstd_dictionary
+from bench_serialization import make_bodies
+from train_zstd_dictionary import write_dictionary
+
+def measure(operation: Callable[[bytes], bytes], values: List[bytes],
+            rounds: int) -> float:
+    """
+    Measures the best CPU time per record of an operation
+    :return: CPU time per record in microseconds
+    """
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.process_time()
+        for value in values:
+            operation(value)
+        best = min(best, time.process_time() - started)
+    return best / len(values) * 1e6
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--train-events', type=int, default=20000)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--size', type=int, default=4096,
+                        help="max dictionary size in bytes")
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    if not codec.has_zstd():
+        sys.exit("Install the zstandard package to run the benchmark")
+
+    # Match events of the measured corpus are not in the training samples
+    values = [
+        MatchEvent.model_validate_json(body).to_json_bytes()
+        for body in make_bodies(args.train_events + args.events)
+    ]
+    samples, values = values[:args.train_events], values[args.train_events:]
+    path = write_dictionary(samples, args.size, zstd_dictionary.ZSTD_DICTIONARY_DIR)
+    dictionary_id = zstd_dictionary.load_dictionary(
+        int(os.path.basename(path).split('.')[0])).dict_id()
+
+    codecs: Dict[str, List[Callable[[bytes], bytes]]] = {
+        'gzip': [codec.gzip_encode, codec.gzip_decode],
+        'zstd': [codec.zstd_encode, codec.zstd_decode],
+        'zstd+dict': [
+            lambda value: zstd_dictionary.compress(value, dictionary_id),
+            lambda value: zstd_dictionary.decompress(value, dictionary_id)
+        ]
+    }
+
+    raw_bytes = sum(len(value) for value in values)
+    print(f"Match events: {len(values)}, {raw_bytes / len(values):.1f} bytes per record, "
+          f"dictionary: {os.path.getsize(path)} bytes")
+    print(f"{'codec':>10} {'bytes/record':>13} {'ratio':>6} "
+          f"{'compress us':>12} {'decompress us':>14}")
+    for name, (encode, decode) in codecs.items():
+        compressed = [encode(value) for value in values]
+        assert [decode(value) for value in compressed] == values
+        compressed_bytes = sum(len(value) for value in compressed)
+        print(f"{name:>10} {compressed_bytes / len(values):13.1f} "
+              f"{raw_bytes / compressed_bytes:6.2f} "
+              f"{measure(encode, values, args.rounds):12.2f} "
+              f"{measure(decode, compressed, args.rounds):14.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark of the ingest serialization path
+Compares CPU time per Match event of the former dict round-trips with
+the single-serialization path from the request body to Kafka bytes
+
+Run: PYTHONPATH=..:../../process/shared python bench_serialization.py [--events N]
+"""
+import json
+import time
+import argparse
+from typing import Callable, List
+
+from data_model import MatchEvent
+
+def make_bodies(count: int) -> List[str]:
+    """
+    Generates request bodies of Match events
+    :param count: Number of Match events
+    :return: JSON request bodies
+    """
+    event_types = ["goal", "pass", "foul"]
+    return [
+        json.dumps({
+            "match_id": f"{index % 380:06d}",
+            "event_type": event_types[index % len(event_types)],
+            "team": f"Team {index % 20}",
+            "player": f"Player {index % 25}",
+            "timestamp": f"2024-10-15T14:{index // 60 % 60:02d}:{index % 60:02d}Z"
+        })
+        for index in range(count)
+    ]
+
+def dict_round_trips(body: str) -> bytes:
+    # json.loads -> MatchEvent(**body) -> model_dump -> json.dumps -> encode
+    match_event = MatchEvent(**json.loads(body))
+    return json.dumps(match_event.model_dump()).encode('utf-8')
+
+def single_serialization(body: str) -> bytes:
+    # model_validate_json -> to_json_bytes
+    return MatchEvent.model_validate_json(body).to_json_bytes()
+
+def measure(path: Callable[[str], bytes], bodies: List[str], rounds: int) -> float:
+    """
+    Measures the best CPU time per Match event of a serialization path
+    :param path: Serialization path
+    :param bodies: Request bodies
+    :param rounds: Number of measurement rounds
+    :return: CPU time per Match event in microseconds
+    """
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.process_time()
+        for body in bodies:
+            path(body)
+        best = min(best, time.process_time() - started)
+    return best / len(bodies) * 1e6
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    bodies = make_bodies(args.events)
+    before = measure(dict_round_trips, bodies, args.rounds)
+    after = measure(single_serialization, bodies, args.rounds)
+
+    print(f"Match events: {args.events}, rounds: {args.rounds}")
+    print(f"dict round-trips:     {before:8.2f} us CPU per event")
+    print(f"single serialization: {after:8.2f} us CPU per event")
+    print(f"speedup:              {before / after:8.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Load benchmark of the standalone ingest server
+Sends Match events over concurrent keep-alive connections to an in-process
+server whose producer is replaced by a stand-in broker that acknowledges
+messages after a fixed latency
+
+Run: PYTHONPATH=..:../../process/shared python bench_server.py [--connections N] [--requests N]
+     [--batch-size N] [--ack-ms N]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import itertools
+import threading
+import contextlib
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, List, Tuple
+
+import kafka_producer
+from server import SINGLE_RESOURCE, IngestServer
+from app import BATCH_RESOURCE, DELIVERY_MODES
+from compression import get_available_codecs
+
+class StandInProducerContext:
+    """
+    Stand-in broker in place of the Kafka producer context
+    Acknowledges every send after a fixed latency
+    """
+    def __init__(self, ack_ms: float) -> None:
+        self.ack_seconds = ack_ms / 1000
+        self.sent = 0
+        self.lock = threading.Lock()
+
+    def is_healthy(self) -> bool:
+        return True
+
+    def get_load(self) -> float:
+        return 0.0
+
+    def close(self, timeout: float = None) -> None:
+        pass
+
+    def send(self, topic_name: str, value: bytes, key: bytes = None,
+             headers: List[Tuple[str, bytes]] = None) -> Any:
+        time.sleep(self.ack_seconds)
+        return self._acknowledge(topic_name, 1)
+
+    def send_batch(self, topic_name: str, messages: List[Any]) -> List[Any]:
+        time.sleep(self.ack_seconds)
+        return [self._acknowledge(topic_name, 1) for _ in messages]
+
+    def send_async(self, topic_name: str, value: bytes, errback: Any,
+                   key: bytes = None, headers: List[Tuple[str, bytes]] = None) -> Any:
+        return self._acknowledge(topic_name, 1)
+
+    def _acknowledge(self, topic_name: str, count: int) -> Any:
+        with self.lock:
+            self.sent += count
+            offset = self.sent
+        return SimpleNamespace(topic=topic_name, partition=0, offset=offset)
+
+# Unique timestamps, Match events are not deduplicated by their natural key
+_seconds = itertools.count()
+START_TIME = datetime(2024, 10, 15, tzinfo=timezone.utc)
+
+def make_body(index: int, batch_size: int) -> str:
+    """
+    Generates a request body of Match events
+    :param index: Request index
+    :param batch_size: Match events per request, 0 for a single Match event
+    :return: JSON request body
+    """
+    event_types = ["goal", "pass", "foul"]
+    events = [
+        {
+            "match_id": f"{(index + item) % 380:06d}",
+            "event_type": event_types[(index + item) % len(event_types)],
+            "team": f"Team {item % 20}",
+            "player": f"Player {item % 25}",
+            "timestamp": (START_TIME + timedelta(seconds=next(_seconds)))
+                .strftime('%Y-%m-%dT%H:%M:%SZ')
+        }
+        for item in range(max(batch_size, 1))
+    ]
+    if not batch_size:
+        return json.dumps(events[0])
+    return '\n'.join(json.dumps(event) for event in events)
+
+async def run_connection(port: int, requests: int, batch_size: int) -> int:
+    """
+    Sends requests one after another over a keep-alive connection
+    :return: Number of successful requests
+    """
+    resource = BATCH_RESOURCE if batch_size else SINGLE_RESOURCE
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    succeeded = 0
+    for index in range(requests):
+        body = make_body(index, batch_size).encode('utf-8')
+        writer.write(
+            f"POST {resource} HTTP/1.1\r\nHost: localhost\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+            .encode('latin-1') + body)
+        await writer.drain()
+
+        head = await reader.readuntil(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        length = 0
+        for line in header_lines:
+            name, _, value = line.partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+        await reader.readexactly(length)
+        if status_line.split(' ')[1] == '200':
+            succeeded += 1
+
+    writer.close()
+    await writer.wait_closed()
+    return succeeded
+
+async def run(connections: int, requests: int, batch_size: int,
+              workers: int, ack_ms: float) -> None:
+    stand_in = StandInProducerContext(ack_ms)
+    for acks in set(DELIVERY_MODES.values()):
+        for compression_type in [None] + get_available_codecs():
+            kafka_producer._producer_contexts[(acks, compression_type)] = stand_in
+
+    server = IngestServer('127.0.0.1', 0, workers)
+    # Handler logs of every request would dominate the measurement
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        await server.start()
+        started = time.perf_counter()
+        results = await asyncio.gather(*[
+            run_connection(server.port, requests, batch_size)
+            for _ in range(connections)
+        ])
+        elapsed = time.perf_counter() - started
+        await server.stop()
+
+    succeeded = sum(results)
+    events = succeeded * max(batch_size, 1)
+    print(f"Connections: {connections}, requests: {connections * requests}, "
+          f"succeeded: {succeeded}, stand-in ack latency: {ack_ms} ms")
+    print(f"Requests/s: {succeeded / elapsed:10.0f}")
+    print(f"Events/s:   {events / elapsed:10.0f}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--connections', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=200,
+                        help="requests per connection")
+    parser.add_argument('--batch-size', type=int, default=0,
+                        help="Match events per bulk request, 0 for single Match events")
+    parser.add_argument('--workers', type=int, default=64)
+    parser.add_argument('--ack-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    if os.getenv('FMDP_TEST_ENV'):
+        sys.exit("Unset FMDP_TEST_ENV, it skips the Kafka producer")
+
+    asyncio.run(run(args.connections, args.requests, args.batch_size,
+                    args.workers, args.ack_ms))
+
+if __name__ == '__main__':
+    main()
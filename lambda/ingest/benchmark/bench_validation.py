@@ -0,0 +1,89 @@
+"""
+Benchmark of Match event validation over a synthetic corpus
+Compares CPU time per Match event of the model validators with the fast
+path, and checks that both give the same result for every Match event
+
+Run: PYTHONPATH=..:../../process/shared python bench_validation.py [--events N] [--invalid-share S]
+"""
+import json
+import time
+import random
+import argparse
+from typing import Any, Callable, List, Tuple
+
+from pydantic import ValidationError
+
+import fast_validation
+from bench_serialization import make_bodies
+from data_model import MatchEvent
+
+# Typical client mistakes, each invalid Match event has one of them
+INVALID_FIELDS = [
+    { "match_id": "M-000001" },
+    { "event_type": "corner" },
+    { "timestamp": "2024-10-15 14:30:00" },
+    { "timestamp": "2024-02-30T14:30:00Z" },
+    { "team": None }
+]
+
+def make_corpus(count: int, invalid_share: float) -> List[str]:
+    """
+    Generates request bodies of Match events, some of them invalid
+    :param count: Number of Match events
+    :param invalid_share: Share of invalid Match events
+    :return: JSON request bodies
+    """
+    generator = random.Random(0)
+    bodies = make_bodies(count)
+    for index in range(count):
+        if generator.random() < invalid_share:
+            body = json.loads(bodies[index])
+            body.update(generator.choice(INVALID_FIELDS))
+            bodies[index] = json.dumps(body)
+    return bodies
+
+def outcome(validator: Callable[[str], MatchEvent], body: str) -> Tuple[Any, ...]:
+    try:
+        return ("valid", validator(body).model_dump(exclude={"event_id"}))
+    except ValidationError as ex:
+        return ("error", ex.errors()[0]['msg'])
+
+def measure(validator: Callable[[str], MatchEvent], bodies: List[str]) -> float:
+    """
+    Measures CPU time per Match event of a validator
+    :param validator: Validator of a JSON body
+    :param bodies: Request bodies
+    :return: CPU time per Match event in microseconds
+    """
+    started = time.process_time()
+    for body in bodies:
+        try:
+            validator(body)
+        except ValidationError:
+            pass
+    return (time.process_time() - started) / len(bodies) * 1e6
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--invalid-share', type=float, default=0.01)
+    args = parser.parse_args()
+
+    bodies = make_corpus(args.events, args.invalid_share)
+
+    mismatches = sum(
+        1 for body in bodies
+        if outcome(fast_validation.validate_json, body) !=
+            outcome(MatchEvent.model_validate_json, body)
+    )
+    model = measure(MatchEvent.model_validate_json, bodies)
+    fast = measure(fast_validation.validate_json, bodies)
+
+    print(f"Match events: {args.events}, invalid share: {args.invalid_share}")
+    print(f"mismatches:   {mismatches:8d}")
+    print(f"model:        {model:8.2f} us CPU per event")
+    print(f"fast path:    {fast:8.2f} us CPU per event")
+    print(f"speedup:      {model / fast:8.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Cold-start import profiler of the Ingest Lambda
+Imports the handler module in fresh interpreters with -X importtime and
+writes a report of import time per module and per top-level package.
+The vendored Kafka client is patched like the bundling step of the Lambda
+asset, see patches/; the profile fails if heavy modules are imported
+
+Run: PYTHONPATH=.. python profile_cold_start.py [--runs N] [--report FILE]
+     [--budget-ms MS] [--unpatched]
+"""
+import os
+import re
+import sys
+import glob
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+INGEST_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules shared with the Consume Lambda, bundled next to the handler
+SHARED_DIR = os.path.join(os.path.dirname(INGEST_DIR), 'process', 'shared')
+# Modules imported by the Lambda runtime at cold start
+ENTRY_MODULES = ["app"]
+# Modules the producer path must not import in the Lambda init phase
+HEAVY_MODULES = ["kafka.admin", "kafka.consumer", "botocore"]
+
+IMPORT_TIME_PATTERN = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+def bundle_kafka(output_dir: str) -> None:
+    """
+    Copies the vendored Kafka client and applies the patches of the bundling step
+    :param output_dir: Directory of the patched Kafka client
+    """
+    shutil.copytree(os.path.join(INGEST_DIR, 'kafka'), os.path.join(output_dir, 'kafka'))
+    for patch in sorted(glob.glob(os.path.join(INGEST_DIR, 'patches', '*.patch'))):
+        subprocess.run(['patch', '-p1', '--forward', '-i', patch],
+                       cwd=output_dir, check=True, capture_output=True)
+
+def import_times(modules: List[str],
+                 kafka_dir: Optional[str] = None) -> List[Tuple[str, int, int, int]]:
+    """
+    Imports modules in a fresh interpreter
+    :param modules: Modules to import
+    :param kafka_dir: Directory of the patched Kafka client, None for the vendored one
+    :return: Module name, nesting depth, self and cumulative import time
+        in microseconds per imported module
+    """
+    env = dict(os.environ)
+    # The test environment skips the producer path
+    env.pop('FMDP_TEST_ENV', None)
+    paths = [kafka_dir] if kafka_dir else []
+    env['PYTHONPATH'] = os.pathsep.join(
+        paths + [INGEST_DIR, SHARED_DIR] + [path for path in env.get('PYTHONPATH', '').split(os.pathsep) if path])
+
+    # The working directory comes first on the path of the interpreter
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {', '.join(modules)}"],
+        cwd=kafka_dir or INGEST_DIR, env=env, capture_output=True, text=True, check=True)
+
+    times = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            depth = len(match.group(3)) // 2
+            times.append((match.group(4), depth, int(match.group(1)), int(match.group(2))))
+    return times
+
+def make_report(runs: List[List[Tuple[str, int, int, int]]]) -> Dict:
+    """
+    Aggregates import times of several runs by their median
+    :param runs: Import times per run
+    :return: Report with the total, packages and modules sorted by import time
+    """
+    self_times: Dict[str, List[int]] = {}
+    totals = []
+    for times in runs:
+        totals.append(sum(cumulative for _, depth, _, cumulative in times if depth == 0))
+        for module, _, self_time, _ in times:
+            self_times.setdefault(module, []).append(self_time)
+
+    modules = {
+        module: statistics.median(values) / 1000 for module, values in self_times.items()
+    }
+    packages: Dict[str, float] = {}
+    for module, milliseconds in modules.items():
+        package = module.split('.')[0]
+        packages[package] = packages.get(package, 0.0) + milliseconds
+
+    return {
+        "python": sys.version.split()[0],
+        "entry_modules": ENTRY_MODULES,
+        "runs": len(runs),
+        "total_ms": statistics.median(totals) / 1000,
+        "heavy_modules": [module for module in HEAVY_MODULES if module in modules],
+        "packages_ms": dict(sorted(packages.items(), key=lambda item: -item[1])),
+        "modules_ms": dict(sorted(modules.items(), key=lambda item: -item[1]))
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--report', default='cold_start_report.json')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float,
+                        help="exit with an error if the total import time exceeds the budget")
+    parser.add_argument('--unpatched', action='store_true',
+                        help="profile the vendored Kafka client without the patches")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as kafka_dir:
+        if args.unpatched:
+            kafka_dir = None
+        else:
+            bundle_kafka(kafka_dir)
+        report = make_report([import_times(ENTRY_MODULES, kafka_dir) for _ in range(args.runs)])
+    with open(args.report, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    print(f"Import time of {', '.join(ENTRY_MODULES)}: {report['total_ms']:.1f} ms "
+          f"(median of {args.runs} runs), report: {args.report}")
+    print("Packages:")
+    for package, milliseconds in list(report['packages_ms'].items())[:args.top]:
+        print(f"  {package:30s} {milliseconds:8.1f} ms")
+    print("Modules:")
+    for module, milliseconds in list(report['modules_ms'].items())[:args.top]:
+        print(f"  {module:50s} {milliseconds:8.1f} ms")
+
+    if report['heavy_modules'] and not args.unpatched:
+        sys.exit(f"Heavy modules imported at init: {', '.join(report['heavy_modules'])}")
+    if args.budget_ms is not None and report['total_ms'] > args.budget_ms:
+        sys.exit(f"Import time exceeds the budget of {args.budget_ms} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Trains a zstd dictionary for per-record compression of Match events
+Reads Match events from the gzip NDJSON objects of the raw archive of the
+S3 bucket or from local copies, and writes the dictionary to
+<output dir>/<dictionary id>.dict
+
+The dictionary is written to lambda/process/shared/dictionaries by default,
+which is bundled into the Ingest and Consume Lambdas, then set
+INGEST_ZSTD_DICTIONARY_ID. Keep dictionaries while records compressed with
+them are retained by the topic
+
+Run: PYTHONPATH=..:../../process/shared python train_zstd_dictionary.py --bucket BUCKET
+     [--max-files N] [--size BYTES] [--output-dir DIR]
+     PYTHONPATH=..:../../process/shared python train_zstd_dictionary.py --files FILE [FILE ...]
+"""
+import os
+import sys
+import gzip
+import json
+import argparse
+from typing import Any, Dict, Iterator, List, Optional
+
+from data_model import MatchEvent
+from zstd_dictionary import ZSTD_DICTIONARY_SUFFIX, train_dictionary
+
+# Raw archive of the Store Lambda, objects of all partitions
+ARCHIVE_PREFIX = 'archive/season='
+ARCHIVE_SUFFIX = '.ndjson.gz'
+# zstd needs many samples to find content shared by Match events
+MIN_SAMPLES = 1000
+
+def parse_archive(data: bytes) -> List[Dict[str, Any]]:
+    """
+    Parses a gzip NDJSON archive object
+    :param data: Object bytes
+    :return: Match events
+    """
+    return [json.loads(line) for line in gzip.decompress(data).splitlines() if line.strip()]
+
+def read_s3_archive(bucket: str, max_files: int) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Reads raw archive objects of the S3 bucket
+    :param bucket: S3 bucket name
+    :param max_files: Max number of files to read
+    :return: Match events per file
+    """
+    import boto3
+
+    s3 = boto3.client('s3')
+    paginator = s3.get_paginator('list_objects_v2')
+    count = 0
+    for page in paginator.paginate(Bucket=bucket, Prefix=ARCHIVE_PREFIX):
+        for item in page.get('Contents', []):
+            if not item['Key'].endswith(ARCHIVE_SUFFIX):
+                continue
+            response = s3.get_object(Bucket=bucket, Key=item['Key'])
+            yield parse_archive(response['Body'].read())
+            count += 1
+            if count >= max_files:
+                return
+
+def read_local_archive(paths: List[str]) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Reads local copies of raw archive objects, or JSON arrays of Match events
+    :param paths: File paths
+    :return: Match events per file
+    """
+    for path in paths:
+        with open(path, 'rb') as file:
+            if path.endswith(ARCHIVE_SUFFIX):
+                yield parse_archive(file.read())
+            else:
+                yield json.load(file)
+
+def get_samples(archive: Iterator[List[Dict[str, Any]]]) -> List[bytes]:
+    """
+    Serializes archived Match events to record values like the ingest producer
+    :param archive: Match events per file
+    :return: Record values
+    """
+    samples = []
+    for match_events in archive:
+        for match_event in match_events:
+            samples.append(MatchEvent(**match_event).to_json_bytes())
+    return samples
+
+def write_dictionary(samples: List[bytes], size: int, output_dir: str,
+                     dictionary_id: Optional[int] = None) -> str:
+    """
+    Trains a dictionary and writes it to a file named by its id
+    :return: Dictionary file path
+    """
+    dictionary = train_dictionary(samples, size, dictionary_id)
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{dictionary.dict_id()}{ZSTD_DICTIONARY_SUFFIX}")
+    with open(path, 'wb') as file:
+        file.write(dictionary.as_bytes())
+    return path
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--bucket', help="S3 bucket of the raw archive")
+    source.add_argument('--files', nargs='+', help="local archive files")
+    parser.add_argument('--max-files', type=int, default=1000)
+    parser.add_argument('--size', type=int, default=4096,
+                        help="max dictionary size in bytes")
+    parser.add_argument('--dictionary-id', type=int,
+                        help="dictionary id, chosen by zstd if not given")
+    parser.add_argument('--output-dir',
+                        default=os.path.join('..', '..', 'process', 'shared', 'dictionaries'))
+    args = parser.parse_args()
+
+    if args.bucket:
+        archive = read_s3_archive(args.bucket, args.max_files)
+    else:
+        archive = read_local_archive(args.files)
+    samples = get_samples(archive)
+    print(f"Training on {len(samples)} Match events, "
+          f"{sum(len(sample) for sample in samples)} bytes")
+    if len(samples) < MIN_SAMPLES:
+        sys.exit(f"At least {MIN_SAMPLES} Match events are needed to train a dictionary")
+
+    path = write_dictionary(samples, args.size, args.output_dir, args.dictionary_id)
+    print(f"Dictionary: {path}")
+
+if __name__ == '__main__':
+    main()
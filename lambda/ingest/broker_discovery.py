@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import hashlib
+from typing import Any, Dict, List, Optional
+
+# How long discovered brokers are trusted without a connection failure
+BROKER_CACHE_TTL = int(os.getenv('BROKER_CACHE_TTL', '86400'))
+# Persisted between container re-initialisations of the same sandbox
+BROKER_CACHE_DIR = os.getenv('BROKER_CACHE_DIR', '/tmp')
+# Static broker list, e.g. a local Kafka, replaces the MSK control plane
+KAFKA_BOOTSTRAP_SERVERS = os.getenv('KAFKA_BOOTSTRAP_SERVERS')
+
+class StaticBrokerClient:
+    """
+    Local stand-in for the MSK control plane
+    Returns a fixed broker list in the GetBootstrapBrokers format
+    """
+    def __init__(self, bootstrap_servers: str) -> None:
+        self.bootstrap_servers = bootstrap_servers
+
+    def get_bootstrap_brokers(self, ClusterArn: str) -> Dict[str, Any]:
+        return {
+            'BootstrapBrokerString': self.bootstrap_servers
+        }
+
+class BrokerDiscovery:
+    """
+    Bootstrap broker discovery with a cache
+    Keeps brokers in memory and in a file, calls GetBootstrapBrokers
+    only when the cache is empty, expired or explicitly refreshed
+    """
+    def __init__(self, msk_cluster_arn: str, client: Any = None,
+                 ttl: int = BROKER_CACHE_TTL,
+                 cache_dir: Optional[str] = BROKER_CACHE_DIR) -> None:
+        self.msk_cluster_arn = msk_cluster_arn
+        self.client = client
+        self.ttl = ttl
+        self.cache_file = None
+        if cache_dir:
+            digest = hashlib.sha1(str(msk_cluster_arn).encode('utf-8')).hexdigest()
+            self.cache_file = os.path.join(cache_dir, f"fmdp_brokers_{digest[:16]}.json")
+
+        self.bootstrap_servers: Optional[List[str]] = None
+        self.expires_at = 0.0
+
+    def get_bootstrap_servers(self) -> List[str]:
+        """
+        Returns cached bootstrap brokers, discovers them if needed
+        :return: Bootstrap brokers
+        """
+        if self.bootstrap_servers and time.time() < self.expires_at:
+            return self.bootstrap_servers
+
+        if self._load():
+            return self.bootstrap_servers
+
+        return self.refresh()
+
+    def refresh(self) -> List[str]:
+        """
+        Discovers bootstrap brokers via the control plane and caches them
+        Called when connections to all cached brokers have failed
+        :return: Bootstrap brokers
+        """
+        client = self.client
+        if client is None:
+            import boto3
+            client = boto3.client('kafka')
+
+        response = client.get_bootstrap_brokers(
+            ClusterArn=self.msk_cluster_arn
+        )
+        self.bootstrap_servers = response['BootstrapBrokerString'].split(',')
+        self.expires_at = time.time() + self.ttl
+        self._save()
+
+        extra = {
+            "brokers": self.bootstrap_servers
+        }
+        print(f"Discovered Kafka brokers: {extra}")
+        return self.bootstrap_servers
+
+    def _load(self) -> bool:
+        if self.cache_file is None:
+            return False
+        try:
+            with open(self.cache_file) as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            return False
+
+        if (cache.get('cluster_arn') != self.msk_cluster_arn or
+                time.time() >= cache.get('expires_at', 0)):
+            return False
+
+        self.bootstrap_servers = cache['bootstrap_servers']
+        self.expires_at = cache['expires_at']
+        return True
+
+    def _save(self) -> None:
+        if self.cache_file is None:
+            return
+        cache = {
+            "cluster_arn": self.msk_cluster_arn,
+            "bootstrap_servers": self.bootstrap_servers,
+            "expires_at": self.expires_at
+        }
+        try:
+            # Replace the file atomically, concurrent readers never see a partial file
+            temp_file = f"{self.cache_file}.{os.getpid()}"
+            with open(temp_file, 'w') as file:
+                json.dump(cache, file)
+            os.replace(temp_file, self.cache_file)
+        except OSError as ex:
+            print(f"Error saving Kafka brokers cache: {ex}")
+
+# Broker discovery shared by all producers of the Lambda container
+_broker_discoveries: Dict[str, BrokerDiscovery] = {}
+
+def get_broker_discovery(msk_cluster_arn: str) -> BrokerDiscovery:
+    """
+    Returns the broker discovery of the MSK cluster
+    Uses the static broker list if KAFKA_BOOTSTRAP_SERVERS is set
+    :param msk_cluster_arn: MSK cluster ARN
+    :return: Broker discovery
+    """
+    broker_discovery = _broker_discoveries.get(msk_cluster_arn)
+    if broker_discovery is None:
+        client = None
+        if KAFKA_BOOTSTRAP_SERVERS:
+            client = StaticBrokerClient(KAFKA_BOOTSTRAP_SERVERS)
+        broker_discovery = BrokerDiscovery(msk_cluster_arn, client)
+        _broker_discoveries[msk_cluster_arn] = broker_discovery
+    return broker_discovery
@@ -0,0 +1,65 @@
+import os
+from functools import lru_cache
+from typing import List, Optional
+
+# Compression of Kafka record batches:
+# auto - chosen per request by the compression policy below
+# none - never compressed
+# gzip, snappy, lz4 or zstd - always compressed with the codec
+INGEST_COMPRESSION = os.getenv('INGEST_COMPRESSION', 'auto').lower()
+# CPU the producer may spend on compression: low, normal or high
+COMPRESSION_CPU_BUDGET = os.getenv('COMPRESSION_CPU_BUDGET', 'normal').lower()
+# Smaller requests are sent uncompressed, single Match events always are
+COMPRESSION_MIN_BATCH_BYTES = int(os.getenv('COMPRESSION_MIN_BATCH_BYTES', '16384'))
+# Batch size of compressing producers, larger batches compress better
+COMPRESSION_BATCH_SIZE = int(os.getenv('COMPRESSION_BATCH_SIZE', '262144'))
+
+# Codecs by CPU budget in the order of preference, the first one available
+# is used. The client compresses gzip at level 9, it is too slow for a low budget
+COMPRESSION_PREFERENCES = {
+    'low': ['lz4', 'snappy'],
+    'normal': ['zstd', 'lz4', 'snappy', 'gzip'],
+    'high': ['zstd', 'gzip']
+}
+NONE_COMPRESSION = 'none'
+AUTO_COMPRESSION = 'auto'
+
+@lru_cache(maxsize=1)
+def get_available_codecs() -> List[str]:
+    """
+    Returns compression codecs whose libraries are installed
+    gzip is always available, the others need optional packages
+    :return: Codec names
+    """
+    from kafka import codec
+
+    checks = {
+        'gzip': codec.has_gzip,
+        'snappy': codec.has_snappy,
+        'lz4': codec.has_lz4,
+        'zstd': codec.has_zstd
+    }
+    return [name for name, check in checks.items() if check()]
+
+def choose_compression(event_count: int, payload_bytes: int) -> Optional[str]:
+    """
+    Chooses the codec to send Match events of a request with
+    :param event_count: Number of Match events
+    :param payload_bytes: Size of the request body
+    :return: Codec name, None for no compression
+    """
+    if INGEST_COMPRESSION == NONE_COMPRESSION:
+        return None
+    if INGEST_COMPRESSION != AUTO_COMPRESSION:
+        return INGEST_COMPRESSION
+
+    # Compression of small batches costs CPU and latency for a few bytes
+    if event_count <= 1 or payload_bytes < COMPRESSION_MIN_BATCH_BYTES:
+        return None
+
+    available = get_available_codecs()
+    for name in COMPRESSION_PREFERENCES.get(COMPRESSION_CPU_BUDGET,
+                                            COMPRESSION_PREFERENCES['normal']):
+        if name in available:
+            return name
+    return None
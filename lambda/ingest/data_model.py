@@ -3,6 +3,10 @@ from datetime import datetime
 from enum import Enum
 from pydantic import BaseModel, Field, field_validator
 
+from typing import List, Tuple
+from wire_format import (BINARY_WIRE_FORMAT, JSON_WIRE_FORMAT,
+                         encode_binary, make_headers)
+
 class EventType(str, Enum):
     GOAL = "goal"
     PASS = "pass"
@@ -20,6 +24,46 @@ class MatchEvent(BaseModel):
     player: str
     timestamp: str
 
+    def to_json_bytes(self) -> bytes:
+        """
+        Serializes the Match event to JSON bytes in a single pass
+        :return: JSON bytes to send to Kafka
+        """
+        return self.__pydantic_serializer__.to_json(self)
+
+    def to_wire_bytes(self, wire_format: str = JSON_WIRE_FORMAT) -> bytes:
+        """
+        Serializes the Match event to a Kafka record value
+        Falls back to JSON if the binary format cannot represent the event exactly
+        :param wire_format: Wire format, 'json' or 'binary'
+        :return: Record value bytes
+        """
+        if wire_format == BINARY_WIRE_FORMAT:
+            value = encode_binary(self.event_id, self.match_id, self.event_type,
+                                  self.team, self.player, self.timestamp)
+            if value is not None:
+                return value
+        return self.to_json_bytes()
+
+    def record_headers(self, value: bytes,
+                       ingest_timestamp_ms: int) -> List[Tuple[str, bytes]]:
+        """
+        Kafka record headers, consumers can route and filter the record
+        without decoding its value
+        :param value: Record value
+        :param ingest_timestamp_ms: Ingest time in epoch milliseconds
+        :return: Record headers
+        """
+        return make_headers(self.event_id, self.match_id, self.event_type, value,
+                            ingest_timestamp_ms)
+
+    def key_bytes(self) -> bytes:
+        """
+        Kafka record key, events of a match are kept in one partition in order
+        :return: match_id bytes
+        """
+        return self.match_id.encode('utf-8')
+
     @field_validator("match_id")
     def all_chars_must_be_integers(cls, value):
         if not value.isdigit():
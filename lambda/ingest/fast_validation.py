@@ -0,0 +1,111 @@
+import re
+import json
+import calendar
+from typing import Any, Dict, Optional
+
+from data_model import EventType, MatchEvent
+
+# The fast path checks the rules of MatchEvent validators without the model.
+# It only accepts Match events the model accepts too, anything else is
+# validated by the model, so error messages are those of the model
+
+# A strict subset of timestamps datetime.strptime(value, "%Y-%m-%dT%H:%M:%S%z")
+# accepts: two-digit fields, 'Z' or an offset within a day. Other timestamps,
+# e.g. one-digit fields or a lowercase 't', are validated by the model
+TIMESTAMP_PATTERN = re.compile(
+    r'(?!0000)[0-9]{4}-(?:0[1-9]|1[0-2])-(?:0[1-9]|[12][0-9]|3[01])'
+    r'T(?:[01][0-9]|2[0-3]):[0-5][0-9]:[0-5][0-9]'
+    r'(?:Z|[+-](?:[01][0-9]|2[0-3]):?[0-5][0-9])')
+EVENT_TYPES = frozenset(event_type.value for event_type in EventType)
+
+STRING_FIELDS = ("match_id", "event_type", "team", "player", "timestamp")
+FIELDS = ("event_id",) + STRING_FIELDS
+EVENT_ID_FACTORY = MatchEvent.model_fields["event_id"].default_factory
+
+_object_setattr = object.__setattr__
+
+def accepts(item: Any) -> bool:
+    """
+    Checks if a parsed Match event is valid without the model
+    :param item: Parsed Match event
+    :return: True if the Match event is valid, False if it has to be
+        validated by the model, it may still be valid
+    """
+    if type(item) is not dict:
+        return False
+
+    for field in STRING_FIELDS:
+        if type(item.get(field)) is not str:
+            return False
+    if "event_id" in item and type(item["event_id"]) is not str:
+        return False
+
+    timestamp = item["timestamp"]
+    if not (item["match_id"].isdigit() and
+            item["event_type"] in EVENT_TYPES and
+            TIMESTAMP_PATTERN.fullmatch(timestamp)):
+        return False
+    # Days 29-31 exist only in some months
+    if timestamp[8:10] > "28":
+        year, month = int(timestamp[0:4]), int(timestamp[5:7])
+        if int(timestamp[8:10]) > calendar.monthrange(year, month)[1]:
+            return False
+
+    # Lone surrogates of JSON escapes are not valid strings for the model
+    for field in FIELDS:
+        value = item.get(field)
+        if value is not None and not value.isascii():
+            try:
+                value.encode('utf-8')
+            except UnicodeEncodeError:
+                return False
+    return True
+
+def construct(item: Dict[str, Any]) -> MatchEvent:
+    """
+    Creates a Match event accepted by the fast path
+    Sets the same state as model validation, without validating again
+    :param item: Parsed Match event
+    :return: Match event
+    """
+    fields_set = {field for field in FIELDS if field in item}
+    # Values in the order of model fields, as serialized by the model
+    values = {
+        "event_id": item["event_id"] if "event_id" in item else EVENT_ID_FACTORY()
+    }
+    for field in STRING_FIELDS:
+        values[field] = item[field]
+
+    match_event = MatchEvent.__new__(MatchEvent)
+    _object_setattr(match_event, '__dict__', values)
+    _object_setattr(match_event, '__pydantic_fields_set__', fields_set)
+    _object_setattr(match_event, '__pydantic_extra__', None)
+    _object_setattr(match_event, '__pydantic_private__', None)
+    return match_event
+
+def validate_python(item: Any) -> Optional[MatchEvent]:
+    """
+    Validates a parsed Match event on the fast path
+    :param item: Parsed Match event
+    :return: Match event, None if it has to be validated by the model
+    """
+    if accepts(item):
+        return construct(item)
+    return None
+
+def validate_json(body: str) -> MatchEvent:
+    """
+    Validates a Match event from a JSON body
+    Falls back to the model for Match events the fast path does not accept
+    :param body: JSON body
+    :return: Match event
+    :raises ValidationError: The error of the model if the Match event is invalid
+    """
+    try:
+        match_event = validate_python(json.loads(body))
+    except (TypeError, ValueError):
+        match_event = None
+
+    if match_event is None:
+        match_event = MatchEvent.model_validate_json(body)
+    return match_event
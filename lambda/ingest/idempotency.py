@@ -0,0 +1,114 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from data_model import MatchEvent
+from util import get_header
+
+# Client-provided key of a request, retries of the request carry the same key
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+# Without the header, Match events with the same match_id, event_type, player
+# and timestamp are duplicates. Disable if a player can have several events
+# of a type within a second
+INGEST_DEDUP_NATURAL_KEY = os.getenv('INGEST_DEDUP_NATURAL_KEY', 'true').lower() == 'true'
+# Keys remembered per Lambda container
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', '100000'))
+IDEMPOTENCY_CACHE_TTL = int(os.getenv('IDEMPOTENCY_CACHE_TTL', '600'))
+
+# Namespace of event ids derived from idempotency keys
+EVENT_ID_NAMESPACE = uuid.UUID('6f1d3c52-3f0a-4a4e-9a55-2b1c8e2d7f10')
+
+class IdempotencyCache:
+    """
+    Bounded LRU cache of idempotency keys with a TTL
+    Maps the key of an ingested Match event to its event_id
+    """
+    def __init__(self, max_size: int = IDEMPOTENCY_CACHE_SIZE,
+                 ttl: float = IDEMPOTENCY_CACHE_TTL) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict() # key: (event_id, expires_at)
+        # Handler threads of the standalone server share the cache
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the event_id of an ingested Match event
+        :param key: Idempotency key
+        :return: event_id, None if the key is unknown or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            event_id, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return event_id
+
+    def put(self, key: str, event_id: str) -> None:
+        """
+        Remembers an ingested Match event, evicts the least recently used key
+        :param key: Idempotency key
+        :param event_id: event_id of the Match event
+        """
+        with self._lock:
+            self._entries[key] = (event_id, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        """
+        Forgets a Match event, e.g. if its delivery failed after the response
+        :param key: Idempotency key
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+def get_idempotency_key(event: Dict[str, Any], match_event: MatchEvent) -> Optional[str]:
+    """
+    Returns the idempotency key of a Match event
+    :param event: The event data, None for Match events of a batch
+    :param match_event: Match event
+    :return: The Idempotency-Key header, the natural key or None if
+        deduplication by the natural key is disabled
+    """
+    if event is not None:
+        header = get_header(event, IDEMPOTENCY_KEY_HEADER)
+        if header:
+            return f"key:{header}"
+
+    if not INGEST_DEDUP_NATURAL_KEY:
+        return None
+    return "\x1f".join(("event", match_event.match_id, match_event.event_type,
+                        match_event.player, match_event.timestamp))
+
+def assign_event_id(match_event: MatchEvent, key: Optional[str]) -> None:
+    """
+    Derives the event_id of a Match event from its idempotency key
+    Retries get the same event_id in any Lambda container, so downstream
+    writes keyed by event_id replace the original instead of duplicating it
+    :param match_event: Match event, a client-provided event_id is kept
+    :param key: Idempotency key
+    """
+    if key is not None and "event_id" not in match_event.model_fields_set:
+        match_event.event_id = str(uuid.uuid5(EVENT_ID_NAMESPACE, key))
+
+# Idempotency keys of Match events ingested by the Lambda container
+_cache = IdempotencyCache()
+
+def get_cache() -> IdempotencyCache:
+    """
+    Returns the idempotency cache of the Lambda container
+    :return: Idempotency cache
+    """
+    return _cache
@@ -1,16 +1,41 @@
-import boto3
-from typing import Any
+import os
+import signal
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from kafka import KafkaProducer
+from kafka.errors import KafkaError, KafkaTimeoutError, NoBrokersAvailable
+
+from backpressure import get_producer_load
+from broker_discovery import get_broker_discovery
+from compression import COMPRESSION_BATCH_SIZE
+from partitioner import HotMatchPartitioner
 
 KAFKA_PRODUCER_TIMEOUT = 10
+# Max time send waits for buffer memory or metadata, fails fast under overload
+KAFKA_MAX_BLOCK_MS = int(os.getenv('KAFKA_MAX_BLOCK_MS', '1000'))
+# Time to wait for more messages to send them in one request
+KAFKA_LINGER_MS = int(os.getenv('KAFKA_LINGER_MS', '0'))
+# Comma-separated match ids balanced over several partitions
+HOT_MATCH_IDS = os.getenv('HOT_MATCH_IDS', '')
+HOT_MATCH_PARTITIONS = int(os.getenv('HOT_MATCH_PARTITIONS', '2'))
+# Max time an async request waits for its buffered messages to be sent
+# before it responds. Lambda freezes the sandbox after the response and may
+# reclaim it without SIGTERM, messages still buffered then are lost
+KAFKA_ASYNC_FLUSH_MS = int(os.getenv('KAFKA_ASYNC_FLUSH_MS', '200'))
+# Max time to deliver buffered messages when the process receives SIGTERM
+KAFKA_SHUTDOWN_TIMEOUT = 0.3
 
 class KafkaProducerContext:
     """
     Kafka producer context manager
     Frees resources automatically
     """
-    def __init__(self, msk_cluster_arn: str) -> None:
+    def __init__(self, msk_cluster_arn: str, acks: Union[int, str] = 1,
+                 compression_type: Optional[str] = None) -> None:
         self.msk_cluster_arn = msk_cluster_arn
+        self.acks = acks
+        self.compression_type = compression_type
         
         self._get_bootstrap_servers()
         self._init_producer()
@@ -19,32 +44,225 @@ class KafkaProducerContext:
         return self
 
     def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any):
-        self.producer.close()
+        self.close()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Closes the Kafka producer, delivers buffered messages
+        :param timeout: Max time to wait in seconds, None to wait for all
+        """
+        self.producer.close(timeout=timeout)
+
+    def flush(self, timeout: float) -> bool:
+        """
+        Sends buffered messages and waits for their delivery
+        :param timeout: Max time to wait in seconds
+        :return: True if all buffered messages completed, False if messages
+            are still buffered after the timeout
+        """
+        try:
+            self.producer.flush(timeout=timeout)
+        except KafkaTimeoutError:
+            return False
+        return True
+
+    def is_healthy(self) -> bool:
+        """
+        Checks that the Kafka producer can still be used to send messages
+        :return: True if the producer is open and its sender thread is running
+        """
+        # Private attributes of the vendored client, see test_kafka_producer.py.
+        # A producer is not rebuilt on every request if a new client renames them
+        if getattr(self.producer, '_closed', False):
+            return False
+        sender = getattr(self.producer, '_sender', None)
+        return sender is None or sender.is_alive()
+
+    def get_load(self) -> float:
+        """
+        Returns the load of the Kafka producer, see backpressure.py
+        :return: Load, 0 when idle and 1 or more when sends would block
+        """
+        return get_producer_load(self.producer)
 
     def _get_bootstrap_servers(self) -> None:
-        client = boto3.client('kafka')
-        response = client.get_bootstrap_brokers(
-            ClusterArn=self.msk_cluster_arn
-        )
-        self.bootstrap_servers = response['BootstrapBrokerString'].split(',')
+        self.broker_discovery = get_broker_discovery(self.msk_cluster_arn)
+        self.bootstrap_servers = self.broker_discovery.get_bootstrap_servers()
         extra = {
             "brokers": self.bootstrap_servers
         }
         print(f"Received Kafka config: {extra}")
     
     def _init_producer(self) -> None:
-        self.producer = KafkaProducer(
+        try:
+            self.producer = self._create_producer()
+        except NoBrokersAvailable:
+            # None of the cached brokers is reachable, rediscover them once
+            print(f"Kafka brokers are not available: {self.bootstrap_servers}")
+            self.bootstrap_servers = self.broker_discovery.refresh()
+            self.producer = self._create_producer()
+
+    def _create_producer(self) -> KafkaProducer:
+        configs = {}
+        hot_match_ids = [
+            match_id.strip() for match_id in HOT_MATCH_IDS.split(',') if match_id.strip()
+        ]
+        if hot_match_ids:
+            configs['partitioner'] = HotMatchPartitioner(hot_match_ids,
+                                                         HOT_MATCH_PARTITIONS)
+        if self.compression_type is not None:
+            configs['compression_type'] = self.compression_type
+            configs['batch_size'] = COMPRESSION_BATCH_SIZE
+
+        return KafkaProducer(
             bootstrap_servers=self.bootstrap_servers,
-            value_serializer=lambda v: v.encode('utf-8')
+            acks=self.acks,
+            linger_ms=KAFKA_LINGER_MS,
+            max_block_ms=KAFKA_MAX_BLOCK_MS,
+            # The client has no idempotent producer, without retries a
+            # broker-side timeout never writes a Match event twice
+            retries=0,
+            **configs
         )
 
-    def send(self, topic_name: str, value: str) -> Any:
+    def send(self, topic_name: str, value: bytes, key: bytes = None,
+             headers: List[Tuple[str, bytes]] = None) -> Any:
         """
         Sends a message to the Kafka topic.
         :param topic_name: Topic name
         :param value: Message value
+        :param key: Message key, messages with the same key keep their order
+        :param headers: Message headers
         :return: Kafka satus response
         """
-        future = self.producer.send(topic_name, value)
+        future = self.producer.send(topic_name, value, key=key, headers=headers)
 
         return future.get(timeout=KAFKA_PRODUCER_TIMEOUT)
+
+    def send_batch(self, topic_name: str,
+                   messages: List[Tuple[bytes, bytes, List[Tuple[str, bytes]]]]) -> List[Any]:
+        """
+        Sends a batch of messages to the Kafka topic.
+        Waits for all messages with a single flush.
+        :param topic_name: Topic name
+        :param messages: Message keys, values and headers
+        :return: Kafka status response or exception per message
+        """
+        futures = [
+            self.producer.send(topic_name, value, key=key, headers=headers)
+            for key, value, headers in messages
+        ]
+        self.producer.flush(timeout=KAFKA_PRODUCER_TIMEOUT)
+
+        results = []
+        for future in futures:
+            try:
+                results.append(future.get(timeout=0))
+            except KafkaError as ex:
+                results.append(ex)
+        return results
+
+    def send_async(self, topic_name: str, value: bytes,
+                   errback: Callable[[Exception], Any], key: bytes = None,
+                   headers: List[Tuple[str, bytes]] = None) -> Any:
+        """
+        Sends a message to the Kafka topic without waiting for delivery.
+        Returns once the message is buffered by the producer.
+        :param topic_name: Topic name
+        :param value: Message value
+        :param errback: Called with the exception if delivery fails
+        :param key: Message key, messages with the same key keep their order
+        :param headers: Message headers
+        :return: Kafka future of the message
+        """
+        future = self.producer.send(topic_name, value, key=key, headers=headers)
+        future.add_errback(errback)
+        return future
+
+# Kafka producers reused by warm invocations of the Lambda container,
+# by acks and compression type
+_producer_contexts: Dict[Tuple[Union[int, str], Optional[str]], KafkaProducerContext] = {}
+# Handler threads of the standalone server share the producers
+_producer_contexts_lock = threading.Lock()
+_previous_sigterm_handler: Any = None
+
+def get_producer_context(msk_cluster_arn: str,
+                         acks: Union[int, str] = 1,
+                         compression_type: Optional[str] = None) -> KafkaProducerContext:
+    """
+    Returns the Kafka producer of the Lambda container
+    Creates a new producer on the first call or when the current one is unhealthy
+    :param msk_cluster_arn: MSK cluster ARN
+    :param acks: Acknowledgements required by the producer: 0, 1 or 'all'
+    :param compression_type: Compression codec of the producer, None for no compression
+    :return: Kafka producer context
+    """
+    key = (acks, compression_type)
+    producer_context = _producer_contexts.get(key)
+    if producer_context is not None and producer_context.is_healthy():
+        return producer_context
+
+    with _producer_contexts_lock:
+        producer_context = _producer_contexts.get(key)
+        if producer_context is not None and not producer_context.is_healthy():
+            print("Kafka producer is unhealthy, reconnecting")
+            _close_producer_context(key, 0)
+            producer_context = None
+
+        if producer_context is None:
+            producer_context = KafkaProducerContext(msk_cluster_arn, acks,
+                                                    compression_type)
+            _producer_contexts[key] = producer_context
+            _register_shutdown_handler()
+
+    return producer_context
+
+def reset_producer_context(acks: Union[int, str, None] = None,
+                           timeout: Optional[float] = 0) -> None:
+    """
+    Closes and discards Kafka producers of the Lambda container
+    The next call of get_producer_context reconnects to the cluster
+    :param acks: Acknowledgements of the producers to reset, None to reset all
+    :param timeout: Max time to deliver buffered messages in seconds
+    """
+    keys = [
+        key for key in list(_producer_contexts) if acks is None or key[0] == acks
+    ]
+    for key in keys:
+        _close_producer_context(key, timeout)
+
+def _close_producer_context(key: Tuple[Union[int, str], Optional[str]],
+                            timeout: Optional[float]) -> None:
+    producer_context = _producer_contexts.pop(key, None)
+    if producer_context is None:
+        return
+    try:
+        producer_context.close(timeout=timeout)
+    except Exception as ex:
+        print(f"Error closing Kafka producer: {ex}")
+
+def _register_shutdown_handler() -> None:
+    """
+    Closes Kafka producers when the process receives SIGTERM
+    The standalone server receives it on shutdown. Lambda sends it only to
+    functions with a registered extension, which this stack has none of:
+    Lambda requests flush their messages before responding instead
+    """
+    global _previous_sigterm_handler
+
+    if _previous_sigterm_handler is not None:
+        return
+    try:
+        _previous_sigterm_handler = signal.signal(signal.SIGTERM, _handle_sigterm)
+    except ValueError:
+        # Signal handlers can be set in the main thread only
+        _previous_sigterm_handler = signal.SIG_DFL
+
+def _handle_sigterm(signum: int, frame: Any) -> None:
+    print("Received SIGTERM, closing Kafka producers")
+    reset_producer_context(timeout=KAFKA_SHUTDOWN_TIMEOUT)
+
+    if callable(_previous_sigterm_handler):
+        _previous_sigterm_handler(signum, frame)
+    else:
+        sys.exit(0)
@@ -0,0 +1,31 @@
+import os
+import json
+import time
+from typing import Dict
+
+METRICS_NAMESPACE = os.getenv('METRICS_NAMESPACE', 'FootballMatchDataProcessor')
+
+def put_metric(name: str, value: float, unit: str = "Count",
+               dimensions: Dict[str, str] = None) -> None:
+    """
+    Publishes a CloudWatch metric in the Embedded Metric Format
+    The Lambda log line is converted to the metric, no API call is made
+    :param name: Metric name
+    :param value: Metric value
+    :param unit: Metric unit
+    :param dimensions: Metric dimensions
+    """
+    dimensions = dimensions or {}
+    metric = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [list(dimensions)],
+                "Metrics": [{ "Name": name, "Unit": unit }]
+            }]
+        },
+        name: value
+    }
+    metric.update(dimensions)
+    print(json.dumps(metric))
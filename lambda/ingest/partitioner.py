@@ -0,0 +1,36 @@
+import itertools
+from typing import Iterable, List, Optional
+
+from kafka.partitioner.default import DefaultPartitioner, murmur2
+
+class HotMatchPartitioner(DefaultPartitioner):
+    """
+    Kafka partitioner for records keyed by match_id
+    Events of a match go to one partition to keep their order, except for
+    hot matches: their keys are salted to balance them over several partitions
+    """
+    def __init__(self, hot_match_ids: Iterable[str], salt_buckets: int = 2) -> None:
+        self.hot_match_ids = frozenset(
+            match_id.encode('utf-8') for match_id in hot_match_ids
+        )
+        self.salt_buckets = max(1, salt_buckets)
+        self._salts = itertools.cycle(range(self.salt_buckets))
+
+    def __call__(self, key: Optional[bytes], all_partitions: List[int],
+                 available: List[int]) -> int:
+        """
+        Get the partition corresponding to key
+        :param key: Partitioning key, match_id
+        :param all_partitions: List of all partitions sorted by partition ID
+        :param available: List of available partitions in no particular order
+        :return: One of the values from all_partitions or available
+        """
+        if key is None or key not in self.hot_match_ids:
+            return super().__call__(key, all_partitions, available)
+
+        # Hot matches give up their order across salted partitions
+        salted_key = key + b'#' + str(next(self._salts)).encode('utf-8')
+        idx = murmur2(salted_key)
+        idx &= 0x7fffffff
+        idx %= len(all_partitions)
+        return all_partitions[idx]
@@ -0,0 +1,276 @@
+"""
+Standalone ingest server
+Serves the Ingest API over HTTP/1.1 with keep-alive outside Lambda, e.g. on
+VMs next to the feed provider. Requests run the Ingest Lambda handler, all
+connections share one long-lived Kafka producer per delivery mode
+
+This is a threaded server with an asyncio front: the event loop parses
+requests and keeps idle connections cheap, the blocking handler runs in a
+pool of INGEST_SERVER_WORKERS threads. A sync or leader request holds its
+thread until Kafka acknowledges it, so throughput is capped at about
+INGEST_SERVER_WORKERS / acknowledgement latency, not by the event loop
+
+Run: MSK_TOPIC_NAME=<topic> MSK_CLUSTER_ARN=<arn> python server.py [--port N]
+Set KAFKA_BOOTSTRAP_SERVERS to use a Kafka without the MSK control plane
+"""
+import os
+import sys
+import asyncio
+import argparse
+import signal
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, Dict, Optional, Set, Tuple
+from urllib.parse import parse_qsl
+
+import app
+from util import get_response, get_header
+
+INGEST_SERVER_HOST = os.getenv('INGEST_SERVER_HOST', '0.0.0.0')
+INGEST_SERVER_PORT = int(os.getenv('INGEST_SERVER_PORT', '8080'))
+# Threads running the handler, each waits for Kafka acknowledgements of one
+# request. Caps the requests in flight, raise it with the acknowledgement latency
+INGEST_SERVER_WORKERS = int(os.getenv('INGEST_SERVER_WORKERS', '64'))
+# Idle keep-alive connections are closed after this many seconds
+KEEP_ALIVE_TIMEOUT = 60
+# Request limits of API Gateway
+MAX_HEADER_SIZE = 16 * 1024
+MAX_BODY_SIZE = 10 * 1024 * 1024
+# Max time to finish running requests and deliver buffered Match events on shutdown
+SHUTDOWN_TIMEOUT = 10
+
+SINGLE_RESOURCE = '/matches/event'
+RESOURCES = (SINGLE_RESOURCE, app.BATCH_RESOURCE)
+
+class HttpError(Exception):
+    """
+    Raised when a request cannot be parsed, the connection is closed
+    """
+    def __init__(self, status_code: int, message: str) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+class IngestServer:
+    """
+    HTTP server of the Ingest API with an asyncio front
+    Parses requests on the event loop and runs the blocking handler in
+    worker threads
+    """
+    def __init__(self, host: str = INGEST_SERVER_HOST, port: int = INGEST_SERVER_PORT,
+                 workers: int = INGEST_SERVER_WORKERS) -> None:
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix='ingest')
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.connections: Set[asyncio.StreamWriter] = set()
+        self.requests: Set[asyncio.Future] = set()
+
+    async def start(self) -> None:
+        """
+        Starts accepting connections
+        """
+        self.server = await asyncio.start_server(self._handle_connection,
+                                                 self.host, self.port,
+                                                 limit=MAX_HEADER_SIZE)
+        # The bound port if port 0 was requested
+        self.port = self.server.sockets[0].getsockname()[1]
+
+        extra = {
+            "host": self.host,
+            "port": self.port
+        }
+        print(f"Started ingest server: {extra}")
+
+    async def stop(self) -> None:
+        """
+        Stops accepting connections, waits for running requests
+        and delivers buffered Match events within SHUTDOWN_TIMEOUT
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SHUTDOWN_TIMEOUT
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self.connections):
+                writer.close()
+            await self.server.wait_closed()
+
+        # A request stuck waiting for Kafka does not hold up the shutdown,
+        # closing the producer fails its acknowledgement
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.requests:
+            _, running = await asyncio.wait(self.requests,
+                                            timeout=max(0.0, deadline - loop.time()))
+            if running:
+                print(f"Requests still running at shutdown: {len(running)}")
+
+        if 'kafka_producer' in sys.modules:
+            from kafka_producer import reset_producer_context
+            reset_producer_context(timeout=max(0.0, deadline - loop.time()))
+        print("Stopped ingest server")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        self.connections.add(writer)
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader),
+                                                     KEEP_ALIVE_TIMEOUT)
+                except HttpError as ex:
+                    response = get_response(ex.status_code, ex.message)
+                    writer.write(format_response(response, False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+
+                event, keep_alive = request
+                response = await self.dispatch(event)
+                writer.write(format_response(response, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, ConnectionError):
+            pass # Idle or closed by the client
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def dispatch(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Runs the Ingest Lambda handler for a request
+        :param event: The event data in the API Gateway format
+        :return: The response data
+        """
+        if event['resource'] not in RESOURCES:
+            return get_response(404, "Not found")
+        if event['httpMethod'] != 'POST':
+            return get_response(405, "Method not allowed")
+
+        loop = asyncio.get_running_loop()
+        try:
+            request = loop.run_in_executor(self.executor, app.handler, event, None)
+            self.requests.add(request)
+            request.add_done_callback(self.requests.discard)
+            return await request
+        except Exception as ex:
+            print(f"Error ingesting Match events: {ex}")
+            return get_response(500, "Internal server error")
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Tuple[Dict[str, Any], bool]]:
+    """
+    Reads an HTTP/1.1 request
+    :param reader: Connection reader
+    :return: The event data in the API Gateway format and whether to keep
+        the connection alive, None if the client closed the connection
+    :raises HttpError: If the request is malformed or too large
+    """
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as ex:
+        if not ex.partial.strip():
+            return None
+        raise HttpError(400, "Incomplete request")
+    except asyncio.LimitOverrunError:
+        raise HttpError(431, "Request headers too large")
+
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ')
+    except ValueError:
+        raise HttpError(400, "Malformed request line")
+
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(':')
+            headers[name.strip()] = value.strip()
+    event = {
+        'headers': headers
+    }
+
+    if get_header(event, 'Transfer-Encoding'):
+        raise HttpError(501, "Chunked requests are not supported")
+    try:
+        length = int(get_header(event, 'Content-Length') or '0')
+    except ValueError:
+        raise HttpError(400, "Malformed Content-Length")
+    if length > MAX_BODY_SIZE:
+        raise HttpError(413, "Request body too large")
+
+    try:
+        body = (await reader.readexactly(length)).decode('utf-8')
+    except asyncio.IncompleteReadError:
+        raise HttpError(400, "Incomplete request")
+    except UnicodeDecodeError:
+        raise HttpError(400, "Request body must be UTF-8")
+
+    connection = (get_header(event, 'Connection') or '').lower()
+    if version == 'HTTP/1.0':
+        keep_alive = connection == 'keep-alive'
+    else:
+        keep_alive = connection != 'close'
+
+    path, _, query = target.partition('?')
+    event.update({
+        'resource': path,
+        'path': path,
+        'httpMethod': method,
+        'queryStringParameters': dict(parse_qsl(query)) or None,
+        'body': body,
+        'isBase64Encoded': False,
+        # Requests are logged by their id like API Gateway requests
+        'requestContext': { 'requestId': str(uuid.uuid4()) }
+    })
+    return event, keep_alive
+
+def format_response(response: Dict[str, Any], keep_alive: bool) -> bytes:
+    """
+    Formats a handler response as an HTTP/1.1 response
+    :param response: The response data
+    :param keep_alive: Whether the connection is kept alive
+    :return: HTTP response
+    """
+    status_code = response['statusCode']
+    body = (response.get('body') or '').encode('utf-8')
+
+    lines = [f"HTTP/1.1 {status_code} {HTTPStatus(status_code).phrase}"]
+    for name, value in (response.get('headers') or {}).items():
+        lines.append(f"{name}: {value}")
+    lines.append(f"Content-Length: {len(body)}")
+    lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+async def serve(host: str, port: int, workers: int) -> None:
+    """
+    Runs the ingest server until SIGINT or SIGTERM
+    :param host: Host to listen on
+    :param port: Port to listen on
+    :param workers: Handler threads
+    """
+    server = IngestServer(host, port, workers)
+    await server.start()
+
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopped.set)
+
+    await stopped.wait()
+    await server.stop()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=INGEST_SERVER_HOST)
+    parser.add_argument('--port', type=int, default=INGEST_SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=INGEST_SERVER_WORKERS)
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, args.port, args.workers))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Modules shared with the Consume Lambda are bundled next to the handler,
+# tests import them from lambda/process/shared
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'process', 'shared'))
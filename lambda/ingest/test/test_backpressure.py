@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+from kafka.producer.record_accumulator import RecordAccumulator
+
+from backpressure import (BACKPRESSURE_MAX_RETRY_AFTER, BACKPRESSURE_MIN_RETRY_AFTER,
+                          get_producer_load, get_retry_after, should_shed)
+
+def make_producer(used_buffers: int) -> SimpleNamespace:
+    accumulator = RecordAccumulator(buffer_memory=100 * 1024, batch_size=1024)
+    for _ in range(used_buffers):
+        accumulator._free.allocate(1024, 0)
+    return SimpleNamespace(_accumulator=accumulator)
+
+def test_producer_load():
+    """
+    Tests that the producer load follows the buffer memory in use
+    """
+    assert get_producer_load(make_producer(0)) == 0.0
+    assert get_producer_load(make_producer(90)) == 0.9
+    assert get_producer_load(make_producer(100)) == 1.0
+
+def test_producer_load_without_accumulator():
+    """
+    Tests that a producer without the private accumulator attributes is idle
+    """
+    assert get_producer_load(SimpleNamespace()) == 0.0
+    accumulator = SimpleNamespace(config={ "buffer_memory": 100 * 1024, "batch_size": 1024 })
+    assert get_producer_load(SimpleNamespace(_accumulator=accumulator)) == 0.0
+
+def test_passes_shed_first():
+    """
+    Tests that passes are shed before goals and fouls
+    """
+    load = get_producer_load(make_producer(90))
+
+    assert should_shed(load, "pass")
+    assert not should_shed(load, "goal")
+    assert not should_shed(load, "foul")
+    assert should_shed(1.0, "goal")
+
+def test_retry_after():
+    """
+    Tests that Retry-After grows with the producer load
+    """
+    assert get_retry_after(0.8, "pass") == BACKPRESSURE_MIN_RETRY_AFTER
+    assert get_retry_after(0.9, "pass") < get_retry_after(0.99, "pass")
+    assert get_retry_after(1.5, "pass") == BACKPRESSURE_MAX_RETRY_AFTER
@@ -0,0 +1,65 @@
+from broker_discovery import BrokerDiscovery, StaticBrokerClient
+
+CLUSTER_ARN = "arn:aws:kafka:us-east-1:123456789012:cluster/test/1"
+
+class CountingBrokerClient(StaticBrokerClient):
+    """
+    Local stand-in for the MSK control plane, counts GetBootstrapBrokers calls
+    """
+    def __init__(self, bootstrap_servers: str) -> None:
+        super().__init__(bootstrap_servers)
+        self.calls = 0
+
+    def get_bootstrap_brokers(self, ClusterArn: str):
+        self.calls += 1
+        return super().get_bootstrap_brokers(ClusterArn)
+
+def test_brokers_cached_in_memory(tmp_path):
+    """
+    Tests that brokers are discovered once while the cache is valid
+    """
+    client = CountingBrokerClient("b-1:9092,b-2:9092")
+    broker_discovery = BrokerDiscovery(CLUSTER_ARN, client, cache_dir=str(tmp_path))
+
+    assert broker_discovery.get_bootstrap_servers() == ["b-1:9092", "b-2:9092"]
+    assert broker_discovery.get_bootstrap_servers() == ["b-1:9092", "b-2:9092"]
+    assert client.calls == 1
+
+def test_brokers_cached_in_file(tmp_path):
+    """
+    Tests that a re-initialised container reads brokers from the cache file
+    """
+    client = CountingBrokerClient("b-1:9092,b-2:9092")
+    BrokerDiscovery(CLUSTER_ARN, client, cache_dir=str(tmp_path)).get_bootstrap_servers()
+
+    broker_discovery = BrokerDiscovery(CLUSTER_ARN, client, cache_dir=str(tmp_path))
+
+    assert broker_discovery.get_bootstrap_servers() == ["b-1:9092", "b-2:9092"]
+    assert client.calls == 1
+
+def test_brokers_expired(tmp_path):
+    """
+    Tests that brokers are discovered again when the cache is expired
+    """
+    client = CountingBrokerClient("b-1:9092")
+    broker_discovery = BrokerDiscovery(CLUSTER_ARN, client, ttl=0, cache_dir=str(tmp_path))
+
+    broker_discovery.get_bootstrap_servers()
+    broker_discovery.get_bootstrap_servers()
+
+    assert client.calls == 2
+
+def test_brokers_refresh(tmp_path):
+    """
+    Tests that a refresh replaces cached brokers in memory and in the file
+    """
+    client = CountingBrokerClient("b-1:9092")
+    broker_discovery = BrokerDiscovery(CLUSTER_ARN, client, cache_dir=str(tmp_path))
+    broker_discovery.get_bootstrap_servers()
+
+    client.bootstrap_servers = "b-3:9092"
+    assert broker_discovery.refresh() == ["b-3:9092"]
+
+    broker_discovery = BrokerDiscovery(CLUSTER_ARN, client, cache_dir=str(tmp_path))
+    assert broker_discovery.get_bootstrap_servers() == ["b-3:9092"]
+    assert client.calls == 2
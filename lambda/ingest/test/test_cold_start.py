@@ -0,0 +1,40 @@
+import os
+import sys
+import glob
+import shutil
+import subprocess
+
+INGEST_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules shared with the Consume Lambda, bundled next to the handler
+SHARED_DIR = os.path.join(os.path.dirname(INGEST_DIR), "process", "shared")
+# Modules the producer path must not import in the Lambda init phase
+HEAVY_MODULES = ["kafka.admin", "kafka.consumer", "botocore"]
+
+def bundle_kafka(output_dir):
+    """
+    Copies the vendored Kafka client and applies the patches of the bundling
+    step, see lib/gateway-stack.ts
+    """
+    shutil.copytree(os.path.join(INGEST_DIR, "kafka"), os.path.join(output_dir, "kafka"))
+    for patch in sorted(glob.glob(os.path.join(INGEST_DIR, "patches", "*.patch"))):
+        subprocess.run(["patch", "-p1", "--forward", "-i", patch],
+                       cwd=output_dir, check=True, capture_output=True)
+
+def test_heavy_modules_not_imported_at_init(tmp_path):
+    """
+    Tests that the patches apply to the vendored Kafka client and importing
+    the handler with the producer path does not import the admin client, the
+    consumer and botocore
+    """
+    bundle_kafka(str(tmp_path))
+    env = dict(os.environ)
+    env.pop('FMDP_TEST_ENV', None)
+    env['PYTHONPATH'] = os.pathsep.join([str(tmp_path), INGEST_DIR, SHARED_DIR, env.get('PYTHONPATH', '')])
+
+    result = subprocess.run(
+        [sys.executable, "-c",
+         "import sys, app, kafka_producer; "
+         f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"],
+        cwd=str(tmp_path), env=env, capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == ""
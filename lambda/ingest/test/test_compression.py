@@ -0,0 +1,34 @@
+import compression
+from compression import choose_compression
+
+def test_small_requests_uncompressed():
+    """
+    Tests that single Match events and small requests are sent uncompressed
+    """
+    assert choose_compression(1, 10 ** 6) is None
+    assert choose_compression(100, compression.COMPRESSION_MIN_BATCH_BYTES - 1) is None
+
+def test_codec_by_cpu_budget(monkeypatch):
+    """
+    Tests that large requests get the preferred available codec of the CPU budget
+    """
+    monkeypatch.setattr(compression, 'get_available_codecs', lambda: ['gzip', 'lz4'])
+    size = compression.COMPRESSION_MIN_BATCH_BYTES
+
+    monkeypatch.setattr(compression, 'COMPRESSION_CPU_BUDGET', 'low')
+    assert choose_compression(100, size) == 'lz4'
+    monkeypatch.setattr(compression, 'COMPRESSION_CPU_BUDGET', 'high')
+    assert choose_compression(100, size) == 'gzip'
+
+    monkeypatch.setattr(compression, 'get_available_codecs', lambda: ['gzip'])
+    monkeypatch.setattr(compression, 'COMPRESSION_CPU_BUDGET', 'low')
+    assert choose_compression(100, size) is None
+
+def test_fixed_codec(monkeypatch):
+    """
+    Tests that a configured codec is used for every request
+    """
+    monkeypatch.setattr(compression, 'INGEST_COMPRESSION', 'gzip')
+    assert choose_compression(1, 10) == 'gzip'
+    monkeypatch.setattr(compression, 'INGEST_COMPRESSION', 'none')
+    assert choose_compression(1000, 10 ** 6) is None
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+from pydantic import ValidationError
+
+import fast_validation
+from app import validate_batch_body
+from data_model import MatchEvent
+
+VALID = {
+    "match_id": "000001",
+    "event_type": "goal",
+    "team": "Team A",
+    "player": "Player 1",
+    "timestamp": "2024-02-15T13:30:00Z"
+}
+
+def make_body(**fields) -> str:
+    body = dict(VALID)
+    body.update(fields)
+    return json.dumps({
+        key: value for key, value in body.items() if value is not ...
+    })
+
+BODIES = [
+    make_body(),
+    make_body(event_id="client-event-1"),
+    make_body(event_id=1),
+    make_body(extra="ignored"),
+    make_body(match_id="abc"),
+    make_body(match_id=""),
+    make_body(match_id="١٢"), # Unicode digits
+    make_body(match_id=1),
+    make_body(match_id=None),
+    make_body(match_id=...),
+    make_body(event_type="GOAL"),
+    make_body(event_type="goal "),
+    make_body(event_type="pass"),
+    make_body(event_type="foul"),
+    make_body(team=...),
+    make_body(player=["Player 1"]),
+    make_body(player="José"),
+    make_body(player="\ud800"), # Lone surrogate
+    make_body(timestamp="2024-02-15T13:30:00+05:30"),
+    make_body(timestamp="2024-02-15T13:30:00-0800"),
+    make_body(timestamp="2024-02-15T13:30:00+24:00"),
+    make_body(timestamp="2024-02-15T13:30:00"),
+    make_body(timestamp="2024-02-15 13:30:00Z"),
+    make_body(timestamp="2024-02-15t13:30:00Z"),
+    make_body(timestamp="2024-2-5T1:2:3Z"),
+    make_body(timestamp="2024-02-15T13:30:60Z"),
+    make_body(timestamp="2024-02-29T13:30:00Z"),
+    make_body(timestamp="2023-02-29T13:30:00Z"),
+    make_body(timestamp="2024-04-31T13:30:00Z"),
+    make_body(timestamp="0000-01-01T00:00:00Z"),
+    make_body(timestamp="2024-02-15T13:30:00.123Z"),
+    make_body(timestamp="2024-02-15T13:30:00z"),
+    '{"match_id": "1", "match_id": "x", "event_type": "goal", "team": "A", '
+    '"player": "B", "timestamp": "2024-02-15T13:30:00Z"}', # Duplicate keys
+    '[]',
+    '"goal"',
+    '{"match_id": ',
+    ''
+]
+
+def validate(validator, body):
+    try:
+        match_event = validator(body)
+    except ValidationError as ex:
+        return "error", [(error['loc'], error['msg']) for error in ex.errors()]
+
+    fields = match_event.model_dump()
+    if "event_id" not in match_event.model_fields_set:
+        fields.pop("event_id") # Generated
+    serialized_fields = list(json.loads(match_event.to_json_bytes()))
+    return "valid", fields, match_event.model_fields_set, serialized_fields
+
+@pytest.mark.parametrize("body", BODIES)
+def test_single_parity(body):
+    """
+    Tests that the fast path validates a Match event as the model
+    """
+    assert (validate(fast_validation.validate_json, body) ==
+            validate(MatchEvent.model_validate_json, body))
+
+def test_batch_parity():
+    """
+    Tests that a batch reports the first error of the model per Match event
+    Batch items are parsed first, the model validates them as Python objects
+    """
+    items = [body for body in BODIES if body.startswith('{') and body.endswith('}')]
+
+    match_events, errors = validate_batch_body('\n'.join(items))
+
+    for index, body in enumerate(items):
+        try:
+            expected = MatchEvent.model_validate(json.loads(body))
+        except ValidationError as ex:
+            assert match_events[index] is None
+            assert errors[index] == ex.errors()[0]['msg']
+        else:
+            assert index not in errors
+            assert (match_events[index].model_dump(exclude={"event_id"}) ==
+                    expected.model_dump(exclude={"event_id"}))
@@ -0,0 +1,78 @@
+import json
+
+import app
+from idempotency import IdempotencyCache
+
+def make_event(body, resource="/matches/event", headers=None):
+    return {
+        "resource": resource,
+        "path": resource,
+        "httpMethod": "POST",
+        "headers": headers or {},
+        "body": body,
+        "isBase64Encoded": False
+    }
+
+def make_body(player="Player 1", timestamp="2024-03-01T20:15:00Z"):
+    return json.dumps({
+        "match_id": "000042",
+        "event_type": "goal",
+        "team": "Team A",
+        "player": player,
+        "timestamp": timestamp
+    })
+
+def test_cache_lru_and_ttl():
+    """
+    Tests that the cache evicts the least recently used and expired keys
+    """
+    cache = IdempotencyCache(max_size=2, ttl=60)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+
+    assert cache.get("a") == "1" and cache.get("b") is None and cache.get("c") == "3"
+
+    expired = IdempotencyCache(max_size=2, ttl=0)
+    expired.put("a", "1")
+    assert expired.get("a") is None
+
+def test_retry_gets_original_event_id():
+    """
+    Tests that a retried Match event gets the event_id of the original
+    """
+    body = make_body()
+
+    first = json.loads(app.handler(make_event(body), None)["body"])
+    retry = json.loads(app.handler(make_event(body), None)["body"])
+    other = json.loads(app.handler(make_event(make_body(player="Player 2")), None)["body"])
+
+    assert first["event_id"] == retry["event_id"]
+    assert other["event_id"] != first["event_id"]
+
+def test_idempotency_key_header():
+    """
+    Tests that requests with the same Idempotency-Key get the same event_id
+    """
+    headers = { "idempotency-key": "feed-request-7" }
+
+    first = json.loads(app.handler(
+        make_event(make_body(timestamp="2024-03-01T20:16:00Z"), headers=headers), None)["body"])
+    retry = json.loads(app.handler(
+        make_event(make_body(timestamp="2024-03-01T20:16:01Z"), headers=headers), None)["body"])
+
+    assert first["event_id"] == retry["event_id"]
+
+def test_batch_duplicates():
+    """
+    Tests that duplicates within a batch and retries of a batch share event_ids
+    """
+    body = make_body(timestamp="2024-03-01T20:17:00Z")
+    batch = "\n".join([body, body, make_body(timestamp="2024-03-01T20:17:01Z")])
+
+    first = json.loads(app.handler(make_event(batch, resource="/matches/events"), None)["body"])
+    retry = json.loads(app.handler(make_event(batch, resource="/matches/events"), None)["body"])
+
+    assert first["event_ids"][0] == first["event_ids"][1] != first["event_ids"][2]
+    assert retry["event_ids"] == first["event_ids"]
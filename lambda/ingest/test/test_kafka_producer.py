@@ -0,0 +1,193 @@
+import json
+
+import pytest
+
+import app
+import kafka_producer
+from kafka_producer import get_producer_context, reset_producer_context
+
+CLUSTER_ARN = "arn:aws:kafka:us-east-1:123456789012:cluster/test/1"
+
+class LocalSender:
+    """
+    Stand-in for the sender thread of the producer
+    """
+    def __init__(self):
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+class LocalKafkaProducer:
+    """
+    Stand-in for KafkaProducer, records its configs and whether it is closed
+    """
+    created = []
+
+    def __init__(self, **configs):
+        self.configs = configs
+        self._closed = False
+        self._sender = LocalSender()
+        LocalKafkaProducer.created.append(self)
+
+    def close(self, timeout=None):
+        self._closed = True
+
+class LocalBrokerDiscovery:
+    """
+    Stand-in for the broker discovery of the MSK cluster
+    """
+    def get_bootstrap_servers(self):
+        return "b-1:9092"
+
+    def refresh(self):
+        return "b-2:9092"
+
+@pytest.fixture(autouse=True)
+def local_producers(monkeypatch):
+    LocalKafkaProducer.created = []
+    monkeypatch.setattr(kafka_producer, 'KafkaProducer', LocalKafkaProducer)
+    monkeypatch.setattr(kafka_producer, 'get_broker_discovery',
+                        lambda msk_cluster_arn: LocalBrokerDiscovery())
+    monkeypatch.setattr(kafka_producer, '_producer_contexts', {})
+    # Tests never replace the SIGTERM handler of the test runner
+    monkeypatch.setattr(kafka_producer, '_register_shutdown_handler', lambda: None)
+
+def test_vendored_producer_attributes():
+    """
+    Tests that the vendored Kafka client has the private attributes read by
+    the health check and the producer load
+    """
+    from kafka import KafkaProducer
+
+    producer = KafkaProducer(bootstrap_servers="localhost:9", api_version=(2, 8))
+    try:
+        assert producer._closed is False
+        assert producer._sender.is_alive()
+        pool = producer._accumulator._free
+        assert len(pool._waiters) == 0
+        assert len(pool._free) > 0
+        assert producer._accumulator._incomplete.all() == []
+    finally:
+        producer.close(timeout=0)
+
+def test_producer_reused():
+    """
+    Tests that warm invocations reuse the producer of the container
+    """
+    first = get_producer_context(CLUSTER_ARN, 1)
+    second = get_producer_context(CLUSTER_ARN, 1)
+
+    assert first is second
+    assert len(LocalKafkaProducer.created) == 1
+    assert first.producer.configs["bootstrap_servers"] == "b-1:9092"
+
+def test_unhealthy_producer_rebuilt():
+    """
+    Tests that a producer with a dead sender thread or closed after a Kafka
+    error is closed and replaced on the next call
+    """
+    first = get_producer_context(CLUSTER_ARN, 1)
+    first.producer._sender.alive = False
+
+    second = get_producer_context(CLUSTER_ARN, 1)
+    assert second is not first
+    assert first.producer._closed and not second.producer._closed
+
+    reset_producer_context(1)
+    third = get_producer_context(CLUSTER_ARN, 1)
+    assert third is not second and second.producer._closed
+    assert len(LocalKafkaProducer.created) == 3
+
+def test_producer_without_private_attributes_reused():
+    """
+    Tests that a producer whose client does not expose the private attributes
+    of the health check is reused, not rebuilt on every call
+    """
+    first = get_producer_context(CLUSTER_ARN, 1)
+    del first.producer._closed, first.producer._sender
+
+    assert get_producer_context(CLUSTER_ARN, 1) is first
+
+def test_contexts_per_acks_and_compression():
+    """
+    Tests that producers are kept per acks and compression type, and a reset
+    of one acks setting keeps the others
+    """
+    leader = get_producer_context(CLUSTER_ARN, 1)
+    leader_gzip = get_producer_context(CLUSTER_ARN, 1, 'gzip')
+    all_replicas = get_producer_context(CLUSTER_ARN, 'all')
+
+    assert len({id(leader), id(leader_gzip), id(all_replicas)}) == 3
+    assert leader_gzip.producer.configs["compression_type"] == 'gzip'
+    assert all_replicas.producer.configs["acks"] == 'all'
+
+    reset_producer_context(1)
+    assert leader.producer._closed and leader_gzip.producer._closed
+    assert get_producer_context(CLUSTER_ARN, 'all') is all_replicas
+
+class LocalFuture:
+    def __init__(self):
+        self.is_done = False
+
+class LocalProducerContext:
+    """
+    Stand-in producer context, buffers messages and delivers them on flush
+    unless the flush times out
+    """
+    def __init__(self, delivered):
+        self.delivered = delivered
+        self.futures = []
+        self.flushes = []
+
+    def get_load(self):
+        return 0.0
+
+    def send_async(self, topic_name, value, errback, key=None, headers=None):
+        self.futures.append(LocalFuture())
+        return self.futures[-1]
+
+    def flush(self, timeout):
+        self.flushes.append(timeout)
+        for future in self.futures[:self.delivered]:
+            future.is_done = True
+        return self.delivered == len(self.futures)
+
+def send_async_batch(monkeypatch, producer_context, count, team):
+    metrics = []
+    monkeypatch.setattr(app, 'TEST_ENV', None)
+    monkeypatch.setattr(app, 'put_metric',
+                        lambda name, value, **kwargs: metrics.append((name, value)))
+    monkeypatch.setattr(kafka_producer, 'get_producer_context',
+                        lambda *args: producer_context)
+    body = [{ "match_id": "000001", "event_type": "pass", "team": team,
+              "player": f"{team} Player {index}", "timestamp": "2024-02-15T13:30:00Z" }
+            for index in range(count)]
+    result = app.handler({
+        "resource": "/matches/events",
+        "headers": { "X-Delivery-Mode": "async" },
+        "body": json.dumps(body)
+    }, None)
+    return result, metrics
+
+def test_async_request_flushed_before_response(monkeypatch):
+    """
+    Tests that an async request waits a bounded time for its messages to be
+    sent before it responds 202
+    """
+    producer_context = LocalProducerContext(delivered=3)
+    result, metrics = send_async_batch(monkeypatch, producer_context, 3, "Team A")
+
+    assert result["statusCode"] == 202
+    assert producer_context.flushes == [kafka_producer.KAFKA_ASYNC_FLUSH_MS / 1000]
+    assert metrics == []
+
+def test_unflushed_messages_reported(monkeypatch):
+    """
+    Tests that messages still buffered after the flush timeout are reported
+    """
+    producer_context = LocalProducerContext(delivered=1)
+    result, metrics = send_async_batch(monkeypatch, producer_context, 3, "Team B")
+
+    assert result["statusCode"] == 202
+    assert metrics == [("UnflushedEvents", 2)]
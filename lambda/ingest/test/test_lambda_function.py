@@ -1,6 +1,9 @@
 import json
 
+import pytest
+
 import app
+from data_model import MatchEvent
 
 def test_request_success():
     """
@@ -92,3 +95,262 @@ def test_request_match_id_fail():
 
     assert result["statusCode"] == 400
 
+def test_batch_request_partial_fail():
+    """
+    Tests the response when a batch contains valid and invalid Match events
+    """
+
+    body = [
+        {
+            "match_id": "000001",
+            "event_type": "goal",
+            "team": "Team A",
+            "player": "Player 1",
+            "timestamp": "2024-02-15T13:30:00Z"
+        },
+        {
+            "match_id": "a00001", # Invalid Match id character
+            "event_type": "pass",
+            "team": "Team A",
+            "player": "Player 2",
+            "timestamp": "2024-02-15T13:31:00Z"
+        }
+    ]
+    event = {
+        "resource": "/matches/events",
+        "path": "/matches/events",
+        "httpMethod": "POST",
+        "headers": {
+            "Content-Type": "application/json"
+        },
+        "queryStringParameters": {},
+        "pathParameters": {},
+        "body": json.dumps(body),
+        "isBase64Encoded": False
+    }
+
+    result = app.handler(event, None)
+    result_body = json.loads(result["body"])
+
+    assert result["statusCode"] == 200
+    assert result_body["event_ids"][0] is not None
+    assert result_body["event_ids"][1] is None
+    assert result_body["errors"] == [{
+        "index": 1,
+        "description": "Value error, Match id must contain only integers"
+    }]
+
+def test_batch_request_ndjson():
+    """
+    Tests the response when a batch is sent as NDJSON
+    """
+
+    body = [
+        {
+            "match_id": "000001",
+            "event_type": "goal",
+            "team": "Team A",
+            "player": "Player 1",
+            "timestamp": "2024-02-15T13:30:00Z"
+        },
+        {
+            "match_id": "000001",
+            "event_type": "foul",
+            "team": "Team B",
+            "player": "Player 3",
+            "timestamp": "2024-02-15T13:32:00Z"
+        }
+    ]
+    event = {
+        "resource": "/matches/events",
+        "path": "/matches/events",
+        "httpMethod": "POST",
+        "headers": {
+            "Content-Type": "application/x-ndjson"
+        },
+        "queryStringParameters": {},
+        "pathParameters": {},
+        "body": "\n".join(json.dumps(item) for item in body) + "\n{invalid",
+        "isBase64Encoded": False
+    }
+
+    result = app.handler(event, None)
+    result_body = json.loads(result["body"])
+
+    assert result["statusCode"] == 200
+    assert len(result_body["event_ids"]) == 3
+    assert result_body["errors"] == [{ "index": 2, "description": "Invalid JSON" }]
+
+def test_batch_request_fail():
+    """
+    Tests the response when a batch has no valid Match events
+    """
+
+    event = {
+        "resource": "/matches/events",
+        "path": "/matches/events",
+        "httpMethod": "POST",
+        "headers": {
+            "Content-Type": "application/json"
+        },
+        "queryStringParameters": {},
+        "pathParameters": {},
+        "body": json.dumps([{ "match_id": "000001" }]),
+        "isBase64Encoded": False
+    }
+
+    result = app.handler(event, None)
+
+    assert result["statusCode"] == 400
+
+def test_batch_request_too_large(monkeypatch):
+    """
+    Tests that a batch above the max batch size is rejected before its Match
+    events are validated
+    """
+    monkeypatch.setattr(app, 'MAX_BATCH_SIZE', 2)
+    monkeypatch.setattr(app, 'validate_batch', lambda items, errors: pytest.fail("Batch validated"))
+    body = {
+        "match_id": "000001",
+        "event_type": "pass",
+        "team": "Team A",
+        "player": "Player 1",
+        "timestamp": "2024-02-15T13:30:00Z"
+    }
+    event = {
+        "resource": "/matches/events",
+        "path": "/matches/events",
+        "httpMethod": "POST",
+        "headers": {
+            "Content-Type": "application/json"
+        },
+        "queryStringParameters": {},
+        "pathParameters": {},
+        "body": json.dumps([body] * 3),
+        "isBase64Encoded": False
+    }
+
+    result = app.handler(event, None)
+
+    assert result["statusCode"] == 413
+    assert "at most 2 Match events" in result["body"]
+
+def test_request_async_delivery():
+    """
+    Tests the response when the request selects asynchronous delivery
+    """
+
+    body = {
+        "match_id": "000001",
+        "event_type": "pass",
+        "team": "Team A",
+        "player": "Player 1",
+        "timestamp": "2024-02-15T13:30:00Z"
+    }
+    event = {
+        "resource": "/matches/event",
+        "path": "/matches/event",
+        "httpMethod": "POST",
+        "headers": {
+            "Content-Type": "application/json",
+            "x-delivery-mode": "async"
+        },
+        "queryStringParameters": {},
+        "pathParameters": {},
+        "body": json.dumps(body),
+        "isBase64Encoded": False
+    }
+
+    result = app.handler(event, None)
+
+    assert result["statusCode"] == 202
+    assert json.loads(result["body"])["event_id"]
+
+def test_request_delivery_mode_fail():
+    """
+    Tests the response when the request selects an unknown delivery mode
+    """
+
+    body = {
+        "match_id": "000001",
+        "event_type": "goal",
+        "team": "Team A",
+        "player": "Player 1",
+        "timestamp": "2024-02-15T13:30:00Z"
+    }
+    event = {
+        "resource": "/matches/event",
+        "path": "/matches/event",
+        "httpMethod": "POST",
+        "headers": {
+            "Content-Type": "application/json",
+            "X-Delivery-Mode": "eventually" # Invalid delivery mode
+        },
+        "queryStringParameters": {},
+        "pathParameters": {},
+        "body": json.dumps(body),
+        "isBase64Encoded": False
+    }
+
+    result = app.handler(event, None)
+
+    assert result["statusCode"] == 400
+
+@pytest.mark.parametrize('report, name', [
+    (app.report_duplicate_events, "DuplicateEvents"),
+    (lambda match_events: app.report_shed_events(match_events, 0.9), "ShedEvents")
+])
+def test_event_type_metric(monkeypatch, report, name):
+    """
+    Tests that reported Match events are counted in one metric per event type
+    """
+    metrics = []
+    monkeypatch.setattr(app, 'put_metric',
+                        lambda name, value, **kwargs: metrics.append((name, value, kwargs)))
+    match_events = [
+        MatchEvent(match_id="000001", event_type=event_type, team="Team A",
+                   player="Player 1", timestamp="2024-02-15T13:30:00Z")
+        for event_type in ["pass", "goal", "pass"]
+    ]
+
+    report(match_events)
+
+    assert metrics == [
+        (name, 2, { "dimensions": { "EventType": "pass" } }),
+        (name, 1, { "dimensions": { "EventType": "goal" } })
+    ]
+
+@pytest.mark.parametrize('log_events', [False, True])
+def test_request_log(monkeypatch, capsys, log_events):
+    """
+    Tests that requests are logged by their request id and body size, the
+    full event only if INGEST_LOG_EVENTS is enabled
+    """
+    monkeypatch.setattr(app, 'INGEST_LOG_EVENTS', log_events)
+    body = json.dumps({
+        "match_id": "000001",
+        "event_type": "pass",
+        "team": "Team A",
+        "player": "Player 1",
+        "timestamp": "2024-02-15T13:30:00Z"
+    })
+    event = {
+        "resource": "/matches/event",
+        "path": "/matches/event",
+        "httpMethod": "POST",
+        "headers": {
+            "Content-Type": "application/json"
+        },
+        "requestContext": { "requestId": "request-1" },
+        "body": body,
+        "isBase64Encoded": False
+    }
+
+    result = app.handler(event, None)
+
+    assert result["statusCode"] == 200
+    log = capsys.readouterr().out
+    assert "request-1" in log
+    assert ("Player 1" in log) == log_events
+    if not log_events:
+        assert f"'bytes': {len(body)}" in log
@@ -0,0 +1,27 @@
+from partitioner import HotMatchPartitioner
+
+PARTITIONS = list(range(8))
+
+def test_match_events_in_one_partition():
+    """
+    Tests that events of a match which is not hot go to one partition
+    """
+    partitioner = HotMatchPartitioner(["000002"])
+
+    partitions = {
+        partitioner(b"000001", PARTITIONS, PARTITIONS) for _ in range(20)
+    }
+
+    assert len(partitions) == 1
+
+def test_hot_match_events_balanced():
+    """
+    Tests that events of a hot match are balanced over salted partitions
+    """
+    partitioner = HotMatchPartitioner(["000001"], salt_buckets=4)
+
+    partitions = {
+        partitioner(b"000001", PARTITIONS, PARTITIONS) for _ in range(20)
+    }
+
+    assert 1 < len(partitions) <= 4
@@ -0,0 +1,90 @@
+import json
+import time
+import asyncio
+import threading
+
+import app
+import server
+from server import IngestServer
+
+BODY = json.dumps({
+    "match_id": "000001",
+    "event_type": "goal",
+    "team": "Team A",
+    "player": "Player 1",
+    "timestamp": "2024-02-15T13:30:00Z"
+}).encode('utf-8')
+
+async def send_request(reader, writer, resource: str, body: bytes):
+    writer.write(f"POST {resource} HTTP/1.1\r\nHost: localhost\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    headers = {}
+    for line in header_lines:
+        if line:
+            name, _, value = line.partition(':')
+            headers[name.lower()] = value.strip()
+    response_body = await reader.readexactly(int(headers['content-length']))
+    return int(status_line.split(' ')[1]), headers, json.loads(response_body)
+
+def test_keep_alive_requests():
+    """
+    Tests that several requests are served over one keep-alive connection
+    """
+    async def run():
+        server = IngestServer('127.0.0.1', 0, workers=2)
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+            results = [
+                await send_request(reader, writer, '/matches/event', BODY),
+                await send_request(reader, writer, '/matches/events', BODY + b'\n' + BODY),
+                await send_request(reader, writer, '/matches/unknown', BODY)
+            ]
+            writer.close()
+            return results
+        finally:
+            await server.stop()
+
+    single, batch, unknown = asyncio.run(run())
+
+    assert single[0] == 200 and single[1]['connection'] == 'keep-alive'
+    assert single[2]['event_id']
+    assert batch[0] == 200 and len(batch[2]['event_ids']) == 2
+    assert unknown[0] == 404
+
+def test_stop_bounded(monkeypatch):
+    """
+    Tests that the server stops within the shutdown timeout while a request
+    is stuck waiting for Kafka
+    """
+    released = threading.Event()
+
+    def stuck_handler(event, context):
+        released.wait(5)
+        return app.get_success_response({ "event_id": "stuck" })
+
+    monkeypatch.setattr(app, 'handler', stuck_handler)
+    monkeypatch.setattr(server, 'SHUTDOWN_TIMEOUT', 0.2)
+
+    async def run():
+        ingest_server = IngestServer('127.0.0.1', 0, workers=1)
+        await ingest_server.start()
+        reader, writer = await asyncio.open_connection('127.0.0.1', ingest_server.port)
+        writer.write(f"POST /matches/event HTTP/1.1\r\nHost: localhost\r\n"
+                     f"Content-Length: {len(BODY)}\r\n\r\n".encode('latin-1') + BODY)
+        await writer.drain()
+        while not ingest_server.requests:
+            await asyncio.sleep(0.01)
+
+        started = time.monotonic()
+        await ingest_server.stop()
+        return time.monotonic() - started
+
+    try:
+        assert asyncio.run(run()) < 1
+    finally:
+        released.set()
@@ -0,0 +1,84 @@
+import uuid
+import json
+
+import pytest
+
+from data_model import MatchEvent
+from wire_format import (BINARY_WIRE_FORMAT, JSON_WIRE_FORMAT, WireFormatError,
+                         decode_binary, is_binary)
+
+def make_match_event(**fields) -> MatchEvent:
+    body = {
+        "match_id": "000001",
+        "event_type": "goal",
+        "team": "Team A",
+        "player": "Player 1",
+        "timestamp": "2024-02-15T13:30:00Z"
+    }
+    body.update(fields)
+    return MatchEvent(**body)
+
+@pytest.mark.parametrize("timestamp", [
+    "2024-02-15T13:30:00Z",
+    "2024-02-15T13:30:00+05:30",
+    "1969-12-31T23:59:59-08:00"
+])
+def test_binary_round_trip(timestamp):
+    """
+    Tests that a Match event is decoded exactly as it was encoded
+    """
+    match_event = make_match_event(timestamp=timestamp)
+
+    value = match_event.to_wire_bytes(BINARY_WIRE_FORMAT)
+
+    assert is_binary(value)
+    assert len(value) < len(match_event.to_json_bytes()) / 3
+    assert decode_binary(value) == match_event.model_dump()
+
+@pytest.mark.parametrize("fields", [
+    { "event_id": "client-event-1" }, # Not a UUID
+    { "event_id": str(uuid.uuid4()).upper() }, # Not a canonical UUID
+    { "timestamp": "2024-02-15T13:30:00+0000" } # Not a canonical UTC offset
+])
+def test_json_fallback(fields):
+    """
+    Tests that Match events the binary format cannot represent exactly are sent as JSON
+    """
+    match_event = make_match_event(**fields)
+
+    value = match_event.to_wire_bytes(BINARY_WIRE_FORMAT)
+
+    assert not is_binary(value)
+    assert json.loads(value) == match_event.model_dump()
+
+def test_binary_malformed():
+    """
+    Tests that malformed binary records are rejected
+    """
+    value = make_match_event().to_wire_bytes(BINARY_WIRE_FORMAT)
+
+    with pytest.raises(WireFormatError):
+        decode_binary(value[:-1])
+    with pytest.raises(WireFormatError):
+        decode_binary(value[:1] + b'\x63' + value[2:]) # Unknown schema id
+
+@pytest.mark.parametrize("wire_format, schema", [
+    (BINARY_WIRE_FORMAT, b"binary/1"),
+    (JSON_WIRE_FORMAT, b"json")
+])
+def test_record_headers(wire_format, schema):
+    """
+    Tests that record headers carry routing fields and the schema version
+    """
+    match_event = make_match_event(event_type="pass")
+
+    value = match_event.to_wire_bytes(wire_format)
+    headers = dict(match_event.record_headers(value, 1708003800000))
+
+    assert headers == {
+        "event_id": match_event.event_id.encode('utf-8'),
+        "match_id": b"000001",
+        "event_type": b"pass",
+        "schema": schema,
+        "ingest_ts": b"1708003800000"
+    }
@@ -0,0 +1,49 @@
+import json
+import pytest
+
+import app
+import zstd_dictionary
+from data_model import MatchEvent
+from wire_format import HEADER_ZSTD_DICTIONARY
+
+pytest.importorskip("zstandard")
+
+@pytest.fixture
+def dictionary_id(tmp_path, monkeypatch):
+    samples = [
+        MatchEvent(match_id=f"{index % 380:06d}", event_type="pass",
+                   team=f"Team {index % 20}", player=f"Player {index % 25}",
+                   timestamp=f"2024-10-15T14:{index // 60 % 60:02d}:{index % 60:02d}Z")
+        .to_json_bytes()
+        for index in range(2000)
+    ]
+    dictionary = zstd_dictionary.train_dictionary(samples, 2048, dictionary_id=4242)
+    (tmp_path / "4242.dict").write_bytes(dictionary.as_bytes())
+
+    monkeypatch.setattr(zstd_dictionary, 'ZSTD_DICTIONARY_DIR', str(tmp_path))
+    zstd_dictionary.load_dictionary.cache_clear()
+    yield dictionary.dict_id()
+    zstd_dictionary.load_dictionary.cache_clear()
+
+def test_message_compressed_with_dictionary(dictionary_id, monkeypatch):
+    """
+    Tests that JSON records are compressed with the dictionary and carry its id
+    """
+    monkeypatch.setattr(app, 'ZSTD_DICTIONARY_ID', dictionary_id)
+    match_event = MatchEvent(match_id="000042", event_type="goal", team="Team A",
+                             player="Player 1", timestamp="2024-03-01T20:15:00Z")
+
+    _, value, headers = app.get_message(match_event, 1700000000000)
+    headers = dict(headers)
+
+    assert headers[HEADER_ZSTD_DICTIONARY] == str(dictionary_id).encode('utf-8')
+    assert headers['schema'] == b'json'
+    assert len(value) < len(match_event.to_json_bytes())
+    assert json.loads(zstd_dictionary.decompress(value, dictionary_id)) == match_event.model_dump()
+
+def test_unknown_dictionary(dictionary_id):
+    """
+    Tests that records of an unknown dictionary are rejected
+    """
+    with pytest.raises(zstd_dictionary.ZstdDictionaryError):
+        zstd_dictionary.decompress(b"\x28\xb5\x2f\xfd", dictionary_id + 1)
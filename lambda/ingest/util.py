@@ -1,14 +1,15 @@
 import json
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 def get_response(status_code: int,
-                 message: str, params: Dict[str, Any]=None) -> Dict[str, Any]:
+                 message: str, params: Dict[str, Any]=None,
+                 headers: Dict[str, str]=None) -> Dict[str, Any]:
     """
     Generates a required response for the API
     :param status_code: Status code
     :param message: A message with details
     :param params: Additional parameters
-    :param body: Response body
+    :param headers: Additional response headers
     :return: The response data
     """
     body = {
@@ -18,11 +19,15 @@ def get_response(status_code: int,
     if params is not None:
         body.update(params)
 
+    response_headers = {
+        "Content-Type": "application/json"
+    }
+    if headers is not None:
+        response_headers.update(headers)
+
     return {
         "statusCode": status_code,
-        "headers": {
-            "Content-Type": "application/json"
-        },
+        "headers": response_headers,
         "body": json.dumps(body)
     }
 
@@ -33,3 +38,60 @@ def get_success_response(params: Dict[str, Any]=None) -> Dict[str, Any]:
     :return: The response data"
     """
     return get_response(200, "Match event ingested OK", params)
+
+def get_accepted_response(params: Dict[str, Any]=None) -> Dict[str, Any]:
+    """
+    Generates a response for a Match event accepted for asynchronous delivery
+    :param params: Additional parameters
+    :return: The response data
+    """
+    return get_response(202, "Match event accepted", params)
+
+def get_overloaded_response(retry_after: int,
+                            params: Dict[str, Any]=None) -> Dict[str, Any]:
+    """
+    Generates a response for a Match event shed under producer overload
+    :param retry_after: Seconds to wait before retrying
+    :param params: Additional parameters
+    :return: The response data
+    """
+    return get_response(429, "Too many requests, retry later", params,
+                        { "Retry-After": str(retry_after) })
+
+def get_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    """
+    Returns a request header, header names are case-insensitive
+    :param event: The event data
+    :param name: Header name
+    :return: Header value or None
+    """
+    headers = event.get('headers') or {}
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+def get_batch_response(status_code: int, message: str,
+                       match_events: List[Optional[Any]],
+                       errors: Dict[int, str],
+                       headers: Dict[str, str]=None) -> Dict[str, Any]:
+    """
+    Generates a response for a batch of Match events
+    :param status_code: Status code
+    :param message: A message with details
+    :param match_events: Match events by item index, None for failed items
+    :param errors: Error descriptions by item index
+    :param headers: Additional response headers
+    :return: The response data
+    """
+    return get_response(status_code, message, {
+        "event_ids": [
+            match_event.event_id if match_event is not None else None
+            for match_event in match_events
+        ],
+        "errors": [
+            { "index": index, "description": errors[index] }
+            for index in sorted(errors)
+        ]
+    }, headers)
@@ -0,0 +1,47 @@
+"""
+Benchmark of decoding and logging in the Consume Lambda
+Compares the handler time of a batch decoded sequentially with every
+record logged and of a batch decoded per partition in parallel with
+sampled logging
+
+Run: PYTHONPATH=../consume:../shared python bench_consume.py [--events N]
+     [--partitions N] [--workers N] [--rounds N]
+"""
+import os
+import argparse
+
+from bench_fused import consume, make_event, timed
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--partitions', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--sample-rate', type=float, default=0.01)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    event = make_event(args.events, args.partitions)
+    consume.FUSED = False
+    # The former handler logged the whole event and every record
+    modes = [
+        ('sequential, all logged', 1, 1.0, True),
+        ('sequential, sampled', 1, args.sample_rate, False),
+        (f"{args.workers} workers, sampled", args.workers, args.sample_rate, False)
+    ]
+    print(f"Match events: {args.events}, partitions: {args.partitions}")
+    for name, workers, sample_rate, log_event in modes:
+        consume.CONSUME_DECODE_WORKERS = workers
+        consume.CONSUME_LOG_SAMPLE_RATE = sample_rate
+
+        def run() -> None:
+            if log_event:
+                print(f"Started consuming Match events: {event}")
+            consume.handler(event, None)
+
+        seconds = min(timed(run) for _ in range(args.rounds))
+        print(f"  {name:25s} {seconds * 1000:8.1f} ms "
+              f"{seconds / args.events * 1e6:6.2f} us/event")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Latency and cost benchmark of the processing modes of a batch of Match events
+Runs the Consume, Enrich and Store handlers against stand-in AWS clients:
+workflow - Consume starts the workflow, the workflow passes the batch as JSON
+           to the Enrich and Store Lambdas, large batches go through S3
+fused    - Consume runs the Enrich and Store handlers in-process
+Reports handler time per batch, end-to-end latency with the modelled
+overhead of workflow hops, and cost per million Match events
+
+Run: PYTHONPATH=../consume:../shared python bench_fused.py [--batch-sizes N,N,...]
+     [--hop-ms MS] [--max-concurrency N] [--rounds N]
+"""
+import io
+import os
+import json
+import time
+import uuid
+import base64
+import argparse
+import contextlib
+from typing import Any, Callable, Dict, List
+
+# Large workflow batches are claim-checked in the stand-in S3 bucket
+os.environ.setdefault('CLAIM_CHECK_BUCKET', 'bench-claim-check-bucket')
+# Rounds replay the same batch, deduplication would drop it
+os.environ.setdefault('CONSUME_DEDUP', 'false')
+os.environ.setdefault('COUNTERS_TABLE_NAME', 'bench-counters-table')
+
+import boto3
+
+class StandInS3:
+    """
+    Stand-in S3 client, keeps objects in memory
+    """
+    def __init__(self) -> None:
+        self.objects: Dict[Any, bytes] = {}
+
+    def put_object(self, Bucket: str, Key: str, Body: Any, **kwargs: Any) -> None:
+        self.objects[(Bucket, Key)] = bytes(Body)
+
+    def get_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+class StandInStepFunctions:
+    """
+    Stand-in Step Functions client, keeps the input of the last execution
+    """
+    def __init__(self) -> None:
+        self.input = None
+
+    def start_execution(self, stateMachineArn: str, input: str) -> Dict[str, Any]:
+        self.input = input
+        return {"executionArn": "arn:aws:states:local:execution"}
+
+class StandInDynamoDB:
+    """
+    Stand-in DynamoDB client, counts written items and counter update
+    transactions
+    """
+    def __init__(self) -> None:
+        self.items = 0
+        self.transactions = 0
+
+    def batch_write_item(self, RequestItems: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        self.items += sum(len(requests) for requests in RequestItems.values())
+        return {"UnprocessedItems": {}}
+
+    def transact_write_items(self, TransactItems: List[Dict[str, Any]]) -> None:
+        self.transactions += 1
+
+s3 = StandInS3()
+stepfunctions = StandInStepFunctions()
+dynamodb = StandInDynamoDB()
+boto3.client = lambda name, **kwargs: {'s3': s3, 'stepfunctions': stepfunctions}[name]
+boto3.resource = lambda name, **kwargs: type('DynamoDB', (), {
+    'meta': type('Meta', (), {'client': dynamodb})})()
+
+import app as consume
+from pipeline import load_stage
+
+enrich = load_stage('enrich')
+store = load_stage('store')
+
+# AWS pricing of us-east-1, x86 Lambda
+LAMBDA_GB_SECOND_USD = 0.0000166667
+LAMBDA_REQUEST_USD = 0.20 / 1e6
+STEP_FUNCTIONS_TRANSITION_USD = 0.025 / 1000
+# Consume, Enrich and Store Lambdas have the same memory size
+LAMBDA_MEMORY_GB = 0.5
+
+def make_event(count: int, partitions: int = 2) -> Dict[str, Any]:
+    """
+    Generates an MSK event source batch of JSON Match event records
+    :param count: Number of Match events
+    :param partitions: Number of topic partitions
+    :return: The event data
+    """
+    event_types = ["goal", "pass", "foul"]
+    records: Dict[str, List[Dict[str, Any]]] = {}
+    for index in range(count):
+        match_id = f"{index % 380:06d}"
+        partition = index % partitions
+        value = json.dumps({
+            "event_id": str(uuid.uuid4()),
+            "match_id": match_id,
+            "event_type": event_types[index % len(event_types)],
+            "team": f"Team {index % 20}",
+            "player": f"Player {index % 25}",
+            "timestamp": f"2024-10-15T14:{index // 60 % 60:02d}:{index % 60:02d}Z"
+        })
+        records.setdefault(f"topic-{partition}", []).append({
+            "topic": "topic",
+            "partition": partition,
+            "offset": index,
+            "timestamp": 0,
+            "key": base64.b64encode(match_id.encode('utf-8')).decode('ascii'),
+            "value": base64.b64encode(value.encode('utf-8')).decode('ascii')
+        })
+    return {"records": records}
+
+def timed(operation: Callable[[], Any]) -> float:
+    """
+    Runs an operation with its logs discarded
+    :return: Wall time in seconds
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        operation()
+        return time.perf_counter() - started
+
+def run_workflow(event: Dict[str, Any]) -> List[float]:
+    """
+    Runs the workflow chain, payloads are serialized between the hops
+    :return: Handler time of Consume and of Enrich and Store per shard in seconds
+    """
+    consume.FUSED = False
+    durations = [timed(lambda: consume.handler(event, None))]
+    for shard in json.loads(stepfunctions.input)['shards']:
+        enriched = {}
+
+        def run_enrich() -> None:
+            enriched['payload'] = json.dumps(enrich.handler(shard, None))
+
+        durations.append(timed(run_enrich))
+        durations.append(timed(lambda: store.handler(json.loads(enriched['payload']), None)))
+    return durations
+
+def run_fused(event: Dict[str, Any]) -> List[float]:
+    """
+    Runs the fused pipeline
+    :return: Handler time of Consume in seconds
+    """
+    consume.FUSED = True
+    return [timed(lambda: consume.handler(event, None))]
+
+def get_latency(durations: List[float], max_concurrency: int) -> float:
+    """
+    Models the latency of a batch, the Map state processes shards in waves
+    :param durations: Handler time of Consume and of Enrich and Store per shard
+    :param max_concurrency: Max shards processed in parallel
+    :return: Latency in seconds without the overhead of hops
+    """
+    shards = [durations[index] + durations[index + 1]
+              for index in range(1, len(durations), 2)]
+    latency = durations[0]
+    for start in range(0, len(shards), max_concurrency):
+        latency += max(shards[start:start + max_concurrency])
+    return latency
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-sizes', default='10,100,1000,10000')
+    parser.add_argument('--hop-ms', type=float, default=50.0,
+                        help="modelled overhead of a workflow start and of each Lambda task")
+    parser.add_argument('--transitions', type=int, default=4,
+                        help="state transitions per workflow execution and shard")
+    parser.add_argument('--max-concurrency', type=int, default=8,
+                        help="shards of a batch processed in parallel by the workflow")
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'events':>7} {'mode':>9} {'shards':>7} {'handlers ms':>12} {'latency ms':>11} "
+          f"{'invocations':>12} {'USD per 1M events':>18}")
+    for batch_size in [int(size) for size in args.batch_sizes.split(',')]:
+        event = make_event(batch_size)
+        for mode, run, hops in [('workflow', run_workflow, 3), ('fused', run_fused, 0)]:
+            durations = min((run(event) for _ in range(args.rounds)), key=sum)
+            shards = (len(durations) - 1) // 2
+            latency_ms = hops * args.hop_ms
+            if shards:
+                latency_ms += get_latency(durations, args.max_concurrency) * 1000
+            else:
+                latency_ms += sum(durations) * 1000
+
+            cost = (sum(durations) * LAMBDA_MEMORY_GB * LAMBDA_GB_SECOND_USD +
+                    len(durations) * LAMBDA_REQUEST_USD)
+            if hops:
+                cost += args.transitions * max(shards, 1) * STEP_FUNCTIONS_TRANSITION_USD
+            print(f"{batch_size:7d} {mode:>9} {shards:7d} {sum(durations) * 1000:12.1f} "
+                  f"{latency_ms:11.1f} {len(durations):12d} "
+                  f"{cost * 1e6 / batch_size:18.4f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark of DynamoDB writes of the Store Lambda
+Writes a batch of Match events with BatchWriteItem requests of 25 items one
+after another, like the batch writer of the Table resource, and in parallel
+over a thread pool, against a stand-in client with a fixed request latency
+and an optional share of throttled items
+
+Run: PYTHONPATH=../store python bench_store.py [--events N] [--latency-ms MS]
+     [--unprocessed RATE] [--workers N,N,...]
+"""
+import uuid
+import random
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from batch_writer import ParallelBatchWriter
+
+class StandInDynamoDB:
+    """
+    Stand-in DynamoDB client, answers after a fixed latency and leaves a
+    share of items unprocessed
+    """
+    def __init__(self, latency: float, unprocessed_rate: float) -> None:
+        self.latency = latency
+        self.unprocessed_rate = unprocessed_rate
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def batch_write_item(self, RequestItems: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        (table, requests), = RequestItems.items()
+        unprocessed = [request for request in requests
+                       if random.random() < self.unprocessed_rate]
+        with self._lock:
+            self.items += len(requests) - len(unprocessed)
+        return {"UnprocessedItems": {table: unprocessed} if unprocessed else {}}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=30.0,
+                        help="modelled latency of a BatchWriteItem request")
+    parser.add_argument('--unprocessed', type=float, default=0.05,
+                        help="share of items left unprocessed by a request")
+    parser.add_argument('--workers', default='1,4,8,16')
+    args = parser.parse_args()
+
+    items = [{"event_id": str(uuid.uuid4()), "match_id": f"{index % 380:06d}",
+              "event_type": "pass", "season": "2024-2025"}
+             for index in range(args.events)]
+    print(f"{'workers':>8} {'seconds':>8} {'items/s':>9} {'requests':>9} "
+          f"{'throttles':>10} {'max request ms':>15}")
+    for workers in [int(count) for count in args.workers.split(',')]:
+        client = StandInDynamoDB(args.latency_ms / 1000, args.unprocessed)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            writer = ParallelBatchWriter("bench-table", client=client, executor=executor)
+            metrics = writer.write(items)
+        assert client.items == args.events
+        print(f"{workers:8d} {metrics['seconds']:8.3f} {metrics['items_per_second']:9d} "
+              f"{metrics['requests']:9d} {metrics['throttles']:10d} "
+              f"{metrics['max_request_ms']:15.1f}")
+
+if __name__ == '__main__':
+    main()
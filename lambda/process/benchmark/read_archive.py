@@ -0,0 +1,56 @@
+"""
+Reads raw Match events of the partitioned S3 archive
+Lists only the partitions of the given seasons, dates and matches: dates
+are read from their manifests, seasons are listed by their prefixes
+
+Run: PYTHONPATH=../store python read_archive.py --bucket BUCKET
+     [--seasons S,S,...] [--dates D,D,...] [--match-ids ID,ID,...]
+     [--list] [--output FILE]
+"""
+import sys
+import json
+import argparse
+from typing import List, Optional
+
+import boto3
+
+from archive import list_objects, read_match_events
+
+def split(value: Optional[str]) -> Optional[List[str]]:
+    """
+    Splits a comma-separated argument
+    :return: Values, None if not given
+    """
+    return [part for part in value.split(',') if part] if value else None
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bucket', required=True)
+    parser.add_argument('--seasons', help="comma-separated seasons, e.g. 2024-2025")
+    parser.add_argument('--dates', help="comma-separated UTC dates, e.g. 2024-10-15")
+    parser.add_argument('--match-ids', help="comma-separated match ids")
+    parser.add_argument('--list', action='store_true', help="list objects only")
+    parser.add_argument('--output', help="NDJSON output file, stdout if not given")
+    args = parser.parse_args()
+
+    s3 = boto3.client('s3')
+    objects = list_objects(s3, args.bucket, split(args.seasons), split(args.dates),
+                           split(args.match_ids))
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        count = 0
+        for archived in objects:
+            if args.list:
+                print(json.dumps(archived), file=output)
+                continue
+            for match_event in read_match_events(s3, args.bucket, archived['key']):
+                print(json.dumps(match_event), file=output)
+                count += 1
+        if not args.list:
+            print(f"Read {count} Match events", file=sys.stderr)
+    finally:
+        if args.output:
+            output.close()
+
+if __name__ == '__main__':
+    main()
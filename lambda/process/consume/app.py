@@ -1,10 +1,61 @@
 import os
 import json
 import base64
+import random
 import boto3
-from typing import Any, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from wire_format import (HEADER_EVENT_ID, HEADER_EVENT_TYPE, HEADER_MATCH_ID,
+                         HEADER_ZSTD_DICTIONARY, decode_binary, is_binary)
+import zstd_dictionary
+from claim_check import CLAIM_CHECK_FIELD, needs_claim_check, put_items
+from pipeline import FUSED_PROCESSING_MODE, PROCESSING_MODE, load_stage, run_fused
+from dedup import CONSUME_DEDUP, Deduplicator, RotatingBloomFilter
+from quarantine import Quarantine
 
 STATE_MACHINE_ARN = os.getenv("STATE_MACHINE_ARN")
+FUSED = PROCESSING_MODE == FUSED_PROCESSING_MODE
+# Max size of Match events enriched and stored by one branch of the workflow,
+# shards of a batch are processed in parallel. At most the claim-check
+# threshold, a shard of a batch passed inline stays below the payload limit
+CONSUME_SHARD_BYTES = int(os.getenv('CONSUME_SHARD_BYTES', '131072'))
+# Threads decoding topic partitions in parallel, off by default: decoding
+# JSON and base64 holds the GIL, only zstd decompression runs in parallel.
+# Lambda has no /dev/shm for process pools
+CONSUME_DECODE_WORKERS = int(os.getenv('CONSUME_DECODE_WORKERS', '1'))
+# Share of records logged, logs of every record dominate large batches
+CONSUME_LOG_SAMPLE_RATE = float(os.getenv('CONSUME_LOG_SAMPLE_RATE', '0.01'))
+
+def get_event_types(name: str) -> Optional[FrozenSet[str]]:
+    """
+    Returns event types configured in a comma-separated environment variable
+    :param name: Environment variable name
+    :return: Event types, None if not configured
+    """
+    event_types = frozenset(
+        event_type.strip() for event_type in os.getenv(name, '').split(',')
+        if event_type.strip()
+    )
+    return event_types or None
+
+# Event types processed by the workflow, records of other event types are
+# dropped by their headers without decoding values. All if not configured
+CONSUME_EVENT_TYPES = get_event_types("CONSUME_EVENT_TYPES")
+# Event types only counted per match from record headers, e.g. pass statistics
+CONSUME_COUNT_ONLY_EVENT_TYPES = get_event_types("CONSUME_COUNT_ONLY_EVENT_TYPES") or frozenset()
+
+_decode_executor: Optional[ThreadPoolExecutor] = None
+
+# event_ids seen by the warm container, restored from the last snapshot
+deduplicator = Deduplicator(RotatingBloomFilter()) if CONSUME_DEDUP else None
+if deduplicator is not None:
+    deduplicator.restore()
+
+# Load the Enrich and Store handlers in the Lambda init phase
+if FUSED:
+    load_stage('enrich')
+    load_stage('store')
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
@@ -13,37 +64,335 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     :param context: The context data
     :return: The object with status code
     """
-    print(f"Started consuming Match events: {event}")
+    extra = {
+        "records": sum(len(records) for records in event['records'].values()),
+        "partitions": len(event['records'])}
+    print(f"Started consuming Match events: {extra}")
+
+    # Partitions are decoded in parallel if enabled, results keep the
+    # partition order
+    partitions = list(event['records'].values())
+    if len(partitions) > 1 and CONSUME_DECODE_WORKERS > 1:
+        results = list(get_decode_executor().map(decode_partition, partitions))
+    else:
+        results = [decode_partition(records) for records in partitions]
+
+    # Records failing to decode are quarantined, the rest of the batch continues
+    batch_name = get_batch_name(event)
+    quarantine = Quarantine('consume', batch_name)
+    event_groups = []
+    counted = []
+    dropped = 0
+    for groups, partition_counted, partition_dropped, failed in results:
+        for record, ex in failed:
+            quarantine.add(record, ex, topic=record.get('topic'),
+                           partition=record.get('partition'), offset=record.get('offset'))
+        event_groups.extend(groups)
+        counted.extend(partition_counted)
+        dropped += partition_dropped
 
+    # Drop Match events redelivered after they were processed, counted
+    # records follow the Match events in the indexes of the batch
+    duplicates = set()
+    if deduplicator is not None:
+        duplicates = deduplicator.find_duplicates(
+            (event_id for group in event_groups for event_id, _ in group),
+            (event_id for event_id, _, _ in counted))
+
+    # event_ids are remembered once the batch is handed off
     match_events = []
-    for _, records in event['records'].items():
-        for record in records:
-            value = base64.b64decode(record['value']).decode('utf-8')
-            match_events.append(value)
-            
-            extra = {
-                "topic": record['topic'],
-                "partition": record['partition'],
-                "offset": record['offset'],
-                "timestamp": record['timestamp'],
-                "value": value}
-            print(f"Received Match event: {extra}")
+    match_groups = []
+    processed_ids = []
+    index = 0
+    for group in event_groups:
+        values = []
+        for event_id, value in group:
+            if index not in duplicates:
+                values.append(value)
+                processed_ids.append(event_id)
+            index += 1
+        if values:
+            match_events.extend(values)
+            match_groups.append(values)
 
-    lambda_event = {
-        'match_events': match_events,
+    # Event counts per match of count-only event types
+    event_counts = {}
+    for event_id, match_id, event_type in counted:
+        if index not in duplicates:
+            match_counts = event_counts.setdefault(match_id, {})
+            match_counts[event_type] = match_counts.get(event_type, 0) + 1
+            processed_ids.append(event_id)
+        index += 1
+
+    extra = {
+        "processed": len(match_events),
+        "counted": sum(sum(counts.values()) for counts in event_counts.values()),
+        "dropped": dropped,
+        "duplicates": len(duplicates),
+        "quarantined": len(quarantine),
+        "event_counts": event_counts}
+    print(f"Routed Match events: {extra}")
+
+    # Quarantined records are written before the batch is handed off,
+    # a failed write retries the batch
+    quarantine.flush()
+    result = {
+        "statusCode": 200,
+        "offsets": get_offsets(event, quarantine)
     }
+    print(f"Consumed offsets: {result['offsets']}")
+
+    if not match_events and not event_counts:
+        return result
+
+    if FUSED:
+        run_fused(match_events, event_counts, batch_name)
+        if deduplicator is not None:
+            deduplicator.remember(processed_ids)
+            deduplicator.snapshot()
+        return result
+
+    # The workflow enriches and stores shards of the batch in parallel
+    shards = [
+        {
+            'name': f"{batch_name}-{index}",
+            'match_events': shard_events,
+            'event_counts': {},
+        }
+        for index, shard_events in enumerate(get_shards(match_groups, CONSUME_SHARD_BYTES))
+    ] or [{ 'name': f"{batch_name}-0", 'match_events': [], 'event_counts': {} }]
+    shards[0]['event_counts'] = event_counts
+    payload = json.dumps({ 'shards': shards })
+
+    # Batches above the Step Functions payload limit go through S3,
+    # the workflow gets a claim check of each shard
+    if needs_claim_check(len(payload)):
+        shards = [
+            {
+                'name': shard['name'],
+                'match_events': [],
+                CLAIM_CHECK_FIELD: put_items(shard['match_events'], shard['name']),
+                'event_counts': shard['event_counts'],
+            }
+            for index, shard in enumerate(shards)
+        ]
+        payload = json.dumps({ 'shards': shards })
+    print(f"Sharded Match events: {len(shards)} shards")
 
     try:
         stepfunctions_client = boto3.client('stepfunctions')
         response = stepfunctions_client.start_execution(
             stateMachineArn=STATE_MACHINE_ARN,
-            input=json.dumps(lambda_event)
+            input=payload
         )
         print(f"Execution started, state machine ARN: {response['executionArn']}")
     except Exception as ex:
         print(f"Error starting Step Function execution: {str(ex)}")
         raise ex
 
-    return {
-        "statusCode": 200
-    }
+    if deduplicator is not None:
+        deduplicator.remember(processed_ids)
+        deduplicator.snapshot()
+
+    return result
+
+def decode_partition(records: List[Dict[str, Any]]) -> Tuple[List[List[Tuple[Optional[str], Any]]], List[Tuple[Optional[str], Optional[str], str]], int, List[Tuple[Dict[str, Any], Exception]]]:
+    """
+    Decodes the records of a topic partition
+    Records are keyed by match_id: all events of a match are in one partition
+    in offset order, they are grouped per match without sorting or merging
+    partitions
+    :param records: Kafka records of the partition in offset order
+    :return: event_ids and Match events grouped per match, event_id,
+        match_id and event type of count-only records, the number of dropped
+        records and records failed to decode with their errors
+    """
+    events_by_match = {}
+    counted = []
+    dropped = 0
+    failed = []
+    for record in records:
+        try:
+            headers = get_record_headers(record)
+        except Exception as ex:
+            failed.append((record, ex))
+            continue
+
+        # Route by record headers, values of dropped and counted records
+        # are never decoded. Records without headers are processed
+        event_type = headers.get(HEADER_EVENT_TYPE)
+        if event_type is not None:
+            if CONSUME_EVENT_TYPES is not None and event_type not in CONSUME_EVENT_TYPES:
+                dropped += 1
+                continue
+            if event_type in CONSUME_COUNT_ONLY_EVENT_TYPES:
+                counted.append((headers.get(HEADER_EVENT_ID),
+                                headers.get(HEADER_MATCH_ID), event_type))
+                continue
+
+        # The fused pipeline takes decoded Match events, the workflow takes JSON
+        try:
+            if FUSED:
+                value = decode_record(base64.b64decode(record['value']), headers)
+            else:
+                value = decode_record_value(base64.b64decode(record['value']), headers)
+        except Exception as ex:
+            failed.append((record, ex))
+            continue
+        events_by_match.setdefault(record.get('key'), []).append(
+            (get_event_id(value, headers), value))
+
+        # Log records are built only for sampled records
+        if CONSUME_LOG_SAMPLE_RATE and random.random() < CONSUME_LOG_SAMPLE_RATE:
+            extra = {
+                "topic": record['topic'],
+                "partition": record['partition'],
+                "offset": record['offset'],
+                "timestamp": record['timestamp'],
+                "value": value}
+            print(f"Received Match event: {extra}")
+
+    return list(events_by_match.values()), counted, dropped, failed
+
+def get_event_id(value: Any, headers: Dict[str, str]) -> Optional[str]:
+    """
+    Returns the event_id of a Match event
+    :param value: Decoded Match event or its JSON
+    :param headers: Record headers, records of the Ingest Lambda carry the event_id
+    :return: event_id, None if unknown or deduplication is disabled
+    """
+    event_id = headers.get(HEADER_EVENT_ID)
+    if event_id is not None or deduplicator is None:
+        return event_id
+    try:
+        match_event = value if isinstance(value, dict) else json.loads(value)
+        return match_event.get('event_id')
+    except (ValueError, AttributeError):
+        return None
+
+def get_decode_executor() -> ThreadPoolExecutor:
+    """
+    Returns the decoding thread pool, reused by warm invocations
+    :return: Thread pool
+    """
+    global _decode_executor
+    if _decode_executor is None:
+        _decode_executor = ThreadPoolExecutor(max_workers=CONSUME_DECODE_WORKERS,
+                                              thread_name_prefix='decode')
+    return _decode_executor
+
+def get_shards(match_groups: List[List[str]], max_bytes: int) -> List[List[str]]:
+    """
+    Splits Match events into shards of at most max_bytes
+    Events of a match stay in one shard in their order, unless the match
+    alone exceeds the shard size
+    :param match_groups: Match events grouped per match
+    :param max_bytes: Max size of the Match events of a shard
+    :return: Match events per shard
+    """
+    shards = []
+    shard = []
+    shard_bytes = 0
+    # Sizes are approximate, the payload is checked against the limit
+    for values in match_groups:
+        group_bytes = sum(len(value) + 2 for value in values)
+        if shard and shard_bytes + group_bytes > max_bytes:
+            shards.append(shard)
+            shard = []
+            shard_bytes = 0
+        for value in values:
+            if shard and shard_bytes + len(value) + 2 > max_bytes:
+                shards.append(shard)
+                shard = []
+                shard_bytes = 0
+            shard.append(value)
+            shard_bytes += len(value) + 2
+    if shard:
+        shards.append(shard)
+    return shards
+
+def get_batch_name(event: Dict[str, Any]) -> str:
+    """
+    Returns the name of a batch of records
+    A retried batch starts at the same offset and gets the same name
+    :param event: The event data
+    :return: Topic, partition and offset of the first record
+    """
+    for records in event['records'].values():
+        for record in records:
+            return f"{record['topic']}-{record['partition']}-{record['offset']}"
+    return "empty"
+
+def get_offsets(event: Dict[str, Any], quarantine: Quarantine) -> Dict[str, Dict[str, Any]]:
+    """
+    Reports the consumed offsets of a batch
+    Offsets of the range not quarantined succeeded
+    :param event: The event data
+    :param quarantine: Quarantined records of the batch
+    :return: First and last offset and quarantined offsets per topic partition
+    """
+    quarantined = {}
+    for entry in quarantine.entries:
+        quarantined.setdefault((entry['topic'], entry['partition']), []).append(entry['offset'])
+
+    offsets = {}
+    for records in event['records'].values():
+        if not records:
+            continue
+        topic, partition = records[0]['topic'], records[0]['partition']
+        offsets[f"{topic}-{partition}"] = {
+            "first": records[0]['offset'],
+            "last": records[-1]['offset'],
+            "quarantined": quarantined.get((topic, partition), [])
+        }
+    return offsets
+
+def get_record_headers(record: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Returns the headers of a Kafka record
+    The event source delivers headers as a list of {key: [byte values]}
+    :param record: Kafka record
+    :return: Header values by key
+    """
+    headers = {}
+    for header in record.get('headers') or []:
+        for key, value in header.items():
+            headers[key] = bytes(value).decode('utf-8')
+    return headers
+
+def decode_record(value: bytes, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Decodes a Match event record value
+    :param value: Record value in the binary or JSON wire format
+    :param headers: Record headers
+    :return: Match event
+    """
+    value = decompress_record_value(value, headers)
+    if is_binary(value):
+        return decode_binary(value)
+    return json.loads(value)
+
+def decode_record_value(value: bytes, headers: Optional[Dict[str, str]] = None) -> str:
+    """
+    Decodes a Match event record value to JSON
+    :param value: Record value in the binary or JSON wire format
+    :param headers: Record headers
+    :return: Match event JSON
+    """
+    value = decompress_record_value(value, headers)
+    if is_binary(value):
+        return json.dumps(decode_binary(value))
+    return value.decode('utf-8')
+
+def decompress_record_value(value: bytes, headers: Optional[Dict[str, str]]) -> bytes:
+    """
+    Decompresses a record value compressed with a zstd dictionary
+    :param value: Record value
+    :param headers: Record headers, values compressed with a zstd dictionary
+        carry its id
+    :return: Uncompressed record value
+    """
+    dictionary_id = (headers or {}).get(HEADER_ZSTD_DICTIONARY)
+    if dictionary_id is not None:
+        return zstd_dictionary.decompress(value, int(dictionary_id))
+    return value
@@ -0,0 +1,276 @@
+import os
+import math
+import time
+import gzip
+import struct
+import hashlib
+import threading
+from typing import Any, Iterable, List, Optional, Set
+
+# Drops Match events redelivered by MSK or retried by the event source before
+# they are enriched and stored again. Recently seen event_ids are kept in a
+# rotating Bloom filter of the warm container, matches are confirmed in the
+# DynamoDB table, so a false positive never drops a new Match event
+CONSUME_DEDUP = os.getenv('CONSUME_DEDUP', 'true').lower() == 'true'
+# event_ids per filter generation, the filter remembers between one and two
+# generations
+CONSUME_DEDUP_CAPACITY = int(os.getenv('CONSUME_DEDUP_CAPACITY', '1000000'))
+CONSUME_DEDUP_FALSE_POSITIVE_RATE = float(os.getenv('CONSUME_DEDUP_FALSE_POSITIVE_RATE', '0.001'))
+# S3 snapshot of the filter, restored by cold starts
+CONSUME_DEDUP_SNAPSHOT_BUCKET = os.getenv('CONSUME_DEDUP_SNAPSHOT_BUCKET')
+CONSUME_DEDUP_SNAPSHOT_KEY = os.getenv('CONSUME_DEDUP_SNAPSHOT_KEY', 'dedup/event-id-filter.bin.gz')
+CONSUME_DEDUP_SNAPSHOT_INTERVAL = int(os.getenv('CONSUME_DEDUP_SNAPSHOT_INTERVAL', '300'))
+DYNAMODB_TABLE_NAME = os.getenv('DYNAMODB_TABLE_NAME')
+
+SNAPSHOT_MAGIC = b'FMDB'
+# magic, bits, hashes, event_ids of the current and previous generation
+SNAPSHOT_HEADER = struct.Struct('<4sQIQQ')
+# Keys per BatchGetItem request
+MAX_BATCH_GET_KEYS = 100
+MAX_BATCH_GET_ATTEMPTS = 3
+
+class BloomFilter:
+    """
+    Bloom filter of strings sized for a capacity and false-positive rate
+    """
+    def __init__(self, capacity: int, false_positive_rate: float) -> None:
+        self.size = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> List[int]:
+        # Double hashing of a 128-bit digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+    def add(self, key: str) -> None:
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+class RotatingBloomFilter:
+    """
+    Two generations of Bloom filters, the older one is dropped when the
+    current one reaches its capacity
+    """
+    def __init__(self, capacity: int = CONSUME_DEDUP_CAPACITY,
+                 false_positive_rate: float = CONSUME_DEDUP_FALSE_POSITIVE_RATE) -> None:
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self.current = BloomFilter(capacity, false_positive_rate)
+        self.previous = BloomFilter(capacity, false_positive_rate)
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self.current or key in self.previous
+
+    def add(self, key: str) -> None:
+        with self._lock:
+            if self.current.count >= self.capacity:
+                self.previous = self.current
+                self.current = BloomFilter(self.capacity, self.false_positive_rate)
+            self.current.add(key)
+
+    def get_stats(self) -> dict:
+        """
+        Returns the configuration and usage of the filter
+        :return: Capacity, false-positive rate, memory and remembered event_ids
+        """
+        return {
+            "capacity": self.capacity,
+            "false_positive_rate": self.false_positive_rate,
+            "hashes": self.current.hashes,
+            "memory_bytes": len(self.current.bits) + len(self.previous.bits),
+            "remembered": self.current.count + self.previous.count
+        }
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the filter to a gzip snapshot
+        :return: Snapshot bytes
+        """
+        with self._lock:
+            header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, self.current.size, self.current.hashes,
+                                          self.current.count, self.previous.count)
+            return gzip.compress(header + self.current.bits + self.previous.bits,
+                                 compresslevel=1, mtime=0)
+
+    def load_bytes(self, snapshot: bytes) -> bool:
+        """
+        Restores the filter from a snapshot
+        :param snapshot: Snapshot bytes
+        :return: True if restored, False if the snapshot has another layout,
+            e.g. after a change of capacity or false-positive rate
+        """
+        data = gzip.decompress(snapshot)
+        magic, size, hashes, current_count, previous_count = SNAPSHOT_HEADER.unpack_from(data)
+        length = len(self.current.bits)
+        if (magic != SNAPSHOT_MAGIC or size != self.current.size or hashes != self.current.hashes
+                or len(data) != SNAPSHOT_HEADER.size + 2 * length):
+            return False
+
+        with self._lock:
+            offset = SNAPSHOT_HEADER.size
+            self.current.bits = bytearray(data[offset:offset + length])
+            self.previous.bits = bytearray(data[offset + length:])
+            self.current.count = current_count
+            self.previous.count = previous_count
+        return True
+
+class Deduplicator:
+    """
+    Finds Match events already processed by the pipeline
+    """
+    def __init__(self, seen: RotatingBloomFilter, dynamodb: Any = None, s3: Any = None) -> None:
+        self.seen = seen
+        self._dynamodb = dynamodb
+        self._s3 = s3
+        self.snapshot_at = time.monotonic()
+
+    def find_duplicates(self, event_ids: Iterable[Optional[str]],
+                        counted_ids: Iterable[Optional[str]] = ()) -> Set[int]:
+        """
+        Finds duplicate Match events of a batch
+        The others are remembered only once the batch is handed off, see
+        remember: a failed batch is retried in full. Store writes a Match
+        event to the DynamoDB table after its counters and archive, a stored
+        Match event confirms the whole store of it.
+        Count-only Match events are never stored, filter matches of them are
+        duplicates without confirmation: a false positive drops one count at
+        the false-positive rate
+        :param event_ids: event_ids of the batch in order, None if unknown
+        :param counted_ids: event_ids of count-only Match events of the
+            batch, indexed after event_ids
+        :return: Indexes of duplicates: repeats within the batch, Match
+            events of the filter confirmed in the DynamoDB table and count-only
+            Match events of the filter
+        """
+        duplicates = set()
+        first_indexes = {}
+        candidates = {}
+        index = -1
+        for index, event_id in enumerate(event_ids):
+            if event_id is None:
+                continue
+            if event_id in first_indexes:
+                duplicates.add(index)
+                continue
+            first_indexes[event_id] = index
+            if event_id in self.seen:
+                candidates[event_id] = index
+
+        counted_matches = 0
+        for index, event_id in enumerate(counted_ids, index + 1):
+            if event_id is None:
+                continue
+            if event_id in first_indexes or event_id in self.seen:
+                counted_matches += event_id not in first_indexes
+                duplicates.add(index)
+                continue
+            first_indexes[event_id] = index
+
+        confirmed = self._confirm(list(candidates)) if candidates else set()
+        # Unconfirmed matches are false positives, Match events still in the
+        # workflow or of a batch failed after its hand-off, they are processed
+        duplicates.update(candidates[event_id] for event_id in confirmed)
+
+        extra = {
+            "duplicates": len(duplicates),
+            "filter_matches": len(candidates) + counted_matches,
+            "unconfirmed": len(candidates) - len(confirmed),
+            **self.seen.get_stats()}
+        print(f"Deduplicated Match events: {extra}")
+        return duplicates
+
+    def remember(self, event_ids: Iterable[Optional[str]]) -> None:
+        """
+        Remembers event_ids of a batch handed off to the pipeline, a retry of
+        a batch failed before is processed again
+        :param event_ids: event_ids, None if unknown
+        """
+        for event_id in event_ids:
+            if event_id is not None:
+                self.seen.add(event_id)
+
+    def _confirm(self, event_ids: List[str]) -> Set[str]:
+        """
+        Confirms filter matches with the stored Match events
+        :param event_ids: event_ids the filter has seen
+        :return: event_ids stored in the DynamoDB table
+        """
+        if not DYNAMODB_TABLE_NAME:
+            return set()
+
+        confirmed = set()
+        for start in range(0, len(event_ids), MAX_BATCH_GET_KEYS):
+            request = {
+                DYNAMODB_TABLE_NAME: {
+                    "Keys": [{ "event_id": { "S": event_id } }
+                             for event_id in event_ids[start:start + MAX_BATCH_GET_KEYS]],
+                    "ProjectionExpression": "event_id"
+                }
+            }
+            # Keys left unprocessed are not confirmed, their Match events are processed
+            for _ in range(MAX_BATCH_GET_ATTEMPTS):
+                response = self._get_dynamodb().batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(DYNAMODB_TABLE_NAME, []):
+                    confirmed.add(item['event_id']['S'])
+                request = response.get('UnprocessedKeys')
+                if not request:
+                    break
+        return confirmed
+
+    def snapshot(self, force: bool = False) -> None:
+        """
+        Writes the filter to S3 at most once per snapshot interval
+        :param force: Write regardless of the interval
+        """
+        if not CONSUME_DEDUP_SNAPSHOT_BUCKET:
+            return
+        if not force and time.monotonic() - self.snapshot_at < CONSUME_DEDUP_SNAPSHOT_INTERVAL:
+            return
+        self.snapshot_at = time.monotonic()
+        try:
+            self._get_s3().put_object(Bucket=CONSUME_DEDUP_SNAPSHOT_BUCKET,
+                                      Key=CONSUME_DEDUP_SNAPSHOT_KEY,
+                                      Body=self.seen.to_bytes())
+            print(f"Wrote dedup filter snapshot: {CONSUME_DEDUP_SNAPSHOT_KEY}")
+        except Exception as ex:
+            # The filter is an optimization, the batch is processed regardless
+            print(f"Error writing dedup filter snapshot: {str(ex)}")
+
+    def restore(self) -> None:
+        """
+        Restores the filter from the S3 snapshot of another container
+        """
+        if not CONSUME_DEDUP_SNAPSHOT_BUCKET:
+            return
+        try:
+            response = self._get_s3().get_object(Bucket=CONSUME_DEDUP_SNAPSHOT_BUCKET,
+                                                 Key=CONSUME_DEDUP_SNAPSHOT_KEY)
+            restored = self.seen.load_bytes(response['Body'].read())
+            print(f"Restored dedup filter snapshot: {restored}")
+        except Exception as ex:
+            print(f"Error restoring dedup filter snapshot: {str(ex)}")
+
+    def _get_dynamodb(self) -> Any:
+        if self._dynamodb is None:
+            import boto3
+            self._dynamodb = boto3.client('dynamodb')
+        return self._dynamodb
+
+    def _get_s3(self) -> Any:
+        if self._s3 is None:
+            import boto3
+            self._s3 = boto3.client('s3')
+        return self._s3
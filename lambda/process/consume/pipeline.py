@@ -0,0 +1,92 @@
+import os
+import sys
+import importlib.util
+from functools import lru_cache
+from types import ModuleType
+from typing import Any, Dict, List
+
+# Processing modes of a batch of Match events:
+# workflow - the Step Functions workflow runs the Enrich and Store Lambdas
+# fused - the Consume Lambda runs the Enrich and Store handlers in-process
+# on the decoded Match events, without workflow hops and serialization
+WORKFLOW_PROCESSING_MODE = 'workflow'
+FUSED_PROCESSING_MODE = 'fused'
+PROCESSING_MODE = os.getenv('PROCESSING_MODE', WORKFLOW_PROCESSING_MODE).lower()
+
+CONSUME_DIR = os.path.dirname(os.path.abspath(__file__))
+# Enrich and Store are bundled into stages/ of the fused Consume Lambda,
+# the repository keeps them next to the Consume Lambda
+STAGE_DIRS = [os.path.join(CONSUME_DIR, 'stages'), os.path.dirname(CONSUME_DIR)]
+
+@lru_cache(maxsize=None)
+def load_stage(name: str) -> ModuleType:
+    """
+    Loads the handler module of a processing Lambda as a library
+    :param name: Lambda directory name: enrich or store
+    :return: Handler module
+    :raises ImportError: If the Lambda is not bundled or a module of it is
+        already imported from another directory
+    """
+    for stage_dir in STAGE_DIRS:
+        directory = os.path.join(stage_dir, name)
+        path = os.path.join(directory, 'app.py')
+        if os.path.isfile(path):
+            break
+    else:
+        raise ImportError(f"Processing stage is not bundled: {name}")
+
+    # Stage-private modules, e.g. batch_writer of Store, are imported from the
+    # stage directory and kept as <stage>_<module>, so modules of the Consume
+    # Lambda and of other stages with the same name are never shadowed.
+    # Shared modules are bundled next to the Consume Lambda, see
+    # lambda/process/shared
+    for filename in os.listdir(directory):
+        module_name, extension = os.path.splitext(filename)
+        loaded = sys.modules.get(module_name)
+        if extension == '.py' and filename != 'app.py' and loaded is not None and \
+                not is_stage_module(loaded, directory):
+            raise ImportError(f"Module of processing stage {name} is already "
+                              f"imported from {getattr(loaded, '__file__', None)}: {module_name}")
+
+    imported = set(sys.modules)
+    spec = importlib.util.spec_from_file_location(f"{name}_app", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    sys.path.insert(0, directory)
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        sys.modules.pop(spec.name, None)
+        raise
+    finally:
+        sys.path.remove(directory)
+        for module_name in set(sys.modules) - imported:
+            if module_name != spec.name and is_stage_module(sys.modules[module_name], directory):
+                sys.modules[f"{name}_{module_name}"] = sys.modules.pop(module_name)
+    return module
+
+def is_stage_module(module: ModuleType, directory: str) -> bool:
+    """
+    Returns whether a module is imported from a stage directory
+    :param module: Imported module
+    :param directory: Stage directory
+    :return: True if the module file is in the directory
+    """
+    path = getattr(module, '__file__', None)
+    return path is not None and os.path.dirname(os.path.abspath(path)) == directory
+
+def run_fused(match_events: List[Dict[str, Any]],
+              event_counts: Dict[str, Dict[str, int]], name: str) -> Dict[str, Any]:
+    """
+    Enriches and stores a batch of Match events in-process
+    :param match_events: Decoded Match events
+    :param event_counts: Event counts per match of count-only event types
+    :param name: Batch name
+    :return: The object with status code of the Store handler
+    """
+    enriched = load_stage('enrich').handler({
+        'name': name,
+        'match_events': match_events,
+        'event_counts': event_counts,
+    }, None)
+    return load_stage('store').handler(enriched, None)
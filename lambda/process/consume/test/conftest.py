@@ -0,0 +1,161 @@
+import io
+import os
+import sys
+import json
+import uuid
+import base64
+
+import boto3
+import pytest
+
+# Modules shared by the processing Lambdas are bundled next to their handlers,
+# tests import them from lambda/process/shared
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'shared'))
+
+import zstd_dictionary
+from wire_format import (BINARY_WIRE_FORMAT, HEADER_ZSTD_DICTIONARY, JSON_WIRE_FORMAT,
+                         encode_binary, make_headers)
+
+class TransactionCanceledException(Exception):
+    def __init__(self, reasons):
+        super().__init__("Transaction cancelled")
+        self.response = { "CancellationReasons": reasons }
+
+class LocalDynamoDB:
+    """
+    Local DynamoDB stand-in, keeps items per table: Match events by event_id,
+    counters and batch markers by match_id. Takes typed keys for reads like
+    the low-level client and Python types for writes like the client of a
+    Table resource
+    """
+    exceptions = type('Exceptions', (), {
+        'TransactionCanceledException': TransactionCanceledException})
+
+    def __init__(self):
+        self.items = {}
+        self.requests = 0
+
+    def put_event_ids(self, table, event_ids):
+        items = self.items.setdefault(table, {})
+        for event_id in event_ids:
+            items[event_id] = { "event_id": event_id }
+
+    def batch_get_item(self, RequestItems):
+        self.requests += 1
+        (table, request), = RequestItems.items()
+        stored = self.items.get(table, {})
+        items = [key for key in request["Keys"] if key["event_id"]["S"] in stored]
+        return { "Responses": { table: items }, "UnprocessedKeys": {} }
+
+    def batch_write_item(self, RequestItems):
+        (table, requests), = RequestItems.items()
+        for request in requests:
+            item = request["PutRequest"]["Item"]
+            self.items.setdefault(table, {})[item["event_id"]] = item
+        return { "UnprocessedItems": {} }
+
+    def transact_write_items(self, TransactItems):
+        update, put = TransactItems[0]["Update"], TransactItems[1]["Put"]
+        items = self.items.setdefault(update["TableName"], {})
+        if put["Item"]["match_id"] in items:
+            raise TransactionCanceledException([{ "Code": "None" },
+                                                { "Code": "ConditionalCheckFailed" }])
+        items[put["Item"]["match_id"]] = put["Item"]
+        item = items.setdefault(update["Key"]["match_id"], {})
+        for placeholder, name in update["ExpressionAttributeNames"].items():
+            count = update["ExpressionAttributeValues"][placeholder.replace('#', ':')]
+            item[name] = item.get(name, 0) + count
+
+class LocalS3:
+    """
+    Local S3 stand-in, keeps objects in memory
+    """
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = bytes(Body)
+
+    def get_object(self, Bucket, Key):
+        return { "Body": io.BytesIO(self.objects[(Bucket, Key)]) }
+
+class LocalStepFunctions:
+    """
+    Local Step Functions stand-in, records the inputs of started executions
+    """
+    def __init__(self):
+        self.inputs = []
+
+    def start_execution(self, stateMachineArn, input):
+        self.inputs.append(json.loads(input))
+        return { "executionArn": f"{stateMachineArn}:execution-{len(self.inputs)}" }
+
+@pytest.fixture
+def dynamodb():
+    """
+    Local DynamoDB client of stored Match events
+    """
+    return LocalDynamoDB()
+
+@pytest.fixture
+def s3():
+    """
+    Local S3 client
+    """
+    return LocalS3()
+
+@pytest.fixture
+def stepfunctions(monkeypatch):
+    """
+    Local Step Functions client of the workflow
+    """
+    stepfunctions = LocalStepFunctions()
+    monkeypatch.setattr(boto3, 'client', lambda service_name, **kwargs: stepfunctions)
+    return stepfunctions
+
+@pytest.fixture
+def make_record():
+    """
+    Returns a factory of Kafka records of Match events, with the headers of
+    the Ingest Lambda unless headers is False. Binary records are made with
+    the encoder of the Ingest Lambda, JSON records are compressed with the zstd
+    dictionary of dictionary_id like the Ingest Lambda does
+    """
+    offsets = {}
+
+    def make(match_id="000001", event_type="goal", event_id=None, partition=0,
+             headers=True, value=None, wire_format=JSON_WIRE_FORMAT, dictionary_id=None):
+        event_id = event_id or str(uuid.uuid4())
+        match_event = {
+            "event_id": event_id,
+            "match_id": match_id,
+            "event_type": event_type,
+            "team": "Team A",
+            "player": "Player 1",
+            "timestamp": "2024-10-15T16:30:00Z"
+        }
+        if value is None and wire_format == BINARY_WIRE_FORMAT:
+            value = encode_binary(**match_event)
+            assert value is not None, "Match event cannot be encoded in the binary wire format"
+        if value is None:
+            value = json.dumps(match_event).encode('utf-8')
+        # The schema header describes the value before compression
+        record_headers = make_headers(event_id, match_id, event_type, value, 1728999000000)
+        if dictionary_id is not None:
+            value = zstd_dictionary.compress(value, dictionary_id)
+            record_headers.append((HEADER_ZSTD_DICTIONARY, str(dictionary_id).encode('utf-8')))
+        offset = offsets.get(partition, 0)
+        offsets[partition] = offset + 1
+        record = {
+            "topic": "match-events",
+            "partition": partition,
+            "offset": offset,
+            "timestamp": 1728999000000,
+            "key": match_id,
+            "value": base64.b64encode(value).decode('ascii')
+        }
+        if headers:
+            record["headers"] = [
+                { key: list(header_value) } for key, header_value in record_headers]
+        return record
+    return make
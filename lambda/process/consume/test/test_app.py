@@ -0,0 +1,253 @@
+import json
+import uuid
+
+import pytest
+
+import app
+import zstd_dictionary
+from dedup import Deduplicator, RotatingBloomFilter
+from app import decode_partition, get_shards
+from wire_format import BINARY_WIRE_FORMAT, JSON_WIRE_FORMAT
+
+@pytest.fixture(autouse=True)
+def workflow(monkeypatch):
+    """
+    Workflow processing mode without deduplication
+    """
+    monkeypatch.setattr(app, 'FUSED', False)
+    monkeypatch.setattr(app, 'STATE_MACHINE_ARN', "arn:aws:states:us-east-1:123456789012:stateMachine:test")
+    monkeypatch.setattr(app, 'deduplicator', None)
+    monkeypatch.setattr(app, 'CONSUME_EVENT_TYPES', None)
+    monkeypatch.setattr(app, 'CONSUME_COUNT_ONLY_EVENT_TYPES', frozenset())
+
+def make_event(records):
+    by_partition = {}
+    for record in records:
+        by_partition.setdefault(f"match-events-{record['partition']}", []).append(record)
+    return { "records": by_partition }
+
+def make_values(match_id, count, size=100):
+    return [json.dumps({ "match_id": match_id, "padding": "x" * size }) for _ in range(count)]
+
+def test_decode_partition(monkeypatch, capsys, make_record):
+    """
+    Tests that records are routed by their headers, undecodable records are
+    returned as failed and no record is logged at a sample rate of 0
+    """
+    monkeypatch.setattr(app, 'CONSUME_EVENT_TYPES', frozenset({"goal", "pass"}))
+    monkeypatch.setattr(app, 'CONSUME_COUNT_ONLY_EVENT_TYPES', frozenset({"pass"}))
+    monkeypatch.setattr(app, 'CONSUME_LOG_SAMPLE_RATE', 0.0)
+    monkeypatch.setattr(app.random, 'random', lambda: pytest.fail("Record sampled"))
+    goals = [make_record(match_id, event_id=f"goal-{index}")
+             for index, match_id in enumerate(["000001", "000002", "000001"])]
+    undecodable = make_record("000002", value=b"\xff\x00")
+    records = [goals[0], make_record("000001", "pass", event_id="pass-1"),
+               make_record("000001", "card"), goals[1], undecodable, goals[2],
+               make_record("000002", "pass", event_id="pass-2")]
+
+    groups, counted, dropped, failed = decode_partition(records)
+
+    assert [[(event_id, json.loads(value)["event_id"]) for event_id, value in group]
+            for group in groups] == [[("goal-0", "goal-0"), ("goal-2", "goal-2")],
+                                     [("goal-1", "goal-1")]]
+    assert counted == [("pass-1", "000001", "pass"), ("pass-2", "000002", "pass")]
+    assert dropped == 1
+    assert [record for record, _ in failed] == [undecodable]
+    assert "Received Match event" not in capsys.readouterr().out
+
+@pytest.mark.parametrize('fused', [False, True])
+def test_decode_binary_records(monkeypatch, make_record, fused):
+    """
+    Tests that binary records of the Ingest Lambda are routed by their headers
+    and decode to the same Match events as their JSON records, for the
+    workflow and the fused pipeline
+    """
+    monkeypatch.setattr(app, 'FUSED', fused)
+    monkeypatch.setattr(app, 'CONSUME_COUNT_ONLY_EVENT_TYPES', frozenset({"pass"}))
+    match_events = [("000001", "goal", str(uuid.uuid4())), ("000002", "foul", str(uuid.uuid4())),
+                    ("000001", "pass", str(uuid.uuid4())), ("000001", "goal", str(uuid.uuid4()))]
+
+    decoded = {}
+    for wire_format in (JSON_WIRE_FORMAT, BINARY_WIRE_FORMAT):
+        records = [make_record(match_id, event_type, event_id, wire_format=wire_format)
+                   for match_id, event_type, event_id in match_events]
+        groups, counted, dropped, failed = decode_partition(records)
+        assert (dropped, failed) == (0, [])
+        decoded[wire_format] = (
+            [[(event_id, value if fused else json.loads(value)) for event_id, value in group]
+             for group in groups],
+            counted)
+
+    assert decoded[BINARY_WIRE_FORMAT] == decoded[JSON_WIRE_FORMAT]
+    groups, counted = decoded[BINARY_WIRE_FORMAT]
+    assert [[event_id for event_id, _ in group] for group in groups] == [
+        [match_events[0][2], match_events[3][2]], [match_events[1][2]]]
+    assert counted == [(match_events[2][2], "000001", "pass")]
+
+@pytest.fixture
+def dictionary_id(tmp_path, monkeypatch):
+    """
+    Trained zstd dictionary in a temporary dictionary directory
+    """
+    pytest.importorskip("zstandard")
+    samples = [
+        json.dumps({
+            "event_id": str(uuid.uuid4()),
+            "match_id": f"{index % 380:06d}",
+            "event_type": "pass",
+            "team": f"Team {index % 20}",
+            "player": f"Player {index % 25}",
+            "timestamp": f"2024-10-15T14:{index // 60 % 60:02d}:{index % 60:02d}Z"
+        }).encode('utf-8')
+        for index in range(2000)
+    ]
+    dictionary = zstd_dictionary.train_dictionary(samples, 2048, dictionary_id=4242)
+    (tmp_path / "4242.dict").write_bytes(dictionary.as_bytes())
+
+    monkeypatch.setattr(zstd_dictionary, 'ZSTD_DICTIONARY_DIR', str(tmp_path))
+    zstd_dictionary.load_dictionary.cache_clear()
+    yield dictionary.dict_id()
+    zstd_dictionary.load_dictionary.cache_clear()
+
+@pytest.mark.parametrize('fused', [False, True])
+def test_decode_dictionary_compressed_records(monkeypatch, make_record, dictionary_id, fused):
+    """
+    Tests that records compressed with a zstd dictionary like the Ingest
+    Lambda does are decompressed with the dictionary named by their header
+    """
+    monkeypatch.setattr(app, 'FUSED', fused)
+    event_ids = [str(uuid.uuid4()) for _ in range(2)]
+    compressed = [make_record("000001", event_id=event_id, dictionary_id=dictionary_id)
+                  for event_id in event_ids]
+    plain = [make_record("000001", event_id=event_id) for event_id in event_ids]
+    assert all(len(record["value"]) < len(other["value"])
+               for record, other in zip(compressed, plain))
+
+    decoded = []
+    for records in (compressed, plain):
+        groups, _, _, failed = decode_partition(records)
+        assert failed == []
+        decoded.append([[(event_id, value if fused else json.loads(value))
+                         for event_id, value in group] for group in groups])
+
+    assert decoded[0] == decoded[1]
+    assert [event_id for event_id, _ in decoded[0][0]] == event_ids
+
+def test_handler_routes_records(monkeypatch, capsys, stepfunctions, make_record):
+    """
+    Tests that the handler drops records of other event types and counts
+    count-only records by their headers, while records without headers are
+    processed whatever their event type
+    """
+    monkeypatch.setattr(app, 'CONSUME_EVENT_TYPES', frozenset({"goal", "pass"}))
+    monkeypatch.setattr(app, 'CONSUME_COUNT_ONLY_EVENT_TYPES', frozenset({"pass"}))
+    records = [
+        make_record("000001", "goal", event_id="goal-1"),
+        make_record("000001", "pass"),
+        make_record("000001", "card"),
+        make_record("000002", "card", event_id="headerless-card", headers=False),
+        make_record("000002", "pass", event_id="headerless-pass", headers=False),
+        make_record("000002", "goal", event_id="goal-2", partition=1),
+        make_record("000002", "pass", partition=1)
+    ]
+
+    result = app.handler(make_event(records), None)
+
+    assert result["offsets"] == {
+        "match-events-0": { "first": 0, "last": 4, "quarantined": [] },
+        "match-events-1": { "first": 0, "last": 1, "quarantined": [] }
+    }
+    shard, = stepfunctions.inputs[0]["shards"]
+    assert [json.loads(value)["event_id"] for value in shard["match_events"]] == [
+        "goal-1", "headerless-card", "headerless-pass", "goal-2"]
+    assert shard["event_counts"] == { "000001": { "pass": 1 }, "000002": { "pass": 1 } }
+    assert "'processed': 4, 'counted': 2, 'dropped': 1" in capsys.readouterr().out
+
+def test_handler_drops_whole_batch(monkeypatch, stepfunctions, make_record):
+    """
+    Tests that a batch of dropped records starts no workflow and its offsets
+    are consumed
+    """
+    monkeypatch.setattr(app, 'CONSUME_EVENT_TYPES', frozenset({"goal"}))
+    records = [make_record("000001", "card"), make_record("000001", "substitution")]
+
+    result = app.handler(make_event(records), None)
+
+    assert stepfunctions.inputs == []
+    assert result == { "statusCode": 200, "offsets": {
+        "match-events-0": { "first": 0, "last": 1, "quarantined": [] }}}
+
+def test_redelivered_count_only_record_counted_once(monkeypatch, dynamodb, stepfunctions,
+                                                   make_record):
+    """
+    Tests that count-only records redelivered within a batch or in a later
+    batch are not counted twice
+    """
+    monkeypatch.setattr(app, 'CONSUME_COUNT_ONLY_EVENT_TYPES', frozenset({"pass"}))
+    monkeypatch.setattr(app, 'deduplicator',
+                        Deduplicator(RotatingBloomFilter(1000, 0.001), dynamodb=dynamodb))
+    passes = [make_record("000001", "pass", event_id=f"pass-{index}") for index in range(2)]
+
+    app.handler(make_event(passes + [passes[1]]), None)
+    app.handler(make_event([passes[0], make_record("000001", "pass", event_id="pass-2")]), None)
+
+    assert [execution["shards"][0]["event_counts"] for execution in stepfunctions.inputs] == [
+        { "000001": { "pass": 2 } }, { "000001": { "pass": 1 } }]
+
+def test_match_events_stay_in_one_shard():
+    """
+    Tests that the Match events of a match stay together in their order
+    """
+    groups = [make_values(f"{index:06d}", 5) for index in range(10)]
+    shards = get_shards(groups, 1500)
+
+    assert [value for shard in shards for value in shard] == [value for group in groups for value in group]
+    for group in groups:
+        assert sum(set(group) <= set(shard) for shard in shards) == 1
+
+def test_shard_size_limit():
+    """
+    Tests that shards stay below the byte limit, a match larger than a shard
+    is split over shards
+    """
+    groups = [make_values("000001", 50)] + [make_values(f"{index:06d}", 3) for index in range(2, 20)]
+    max_bytes = 2000
+    shards = get_shards(groups, max_bytes)
+
+    assert len(shards) > 1
+    assert all(sum(len(value) + 2 for value in shard) <= max_bytes for shard in shards)
+    assert sum(len(shard) for shard in shards) == 50 + 18 * 3
+
+def test_event_counts_on_first_shard(monkeypatch, stepfunctions, make_record):
+    """
+    Tests that event counts of count-only event types go on the first shard
+    of the workflow input only
+    """
+    monkeypatch.setattr(app, 'CONSUME_SHARD_BYTES', 600)
+    monkeypatch.setattr(app, 'CONSUME_COUNT_ONLY_EVENT_TYPES', frozenset({"pass"}))
+    records = [make_record(f"{index % 4:06d}") for index in range(12)]
+    records += [make_record("000001", "pass") for _ in range(3)]
+
+    app.handler(make_event(records), None)
+
+    shards = stepfunctions.inputs[0]["shards"]
+    assert len(shards) > 1
+    assert shards[0]["event_counts"] == { "000001": { "pass": 3 } }
+    assert all(shard["event_counts"] == {} for shard in shards[1:])
+    assert sum(len(shard["match_events"]) for shard in shards) == 12
+
+def test_counts_only_batch_gets_empty_shard(monkeypatch, stepfunctions, make_record):
+    """
+    Tests that a batch of count-only records starts the workflow with one
+    empty shard carrying the event counts
+    """
+    monkeypatch.setattr(app, 'CONSUME_COUNT_ONLY_EVENT_TYPES', frozenset({"pass"}))
+    records = [make_record("000001", "pass"), make_record("000002", "pass")]
+
+    app.handler(make_event(records), None)
+
+    assert stepfunctions.inputs == [{ "shards": [{
+        "name": "match-events-0-0-0",
+        "match_events": [],
+        "event_counts": { "000001": { "pass": 1 }, "000002": { "pass": 1 } }
+    }]}]
@@ -0,0 +1,93 @@
+import uuid
+
+import dedup
+from dedup import BloomFilter, Deduplicator, RotatingBloomFilter
+
+def make_event_ids(count):
+    return [str(uuid.uuid4()) for _ in range(count)]
+
+def test_bloom_filter_membership():
+    """
+    Tests that added event_ids are members and the false-positive rate holds
+    """
+    bloom_filter = BloomFilter(10000, 0.01)
+    added = make_event_ids(10000)
+    for event_id in added:
+        bloom_filter.add(event_id)
+
+    assert all(event_id in bloom_filter for event_id in added)
+    false_positives = sum(event_id in bloom_filter for event_id in make_event_ids(10000))
+    assert false_positives < 200
+
+def test_rotation_and_snapshot():
+    """
+    Tests that the filter remembers the previous generation, forgets older
+    ones and is restored from a snapshot
+    """
+    seen = RotatingBloomFilter(100, 0.001)
+    generations = [make_event_ids(100) for _ in range(3)]
+    for event_ids in generations:
+        for event_id in event_ids:
+            seen.add(event_id)
+    seen.add("last")
+
+    assert all(event_id in seen for event_id in generations[2] + ["last"])
+    assert sum(event_id in seen for event_id in generations[0]) < 5
+
+    restored = RotatingBloomFilter(100, 0.001)
+    assert restored.load_bytes(seen.to_bytes())
+    assert all(event_id in restored for event_id in generations[2] + ["last"])
+    assert restored.get_stats()["remembered"] == seen.get_stats()["remembered"]
+    assert not RotatingBloomFilter(1000, 0.001).load_bytes(seen.to_bytes())
+
+def test_find_duplicates(monkeypatch, dynamodb):
+    """
+    Tests that repeats within a batch and stored Match events remembered
+    after their hand-off are duplicates, while an unconfirmed filter match is
+    processed
+    """
+    monkeypatch.setattr(dedup, 'DYNAMODB_TABLE_NAME', "table")
+    stored, in_workflow = make_event_ids(150), make_event_ids(1)
+    dynamodb.put_event_ids("table", stored)
+    deduplicator = Deduplicator(RotatingBloomFilter(1000, 0.001), dynamodb=dynamodb)
+
+    assert deduplicator.find_duplicates(stored + in_workflow + [stored[0], None]) == {151}
+    assert dynamodb.requests == 0
+    assert not any(event_id in deduplicator.seen for event_id in stored)
+    deduplicator.remember(stored + in_workflow)
+
+    new = make_event_ids(2)
+    duplicates = deduplicator.find_duplicates(new + stored + in_workflow + [None])
+    assert duplicates == set(range(2, 152))
+    assert dynamodb.requests == 2
+
+def test_counted_duplicates_without_confirmation(dynamodb):
+    """
+    Tests that filter matches of count-only Match events are duplicates
+    without a DynamoDB request, and they are remembered once handed off
+    """
+    deduplicator = Deduplicator(RotatingBloomFilter(1000, 0.001), dynamodb=dynamodb)
+    event_ids, counted_ids = make_event_ids(2), make_event_ids(3)
+
+    assert deduplicator.find_duplicates(event_ids, counted_ids + [counted_ids[0]]) == {5}
+    assert not any(event_id in deduplicator.seen for event_id in counted_ids)
+
+    deduplicator.remember(counted_ids)
+    assert deduplicator.find_duplicates([], counted_ids + [None]) == {0, 1, 2}
+    assert dynamodb.requests == 0
+
+def test_snapshot_round_trip(monkeypatch, s3):
+    """
+    Tests that a cold start restores the filter of the last snapshot
+    """
+    monkeypatch.setattr(dedup, 'CONSUME_DEDUP_SNAPSHOT_BUCKET', "bucket")
+    writer = Deduplicator(RotatingBloomFilter(1000, 0.001), s3=s3)
+    event_ids = make_event_ids(10)
+    writer.remember(event_ids)
+    writer.snapshot()
+    assert not s3.objects
+    writer.snapshot(force=True)
+
+    reader = Deduplicator(RotatingBloomFilter(1000, 0.001), s3=s3)
+    reader.restore()
+    assert all(event_id in reader.seen for event_id in event_ids)
@@ -0,0 +1,164 @@
+import sys
+import uuid
+
+import boto3
+import pytest
+
+import app
+import dedup
+import counters
+import pipeline
+from dedup import Deduplicator, RotatingBloomFilter
+
+@pytest.fixture
+def stages(monkeypatch, dynamodb, s3):
+    """
+    Enrich and Store handlers of the repository writing to local clients
+    """
+    enrich, store = pipeline.load_stage('enrich'), pipeline.load_stage('store')
+    monkeypatch.setattr(store, 'S3_BUCKET_NAME', "bucket")
+    monkeypatch.setattr(store, 'DYNAMODB_TABLE_NAME', "events")
+    monkeypatch.setattr(store, 'COUNTERS_TABLE_NAME', "counters")
+    monkeypatch.setattr(counters, 'COUNTERS_TABLE_NAME', "counters")
+    batch_writer = sys.modules['store_batch_writer']
+    monkeypatch.setattr(batch_writer, '_clients',
+                        { 1: dynamodb, batch_writer.BOTOCORE_MAX_ATTEMPTS: dynamodb })
+    monkeypatch.setattr(boto3, 'client', lambda service_name, **kwargs: s3)
+    return enrich, store
+
+def test_stage_modules_named_per_stage(stages):
+    """
+    Tests that modules of a stage are imported under names of the stage and
+    shared modules once
+    """
+    enrich, store = stages
+
+    assert enrich.__name__ == "enrich_app" and store.__name__ == "store_app"
+    assert "store_batch_writer" in sys.modules and "store_archive" in sys.modules
+    assert "enrich_european_league" in sys.modules
+    assert not {"batch_writer", "archive", "european_league"} & set(sys.modules)
+    assert store.update_counters is counters.update_counters
+
+def make_match_events(match_ids):
+    return [{
+        "event_id": str(uuid.uuid4()),
+        "match_id": match_id,
+        "event_type": "pass",
+        "team": "Team A",
+        "player": "Player 1",
+        "timestamp": "2024-10-15T16:30:00Z"
+    } for match_id in match_ids]
+
+def test_run_fused(stages, dynamodb, s3):
+    """
+    Tests that a fused batch stores enriched Match events, archives them and
+    adds the counters of the batch with event counts of count-only types
+    """
+    match_events = [{
+        "event_id": str(uuid.uuid4()),
+        "match_id": "000001",
+        "event_type": "pass",
+        "team": "Team A",
+        "player": f"Player {index % 2}",
+        "timestamp": "2024-10-15T16:30:00Z"
+    } for index in range(3)]
+
+    result = pipeline.run_fused(match_events, { "000001": { "foul": 2 } }, "batch-0")
+
+    assert result == { "statusCode": 200, "quarantined": 0 }
+    stored = dynamodb.items["events"]
+    assert set(stored) == { match_event["event_id"] for match_event in match_events }
+    assert all(item["season"] == "2024-2025" for item in stored.values())
+    assert dynamodb.items["counters"]["000001"] == {
+        "pass": 3, "pass#team#Team A": 3,
+        "pass#player#Player 0": 2, "pass#player#Player 1": 1,
+        "foul": 2
+    }
+    archived = [key for bucket, key in s3.objects if key.endswith(".ndjson.gz")]
+    assert archived == ["archive/season=2024-2025/date=2024-10-15/match_id=000001/batch-0.ndjson.gz"]
+
+def test_stage_module_imported_elsewhere(monkeypatch):
+    """
+    Tests that a stage is not loaded over a module of the same name imported
+    from another directory
+    """
+    monkeypatch.setitem(sys.modules, "batch_writer", counters)
+
+    with pytest.raises(ImportError, match="batch_writer"):
+        pipeline.load_stage.__wrapped__('store')
+
+def test_counters_once_when_resharded(stages, dynamodb):
+    """
+    Tests that a retried batch sharded differently does not count its Match
+    events and event counts twice
+    """
+    enrich, store = stages
+    first, second = make_match_events(["000001"] * 2), make_match_events(["000002"] * 3)
+    event_counts = { "000001": { "foul": 1 } }
+
+    def store_shards(shards):
+        for name, match_events, shard_event_counts in shards:
+            store.handler(enrich.handler({
+                "name": name,
+                "match_events": match_events,
+                "event_counts": shard_event_counts
+            }, None), None)
+
+    store_shards([("topic-0-0-0", first + second, event_counts)])
+    store_shards([("topic-0-0-0", second, event_counts), ("topic-0-0-1", first, {})])
+
+    assert dynamodb.items["counters"]["000001"] == {
+        "pass": 2, "pass#team#Team A": 2, "pass#player#Player 1": 2, "foul": 1 }
+    assert dynamodb.items["counters"]["000002"] == {
+        "pass": 3, "pass#team#Team A": 3, "pass#player#Player 1": 3 }
+
+@pytest.mark.parametrize("failing", ["archive", "write"])
+def test_fused_retry_after_failed_store(monkeypatch, capsys, stages, dynamodb, s3,
+                                        make_record, failing):
+    """
+    Tests that a fused batch failing in Store, while archiving or after its
+    Match events are written, is processed again in full by its retry, and
+    only a redelivery after the batch succeeded is dropped
+    """
+    enrich, store = stages
+    monkeypatch.setattr(app, 'FUSED', True)
+    monkeypatch.setattr(app, 'CONSUME_EVENT_TYPES', None)
+    monkeypatch.setattr(app, 'CONSUME_COUNT_ONLY_EVENT_TYPES', frozenset())
+    monkeypatch.setattr(dedup, 'DYNAMODB_TABLE_NAME', "events")
+    monkeypatch.setattr(app, 'deduplicator',
+                        Deduplicator(RotatingBloomFilter(1000, 0.001), dynamodb=dynamodb))
+    failures = []
+
+    def fail_once():
+        if not failures:
+            failures.append(failing)
+            raise TimeoutError(f"Store failed: {failing}")
+
+    if failing == "write":
+        write = store.ParallelBatchWriter.write
+
+        def write_then_fail(writer, items):
+            metrics = write(writer, items)
+            fail_once()
+            return metrics
+        monkeypatch.setattr(store.ParallelBatchWriter, 'write', write_then_fail)
+    else:
+        write_archive = store.write_archive
+
+        def fail_then_write_archive(*args):
+            fail_once()
+            return write_archive(*args)
+        monkeypatch.setattr(store, 'write_archive', fail_then_write_archive)
+    event = { "records": { "match-events-0": [make_record("000001") for _ in range(3)] } }
+
+    with pytest.raises(TimeoutError):
+        app.handler(event, None)
+    app.handler(event, None)
+    capsys.readouterr()
+    app.handler(event, None)
+
+    assert "'processed': 0, 'counted': 0, 'dropped': 0, 'duplicates': 3" in capsys.readouterr().out
+    assert len(dynamodb.items["events"]) == 3
+    assert dynamodb.items["counters"]["000001"]["goal"] == 3
+    assert [key for _, key in s3.objects if key.endswith(".ndjson.gz")] == [
+        "archive/season=2024-2025/date=2024-10-15/match_id=000001/match-events-0-0.ndjson.gz"]
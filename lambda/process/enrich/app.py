@@ -2,7 +2,17 @@
 from typing import Any, Dict
 from datetime import datetime
 from european_league import get_european_league_season
+from claim_check import (CLAIM_CHECK_FIELD, get_claim_check, needs_claim_check,
+                         put_items, read_items)
+from quarantine import QUARANTINED_INDEXES_FIELD, Quarantine
+from counters import add_match_event
 import json
+import uuid
+
+# Workflow output field of the claim check of enriched data
+ENRICHED_CLAIM_CHECK_FIELD = 'enriched_claim_check'
+# Workflow output field of the claim check of counters too large for the payload
+COUNTERS_CLAIM_CHECK_FIELD = 'counters_claim_check'
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
@@ -13,14 +23,30 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
 
     print(f"Started batch enrichment of Match events: {event}")
-    match_events = [
-        json.loads(item) for item in event['match_events']
-    ]
-
-    # Enrich a batch of Match events
-    try:
-        enriched_data = {}
-        for match_event in match_events:
+
+    # Large batches are streamed from S3 and enriched data is written back,
+    # the workflow only passes claim checks
+    claim_check = get_claim_check(event)
+    if claim_check is not None:
+        items = read_items(claim_check)
+    else:
+        items = event['match_events']
+
+    # Enrich a batch of Match events, malformed Match events are quarantined
+    # and dropped from the batch
+    name = event.get('name') or str(uuid.uuid4())
+    quarantine = Quarantine('enrich', name)
+    quarantined_indexes = []
+    match_events = []
+    enriched_data = {}
+    # Counters per match of the Match events of the batch, Store adds them to
+    # the counters table. Count-only event types are counted by the Consume
+    # Lambda and passed on as event_counts, Store adds them separately
+    counters = {}
+    for index, item in enumerate(items):
+        try:
+            # The fused pipeline of the Consume Lambda passes decoded Match events
+            match_event = json.loads(item) if isinstance(item, str) else item
             event_id = match_event['event_id']
             date_object = datetime.strptime(
                 match_event['timestamp'],
@@ -30,14 +56,48 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             enriched_event = {
                 "season": get_european_league_season(date_object)
             }
-            enriched_data[event_id] = enriched_event
+            add_match_event(counters, match_event)
+        except Exception as ex:
+            print(f"Error enriching Match event: {str(ex)}")
+            quarantine.add(item, ex)
+            quarantined_indexes.append(index)
+            continue
+
+        if claim_check is None:
+            match_events.append(match_event)
+        enriched_data[event_id] = enriched_event
+
+        print(f"Enriched Match event: {enriched_event}")
+    quarantine.flush()
 
-            print(f"Enriched Match event: {enriched_event}")
-    except Exception as ex:
-        print(f"Error enriching Match events: {str(ex)}")
-        raise ex
+    if claim_check is not None:
+        enriched_claim_check = put_items(
+            (json.dumps({event_id: enriched_event})
+             for event_id, enriched_event in enriched_data.items()),
+            f"{claim_check['name']}-enriched")
+        # Store skips quarantined lines of the claim-checked batch
+        result = {
+            "name": name,
+            "match_events": [],
+            "enriched_data": {},
+            CLAIM_CHECK_FIELD: claim_check,
+            ENRICHED_CLAIM_CHECK_FIELD: enriched_claim_check,
+            QUARANTINED_INDEXES_FIELD: quarantined_indexes,
+            "counters": counters,
+            "event_counts": event.get('event_counts', {})
+        }
+        # Counters grow with matches, players and teams of the batch
+        if needs_claim_check(len(json.dumps(counters))):
+            result["counters"] = {}
+            result[COUNTERS_CLAIM_CHECK_FIELD] = put_items(
+                (json.dumps({match_id: counts}) for match_id, counts in counters.items()),
+                f"{claim_check['name']}-counters")
+        return result
 
     return {
+        "name": name,
         "match_events": match_events,
-        "enriched_data": enriched_data
+        "enriched_data": enriched_data,
+        "counters": counters,
+        "event_counts": event.get('event_counts', {})
     }
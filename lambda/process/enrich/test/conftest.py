@@ -0,0 +1,91 @@
+import io
+import os
+import sys
+import json
+import uuid
+
+import pytest
+
+# Modules shared by the processing Lambdas are bundled next to their handlers,
+# tests import them from lambda/process/shared
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'shared'))
+
+import claim_check
+import quarantine
+
+class LocalS3:
+    """
+    Local S3 stand-in, keeps objects in memory
+    """
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = bytes(Body)
+
+    def get_object(self, Bucket, Key):
+        return { "Body": io.BytesIO(self.objects[(Bucket, Key)]) }
+
+class TransactionCanceledException(Exception):
+    def __init__(self, reasons):
+        super().__init__("Transaction cancelled")
+        self.response = { "CancellationReasons": reasons }
+
+class LocalDynamoDB:
+    """
+    Local DynamoDB stand-in of the counters table, takes Python types like
+    the client of a Table resource
+    """
+    exceptions = type('Exceptions', (), {
+        'TransactionCanceledException': TransactionCanceledException})
+
+    def __init__(self):
+        self.items = {}
+
+    def transact_write_items(self, TransactItems):
+        update, put = TransactItems[0]["Update"], TransactItems[1]["Put"]
+        assert update["UpdateExpression"].startswith("ADD ")
+        if put["Item"]["match_id"] in self.items:
+            raise TransactionCanceledException([{ "Code": "None" },
+                                                { "Code": "ConditionalCheckFailed" }])
+        self.items[put["Item"]["match_id"]] = put["Item"]
+        item = self.items.setdefault(update["Key"]["match_id"], {})
+        for placeholder, name in update["ExpressionAttributeNames"].items():
+            count = update["ExpressionAttributeValues"][placeholder.replace('#', ':')]
+            item[name] = item.get(name, 0) + count
+
+@pytest.fixture
+def s3(monkeypatch):
+    """
+    Local S3 of claim-check and quarantine objects
+    """
+    s3 = LocalS3()
+    monkeypatch.setattr(claim_check, 'get_s3_client', lambda: s3)
+    monkeypatch.setattr(quarantine, 'get_s3_client', lambda: s3)
+    return s3
+
+@pytest.fixture
+def counters_table():
+    """
+    Local DynamoDB client of the counters table
+    """
+    return LocalDynamoDB()
+
+@pytest.fixture
+def make_match_events():
+    """
+    Returns a factory of JSON Match events of 380 matches
+    """
+    def make(count):
+        return [
+            json.dumps({
+                "event_id": str(uuid.uuid4()),
+                "match_id": f"{index % 380:06d}",
+                "event_type": "pass",
+                "team": "Team A",
+                "player": f"Player {index % 25}",
+                "timestamp": "2024-10-15T16:30:00Z"
+            })
+            for index in range(count)
+        ]
+    return make
@@ -0,0 +1,38 @@
+import json
+
+import app
+import claim_check
+
+def test_items_round_trip(monkeypatch, s3, make_match_events):
+    """
+    Tests that items are read back from a claim-check object in order
+    """
+    monkeypatch.setattr(claim_check, 'CLAIM_CHECK_BUCKET', "bucket")
+    items = make_match_events(3) + ['{\n  "pretty": true\n}']
+
+    pointer = claim_check.put_items(items, "topic-0-42", s3=s3)
+
+    assert pointer["key"] == "claim-check/topic-0-42.ndjson.gz" and pointer["count"] == 4
+    assert [json.loads(item) for item in claim_check.read_items(pointer, s3=s3)] == \
+        [json.loads(item) for item in items]
+
+def test_claim_checked_enrichment(monkeypatch, s3, make_match_events):
+    """
+    Tests that a claim-checked batch of 10k Match events is enriched through S3
+    and only claim checks are returned to the workflow
+    """
+    monkeypatch.setattr(claim_check, 'CLAIM_CHECK_BUCKET', "bucket")
+    match_events = make_match_events(10000)
+    assert claim_check.needs_claim_check(len(json.dumps(match_events)))
+
+    pointer = claim_check.put_items(match_events, "topic-0-0")
+    result = app.handler({ "match_events": [], "claim_check": pointer }, None)
+
+    assert result["match_events"] == [] and result["claim_check"] == pointer
+    assert len(json.dumps(result)) < claim_check.CLAIM_CHECK_THRESHOLD_BYTES
+
+    enriched_data = {}
+    for item in claim_check.read_items(result["enriched_claim_check"]):
+        enriched_data.update(json.loads(item))
+    assert len(enriched_data) == 10000
+    assert enriched_data[json.loads(match_events[0])["event_id"]] == { "season": "2024-2025" }
@@ -0,0 +1,60 @@
+import json
+
+import app
+import counters
+
+def test_batch_counters():
+    """
+    Tests that Match events are counted per match, team and player, event
+    counts of count-only event types are passed on to Store
+    """
+    match_events = [
+        { "event_id": "1", "match_id": "000001", "event_type": "goal", "team": "Team A",
+          "player": "Player 1", "timestamp": "2024-10-15T16:30:00Z" },
+        { "event_id": "2", "match_id": "000001", "event_type": "goal", "team": "Team A",
+          "player": "Player 2", "timestamp": "2024-10-15T16:31:00Z" },
+        { "event_id": "3", "match_id": "000002", "event_type": "foul", "team": "Team B",
+          "player": "Player 1", "timestamp": "2024-10-15T16:32:00Z" }
+    ]
+
+    result = app.handler({
+        "match_events": [json.dumps(match_event) for match_event in match_events],
+        "event_counts": { "000001": { "pass": 40 } }
+    }, None)
+
+    assert result["counters"] == {
+        "000001": {
+            "goal": 2,
+            "goal#team#Team A": 2,
+            "goal#player#Player 1": 1,
+            "goal#player#Player 2": 1
+        },
+        "000002": {
+            "foul": 1,
+            "foul#team#Team B": 1,
+            "foul#player#Player 1": 1
+        }
+    }
+    assert result["event_counts"] == { "000001": { "pass": 40 } }
+
+def test_counter_updates(monkeypatch, counters_table, make_match_events):
+    """
+    Tests that counters of a match are added in chunks of updates once per batch
+    """
+    monkeypatch.setattr(counters, 'MAX_UPDATE_COUNTERS', 2)
+    batch_counters = {}
+    for match_event in make_match_events(1000):
+        counters.add_match_event(batch_counters, json.loads(match_event))
+
+    stats = counters.update_counters(counters_table, batch_counters, "topic-0-0-0")
+    retry_stats = counters.update_counters(counters_table, batch_counters, "topic-0-0-0")
+    counters.update_counters(counters_table, batch_counters, "topic-0-1000-0")
+
+    updates = sum((len(counts) + 1) // 2 for counts in batch_counters.values())
+    assert stats == { "applied": updates, "skipped": 0 }
+    assert retry_stats == { "applied": 0, "skipped": updates }
+    assert sum(counters_table.items[match_id]["pass"] for match_id in batch_counters) == 2000
+    assert counters_table.items["000001"] == {
+        "pass": 6, "pass#team#Team A": 6, "pass#player#Player 1": 2,
+        "pass#player#Player 6": 2, "pass#player#Player 11": 2}
+    assert "expires_at" in counters_table.items["000001#batch#topic-0-0-0#0"]
@@ -0,0 +1,61 @@
+import gzip
+import json
+
+import pytest
+
+import app
+import claim_check
+import quarantine
+
+def read_quarantined(s3, key):
+    return [json.loads(line) for line in
+            gzip.decompress(s3.objects[("quarantine-bucket", key)]).splitlines()]
+
+def test_poison_records_quarantined(monkeypatch, s3, make_match_events):
+    """
+    Tests that malformed Match events are quarantined with their error and
+    the rest of the batch is enriched
+    """
+    monkeypatch.setattr(quarantine, 'QUARANTINE_BUCKET', "quarantine-bucket")
+    match_events = make_match_events(3)
+    bad_timestamp = json.loads(match_events[1])
+    bad_timestamp["timestamp"] = "15/10/2024 16:30"
+    match_events[1] = json.dumps(bad_timestamp)
+    match_events.append('{"event_id": ')
+
+    result = app.handler({ "name": "topic-0-42-0", "match_events": match_events }, None)
+
+    assert [match_event["event_id"] for match_event in result["match_events"]] == \
+        [json.loads(match_events[0])["event_id"], json.loads(match_events[2])["event_id"]]
+    assert set(result["enriched_data"]) == \
+        {match_event["event_id"] for match_event in result["match_events"]}
+    entries = read_quarantined(s3, "quarantine/enrich/topic-0-42-0.ndjson.gz")
+    assert [entry["item"] for entry in entries] == match_events[1::2]
+    assert entries[0]["stage"] == "enrich" and entries[0]["error"].startswith("ValueError")
+
+def test_claim_checked_poison_records_skipped(monkeypatch, s3, make_match_events):
+    """
+    Tests that quarantined lines of a claim-checked batch are reported to
+    the Store Lambda
+    """
+    monkeypatch.setattr(claim_check, 'CLAIM_CHECK_BUCKET', "bucket")
+    monkeypatch.setattr(quarantine, 'QUARANTINE_BUCKET', "quarantine-bucket")
+    match_events = make_match_events(5)
+    match_events[3] = "not json"
+
+    pointer = claim_check.put_items(match_events, "topic-0-0-0")
+    result = app.handler({ "name": "topic-0-0-0", "match_events": [], "claim_check": pointer }, None)
+
+    assert result[quarantine.QUARANTINED_INDEXES_FIELD] == [3]
+    assert result["enriched_claim_check"]["count"] == 4
+    assert read_quarantined(s3, "quarantine/enrich/topic-0-0-0.ndjson.gz")[0]["item"] == "not json"
+
+def test_batch_fails_without_quarantine(monkeypatch, make_match_events):
+    """
+    Tests that the batch fails as a whole if quarantine is not configured
+    """
+    monkeypatch.setattr(quarantine, 'QUARANTINE_BUCKET', None)
+    match_events = make_match_events(2) + ['{"event_id": "1", "timestamp": "bad"}']
+
+    with pytest.raises(ValueError):
+        app.handler({ "match_events": match_events }, None)
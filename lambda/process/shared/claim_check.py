@@ -0,0 +1,102 @@
+import io
+import os
+import gzip
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+# Batches larger than the Step Functions payload limit of 256 KB are written
+# to S3 once, only a claim check with the object pointer and a summary of the
+# batch goes through the workflow. Shared module, bundled into the Consume,
+# Enrich and Store Lambdas
+CLAIM_CHECK_BUCKET = os.getenv('CLAIM_CHECK_BUCKET')
+CLAIM_CHECK_PREFIX = os.getenv('CLAIM_CHECK_PREFIX', 'claim-check/')
+# Workflow input above the threshold is claim-checked. Enriched output is
+# larger than the input, the threshold leaves room for it below the limit
+CLAIM_CHECK_THRESHOLD_BYTES = int(os.getenv('CLAIM_CHECK_THRESHOLD_BYTES', '131072'))
+# Local S3 stand-in, e.g. MinIO or LocalStack
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+
+# Workflow input field of the claim check
+CLAIM_CHECK_FIELD = 'claim_check'
+CLAIM_CHECK_SUFFIX = '.ndjson.gz'
+# Fast compression, claim-check objects are read once
+CLAIM_CHECK_COMPRESS_LEVEL = 5
+
+def get_s3_client() -> Any:
+    """
+    Returns the S3 client of the claim-check bucket
+    :return: S3 client
+    """
+    import boto3
+
+    return boto3.client('s3', endpoint_url=S3_ENDPOINT_URL)
+
+def needs_claim_check(payload_bytes: int) -> bool:
+    """
+    Checks if a workflow payload is passed by a claim check
+    :param payload_bytes: Size of the JSON payload
+    :return: True if claim checks are configured and the payload is too large
+    """
+    return bool(CLAIM_CHECK_BUCKET) and payload_bytes > CLAIM_CHECK_THRESHOLD_BYTES
+
+def put_items(items: Iterable[str], name: str, s3: Any = None) -> Dict[str, Any]:
+    """
+    Writes JSON items to the claim-check bucket as one gzip NDJSON object
+    :param items: JSON items, e.g. Match events
+    :param name: Object name, the same name overwrites the object of a retry
+    :param s3: S3 client
+    :return: Claim check: bucket, key, name, number of items and object size
+    """
+    buffer = io.BytesIO()
+    count = 0
+    with gzip.GzipFile(fileobj=buffer, mode='wb',
+                       compresslevel=CLAIM_CHECK_COMPRESS_LEVEL, mtime=0) as file:
+        for item in items:
+            # One item per line, JSON whitespace between tokens may be dropped
+            if '\n' in item:
+                item = item.replace('\n', ' ')
+            file.write(item.encode('utf-8'))
+            file.write(b'\n')
+            count += 1
+
+    claim_check = {
+        "bucket": CLAIM_CHECK_BUCKET,
+        "key": f"{CLAIM_CHECK_PREFIX}{name}{CLAIM_CHECK_SUFFIX}",
+        "name": name,
+        "count": count,
+        "bytes": buffer.tell()
+    }
+    try:
+        (s3 or get_s3_client()).put_object(Bucket=claim_check['bucket'],
+                                           Key=claim_check['key'],
+                                           Body=buffer.getvalue(),
+                                           ContentEncoding='gzip',
+                                           ContentType='application/x-ndjson')
+    except Exception as ex:
+        print(f"Error writing claim-check object: {str(ex)}")
+        raise ex
+    print(f"Wrote claim-check object: {claim_check}")
+    return claim_check
+
+def read_items(claim_check: Dict[str, Any], s3: Any = None) -> Iterator[str]:
+    """
+    Streams JSON items of a claim-check object
+    :param claim_check: Claim check from put_items
+    :param s3: S3 client
+    :return: JSON items
+    """
+    response = (s3 or get_s3_client()).get_object(Bucket=claim_check['bucket'],
+                                                  Key=claim_check['key'])
+    with gzip.GzipFile(fileobj=response['Body'], mode='rb') as file:
+        for line in io.TextIOWrapper(file, encoding='utf-8'):
+            line = line.rstrip('\n')
+            if line:
+                yield line
+
+def get_claim_check(event: Dict[str, Any], field: str = CLAIM_CHECK_FIELD) -> Optional[Dict[str, Any]]:
+    """
+    Returns the claim check of a workflow payload
+    :param event: Workflow payload
+    :param field: Claim-check field
+    :return: Claim check, None if the items are inline
+    """
+    return event.get(field)
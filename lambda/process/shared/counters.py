@@ -0,0 +1,178 @@
+import os
+import time
+import hashlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Per-match counters of Match events, aggregated per batch and applied to the
+# counters table with atomic increments, one item per match. Shared module,
+# bundled into the Consume, Enrich and Store Lambdas
+COUNTERS_TABLE_NAME = os.getenv('COUNTERS_TABLE_NAME')
+# Seconds batch markers are kept, retries of a batch within them are not
+# counted twice. Covers the retention of the topic
+COUNTERS_MARKER_TTL = int(os.getenv('COUNTERS_MARKER_TTL', str(7 * 24 * 3600)))
+
+# Counter attributes of a match item:
+# <event_type>, <event_type>#team#<team>, <event_type>#player#<player>
+COUNTER_SEPARATOR = '#'
+TEAM_SCOPE = 'team'
+PLAYER_SCOPE = 'player'
+# Batch markers are items of the counters table keyed
+# <match_id>#batch#<batch key>#<chunk>, expired by the expires_at TTL. The
+# batch key of Match events is a digest of their event_ids, the same when a
+# retried batch is sharded differently
+MARKER_SCOPE = 'batch'
+MARKER_TTL_ATTRIBUTE = 'expires_at'
+# Counters per UpdateItem request, keeps update expressions below 4 KB
+MAX_UPDATE_COUNTERS = 200
+
+def get_counter_name(event_type: str, scope: Optional[str] = None,
+                     value: Optional[str] = None) -> str:
+    """
+    Returns the counter attribute name of an event type
+    :param event_type: Event type
+    :param scope: Counter scope: team or player, None for the match
+    :param value: Team or player name
+    :return: Attribute name
+    """
+    if scope is None:
+        return event_type
+    return COUNTER_SEPARATOR.join((event_type, scope, value))
+
+def add_match_event(counters: Dict[str, Dict[str, int]], match_event: Dict[str, Any]) -> None:
+    """
+    Counts a Match event per match, team and player
+    :param counters: Counts by attribute name per match_id
+    :param match_event: Match event
+    """
+    event_type = match_event['event_type']
+    match_counts = counters.setdefault(match_event['match_id'], {})
+    names = [get_counter_name(event_type)]
+    for scope in (TEAM_SCOPE, PLAYER_SCOPE):
+        value = match_event.get(scope)
+        if value:
+            names.append(get_counter_name(event_type, scope, value))
+    for name in names:
+        match_counts[name] = match_counts.get(name, 0) + 1
+
+def add_event_counts(counters: Dict[str, Dict[str, int]],
+                     event_counts: Dict[str, Dict[str, int]]) -> None:
+    """
+    Adds event counts per match of count-only event types
+    :param counters: Counts by attribute name per match_id
+    :param event_counts: Counts by event type per match_id
+    """
+    for match_id, counts in event_counts.items():
+        match_counts = counters.setdefault(match_id, {})
+        for event_type, count in counts.items():
+            name = get_counter_name(event_type)
+            match_counts[name] = match_counts.get(name, 0) + count
+
+def get_updates(counts: Dict[str, int], action: str = 'ADD') -> Iterator[Dict[str, Any]]:
+    """
+    Builds UpdateItem arguments of the counts of a match item
+    :param counts: Counts by attribute name
+    :param action: ADD to increment counters, SET to overwrite them, REMOVE
+        to delete them regardless of their counts
+    :return: UpdateExpression, ExpressionAttributeNames and
+        ExpressionAttributeValues per request
+    """
+    operator = " = " if action == 'SET' else " "
+    items: List[Tuple[str, int]] = list(counts.items())
+    for start in range(0, len(items), MAX_UPDATE_COUNTERS):
+        chunk = items[start:start + MAX_UPDATE_COUNTERS]
+        if action == 'REMOVE':
+            expression = ", ".join(f"#c{index}" for index in range(len(chunk)))
+        else:
+            expression = ", ".join(f"#c{index}{operator}:c{index}" for index in range(len(chunk)))
+        update = {
+            "UpdateExpression": f"{action} {expression}",
+            "ExpressionAttributeNames": {
+                f"#c{index}": name for index, (name, _) in enumerate(chunk)}
+        }
+        if action != 'REMOVE':
+            update["ExpressionAttributeValues"] = {
+                f":c{index}": count for index, (_, count) in enumerate(chunk)}
+        yield update
+
+def is_scoped_counter(name: str) -> bool:
+    """
+    Returns whether an attribute is a team or player counter
+    :param name: Attribute name of a match item
+    :return: True for <event_type>#team#<team> and <event_type>#player#<player>
+    """
+    parts = name.split(COUNTER_SEPARATOR, 2)
+    return len(parts) == 3 and parts[1] in (TEAM_SCOPE, PLAYER_SCOPE)
+
+def get_batch_keys(match_events: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Returns the batch key of the Match events of each match
+    :param match_events: Match events counted by a batch
+    :return: Digest of the sorted event_ids per match_id
+    """
+    event_ids = {}
+    for match_event in match_events:
+        event_ids.setdefault(match_event['match_id'], []).append(match_event['event_id'])
+    return {
+        match_id: hashlib.blake2b('\n'.join(sorted(match_event_ids)).encode('utf-8'),
+                                  digest_size=16).hexdigest()
+        for match_id, match_event_ids in event_ids.items()
+    }
+
+def get_marker_key(match_id: str, batch_key: str, chunk: int) -> str:
+    """
+    Returns the key of the marker of a batch applied to a match
+    :param match_id: Match id
+    :param batch_key: Batch key of the match or batch name, the same for
+        retries of the batch
+    :param chunk: Index of the update of the match
+    :return: Marker match_id key
+    """
+    return COUNTER_SEPARATOR.join((match_id, MARKER_SCOPE, batch_key, str(chunk)))
+
+def update_counters(client: Any, counters: Dict[str, Dict[str, int]], batch_name: str,
+                    batch_keys: Optional[Dict[str, str]] = None) -> Dict[str, int]:
+    """
+    Adds the counts of a batch to the counters table once
+    Each update is a transaction with a batch marker put if not exists,
+    updates of a retried batch are cancelled by their markers
+    :param client: DynamoDB client of a Table resource, takes Python types
+    :param counters: Counts by attribute name per match_id
+    :param batch_name: Batch name, the same for retries of the batch
+    :param batch_keys: Batch keys per match_id, see get_batch_keys, markers
+        of other matches are keyed by the batch name
+    :return: Number of applied and of skipped updates
+    """
+    expires_at = int(time.time()) + COUNTERS_MARKER_TTL
+    stats = { "applied": 0, "skipped": 0 }
+    for match_id, counts in counters.items():
+        batch_key = (batch_keys or {}).get(match_id, batch_name)
+        # Chunks of the same counts are the same in every retry
+        for chunk, update in enumerate(get_updates(dict(sorted(counts.items())))):
+            try:
+                client.transact_write_items(TransactItems=[
+                    {
+                        "Update": {
+                            "TableName": COUNTERS_TABLE_NAME,
+                            "Key": { "match_id": match_id },
+                            **update
+                        }
+                    },
+                    {
+                        "Put": {
+                            "TableName": COUNTERS_TABLE_NAME,
+                            "Item": {
+                                "match_id": get_marker_key(match_id, batch_key, chunk),
+                                MARKER_TTL_ATTRIBUTE: expires_at
+                            },
+                            "ConditionExpression": "attribute_not_exists(match_id)"
+                        }
+                    }
+                ])
+                stats["applied"] += 1
+            except client.exceptions.TransactionCanceledException as ex:
+                reasons = [reason.get('Code') for reason in
+                           ex.response.get('CancellationReasons', [])]
+                if 'ConditionalCheckFailed' not in reasons:
+                    raise ex
+                stats["skipped"] += 1
+    return stats
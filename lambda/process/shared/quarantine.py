@@ -0,0 +1,97 @@
+import io
+import os
+import json
+import gzip
+from typing import Any, Dict, List, Optional
+
+# Records failing to decode, enrich or store are written to a quarantine
+# prefix of S3 with their error, the rest of the batch is processed and the
+# batch is not retried for them. Shared module, bundled into the Consume,
+# Enrich and Store Lambdas
+QUARANTINE_BUCKET = os.getenv('QUARANTINE_BUCKET')
+QUARANTINE_PREFIX = os.getenv('QUARANTINE_PREFIX', 'quarantine/')
+# Local S3 stand-in, e.g. MinIO or LocalStack
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+
+QUARANTINE_SUFFIX = '.ndjson.gz'
+# Workflow output field of quarantined items of a claim-checked batch
+QUARANTINED_INDEXES_FIELD = 'quarantined_indexes'
+
+def get_s3_client() -> Any:
+    """
+    Returns the S3 client of the quarantine bucket
+    :return: S3 client
+    """
+    import boto3
+
+    return boto3.client('s3', endpoint_url=S3_ENDPOINT_URL)
+
+class Quarantine:
+    """
+    Collects failed records of a batch processing stage
+    """
+    def __init__(self, stage: str, name: str) -> None:
+        """
+        :param stage: Processing stage: consume, enrich or store
+        :param name: Batch name, the same name overwrites the object of a retry
+        """
+        self.stage = stage
+        self.name = name
+        self.entries: List[Dict[str, Any]] = []
+        self.error: Optional[Exception] = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, item: Any, ex: Exception, **context: Any) -> None:
+        """
+        Quarantines a failed record
+        :param item: Record or Match event as received by the stage
+        :param ex: Error of the record
+        :param context: Record context, e.g. topic, partition and offset
+        """
+        if self.error is None:
+            self.error = ex
+        self.entries.append({
+            "stage": self.stage,
+            "error": f"{type(ex).__name__}: {str(ex)}",
+            **context,
+            "item": item
+        })
+
+    def flush(self, s3: Any = None) -> Optional[Dict[str, Any]]:
+        """
+        Writes quarantined records to S3 as one gzip NDJSON object
+        :param s3: S3 client
+        :return: Bucket, key and number of records, None if nothing is quarantined
+        :raises Exception: The first record error if quarantine is not
+            configured, the batch fails as a whole
+        """
+        if not self.entries:
+            return None
+        if not QUARANTINE_BUCKET:
+            print(f"Quarantine is not configured, failing the batch: {len(self.entries)} records")
+            raise self.error
+
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as file:
+            for entry in self.entries:
+                file.write(json.dumps(entry, default=str).encode('utf-8'))
+                file.write(b'\n')
+
+        quarantined = {
+            "bucket": QUARANTINE_BUCKET,
+            "key": f"{QUARANTINE_PREFIX}{self.stage}/{self.name}{QUARANTINE_SUFFIX}",
+            "count": len(self.entries)
+        }
+        try:
+            (s3 or get_s3_client()).put_object(Bucket=quarantined['bucket'],
+                                               Key=quarantined['key'],
+                                               Body=buffer.getvalue(),
+                                               ContentEncoding='gzip',
+                                               ContentType='application/x-ndjson')
+        except Exception as ex:
+            print(f"Error writing quarantined records: {str(ex)}")
+            raise ex
+        print(f"Quarantined records: {quarantined}")
+        return quarantined
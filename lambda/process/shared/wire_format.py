@@ -0,0 +1,255 @@
+import re
+import sys
+import uuid
+import calendar
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Wire formats of Match event records on the Kafka topic, written by the Ingest
+# Lambda and read by the Consume Lambda. Shared module, bundled into the Ingest
+# and Consume Lambdas
+JSON_WIRE_FORMAT = 'json'
+BINARY_WIRE_FORMAT = 'binary'
+
+# Binary records start with a zero byte, JSON records start with '{'
+BINARY_MAGIC = 0x00
+# Schema id of the binary layout, increase when the layout changes:
+# magic | schema id | match_id digits | match_id | event_type | epoch seconds |
+# UTC offset | event_id (16 bytes) | team | player
+BINARY_SCHEMA_ID = 1
+
+# Longer match ids are sent as JSON
+MAX_MATCH_ID_DIGITS = 64
+
+# Event type codes, append new event types only
+EVENT_TYPE_CODES = {
+    "goal": 1,
+    "pass": 2,
+    "foul": 3
+}
+EVENT_TYPES = {code: event_type for event_type, code in EVENT_TYPE_CODES.items()}
+
+TIMESTAMP_PATTERN = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(Z|([+-])(\d{2}):(\d{2}))')
+# UTC offset code of timestamps in the 'Z' form
+UTC_DESIGNATOR = 0
+
+# Kafka record headers, consumers route and filter records without decoding values
+HEADER_EVENT_ID = 'event_id'
+HEADER_MATCH_ID = 'match_id'
+HEADER_EVENT_TYPE = 'event_type'
+HEADER_SCHEMA = 'schema'
+HEADER_INGEST_TIMESTAMP = 'ingest_ts'
+# Id of the zstd dictionary the record value is compressed with, see zstd_dictionary.py
+HEADER_ZSTD_DICTIONARY = 'zstd_dict'
+
+class WireFormatError(ValueError):
+    """
+    Raised when a record cannot be decoded
+    """
+
+def encode_binary(event_id: str, match_id: str, event_type: str,
+                  team: str, player: str, timestamp: str) -> Optional[bytes]:
+    """
+    Encodes a Match event in the compact binary format
+    :return: Binary record, None if the Match event cannot be represented
+        exactly, e.g. a client-provided event_id which is not a UUID
+    """
+    event_type_code = EVENT_TYPE_CODES.get(event_type)
+    if event_type_code is None:
+        return None
+
+    # Leading zeros of match_id are restored from its number of digits
+    if (not match_id.isascii() or not match_id.isdigit() or
+            len(match_id) > MAX_MATCH_ID_DIGITS):
+        return None
+
+    try:
+        event_uuid = uuid.UUID(event_id)
+    except ValueError:
+        return None
+    if str(event_uuid) != event_id:
+        return None
+
+    encoded_timestamp = _encode_timestamp(timestamp)
+    if encoded_timestamp is None:
+        return None
+    epoch_seconds, offset_code = encoded_timestamp
+
+    try:
+        team_bytes = _encode_string(team)
+        player_bytes = _encode_string(player)
+    except UnicodeEncodeError:
+        return None
+
+    return b''.join((
+        bytes((BINARY_MAGIC, BINARY_SCHEMA_ID)),
+        _encode_varint(len(match_id)),
+        _encode_varint(int(match_id)),
+        bytes((event_type_code,)),
+        _encode_varint(_zigzag(epoch_seconds)),
+        _encode_varint(offset_code),
+        event_uuid.bytes,
+        team_bytes,
+        player_bytes
+    ))
+
+def make_headers(event_id: str, match_id: str, event_type: str, value: bytes,
+                 ingest_timestamp_ms: int) -> List[Tuple[str, bytes]]:
+    """
+    Makes Kafka record headers of a Match event
+    :param event_id: Event id
+    :param match_id: Match id
+    :param event_type: Event type
+    :param value: Record value
+    :param ingest_timestamp_ms: Ingest time in epoch milliseconds
+    :return: Record headers
+    """
+    return [
+        (HEADER_EVENT_ID, event_id.encode('utf-8')),
+        (HEADER_MATCH_ID, match_id.encode('utf-8')),
+        (HEADER_EVENT_TYPE, event_type.encode('utf-8')),
+        (HEADER_SCHEMA, get_schema(value).encode('utf-8')),
+        (HEADER_INGEST_TIMESTAMP, str(ingest_timestamp_ms).encode('utf-8'))
+    ]
+
+def get_schema(value: bytes) -> str:
+    """
+    Returns the schema version of a record
+    :param value: Record value
+    :return: 'binary/<schema id>' or 'json'
+    """
+    if is_binary(value) and len(value) > 1:
+        return f"{BINARY_WIRE_FORMAT}/{value[1]}"
+    return JSON_WIRE_FORMAT
+
+def is_binary(value: bytes) -> bool:
+    """
+    Checks if a record is in the binary format
+    :param value: Record value
+    :return: True for binary records, False for JSON records
+    """
+    return len(value) > 0 and value[0] == BINARY_MAGIC
+
+def decode_binary(value: bytes) -> Dict[str, str]:
+    """
+    Decodes a Match event from the compact binary format
+    :param value: Binary record
+    :return: Match event fields
+    :raises WireFormatError: If the record is malformed or has an unknown schema
+    """
+    try:
+        if value[0] != BINARY_MAGIC or value[1] != BINARY_SCHEMA_ID:
+            raise WireFormatError(f"Unsupported record schema: {value[:2].hex()}")
+
+        position = 2
+        digits, position = _decode_varint(value, position)
+        number, position = _decode_varint(value, position)
+        event_type = EVENT_TYPES.get(value[position])
+        if event_type is None:
+            raise WireFormatError(f"Unknown event type code: {value[position]}")
+        position += 1
+        epoch_seconds, position = _decode_varint(value, position)
+        offset_code, position = _decode_varint(value, position)
+        event_id = str(uuid.UUID(bytes=bytes(value[position:position + 16])))
+        position += 16
+        team, position = _decode_string(value, position)
+        player, position = _decode_string(value, position)
+        timestamp = _format_timestamp(_unzigzag(epoch_seconds), offset_code)
+    except WireFormatError:
+        raise
+    except IndexError:
+        raise WireFormatError("Truncated record")
+    except (ValueError, OverflowError) as ex:
+        raise WireFormatError(f"Malformed record: {ex}")
+
+    if position != len(value):
+        raise WireFormatError("Unexpected bytes after the record")
+
+    return {
+        "event_id": event_id,
+        "match_id": f"{number:0{digits}d}",
+        "event_type": event_type,
+        "team": team,
+        "player": player,
+        "timestamp": timestamp
+    }
+
+def _encode_timestamp(timestamp: str) -> Optional[Tuple[int, int]]:
+    match = TIMESTAMP_PATTERN.fullmatch(timestamp)
+    if match is None:
+        return None
+
+    year, month, day, hour, minute, second = (int(group) for group in match.groups()[:6])
+    if match.group(7) == 'Z':
+        offset_minutes = 0
+        offset_code = UTC_DESIGNATOR
+    else:
+        offset_minutes = int(match.group(9)) * 60 + int(match.group(10))
+        if match.group(8) == '-':
+            offset_minutes = -offset_minutes
+        offset_code = _zigzag(offset_minutes) + 1
+
+    try:
+        epoch_seconds = calendar.timegm(
+            (year, month, day, hour, minute, second)) - offset_minutes * 60
+        # Leap seconds and other values which do not survive the round trip
+        if _format_timestamp(epoch_seconds, offset_code) != timestamp:
+            return None
+    except (ValueError, OverflowError):
+        return None
+    return epoch_seconds, offset_code
+
+def _format_timestamp(epoch_seconds: int, offset_code: int) -> str:
+    if offset_code == UTC_DESIGNATOR:
+        offset_minutes = 0
+        designator = 'Z'
+    else:
+        offset_minutes = _unzigzag(offset_code - 1)
+        sign = '-' if offset_minutes < 0 else '+'
+        hours, minutes = divmod(abs(offset_minutes), 60)
+        designator = f"{sign}{hours:02d}:{minutes:02d}"
+
+    local_time = (datetime(1970, 1, 1, tzinfo=timezone.utc) +
+                  timedelta(seconds=epoch_seconds + offset_minutes * 60))
+    return local_time.strftime('%Y-%m-%dT%H:%M:%S') + designator
+
+@lru_cache(maxsize=4096)
+def _encode_string(value: str) -> bytes:
+    # Team and player names repeat in every event, their encoding is cached
+    data = value.encode('utf-8')
+    return _encode_varint(len(data)) + data
+
+def _decode_string(value: bytes, position: int) -> Tuple[str, int]:
+    length, position = _decode_varint(value, position)
+    end = position + length
+    if end > len(value):
+        raise IndexError(end)
+    # Interned, repeated team and player names share one string in a batch
+    return sys.intern(bytes(value[position:end]).decode('utf-8')), end
+
+def _encode_varint(number: int) -> bytes:
+    data = bytearray()
+    while number > 0x7f:
+        data.append((number & 0x7f) | 0x80)
+        number >>= 7
+    data.append(number)
+    return bytes(data)
+
+def _decode_varint(value: bytes, position: int) -> Tuple[int, int]:
+    number = 0
+    shift = 0
+    while True:
+        byte = value[position]
+        position += 1
+        number |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return number, position
+        shift += 7
+
+def _zigzag(number: int) -> int:
+    return number * 2 if number >= 0 else -number * 2 - 1
+
+def _unzigzag(number: int) -> int:
+    return number >> 1 if not number & 1 else -((number + 1) >> 1)
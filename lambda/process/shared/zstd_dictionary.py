@@ -0,0 +1,107 @@
+import os
+import threading
+from functools import lru_cache
+from typing import Any, List, Optional
+
+# Per-record zstd compression of Match events with a trained dictionary
+# Records compressed with a dictionary carry its id in the HEADER_ZSTD_DICTIONARY
+# record header, see wire_format.py. Shared module, bundled into the Ingest and
+# Consume Lambdas with the dictionaries of lambda/process/shared/dictionaries
+
+# Directory of trained dictionaries, files are named <dictionary id>.dict
+ZSTD_DICTIONARY_DIR = os.getenv(
+    'ZSTD_DICTIONARY_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dictionaries'))
+ZSTD_DICTIONARY_SUFFIX = '.dict'
+ZSTD_DICTIONARY_LEVEL = int(os.getenv('ZSTD_DICTIONARY_LEVEL', '3'))
+
+class ZstdDictionaryError(ValueError):
+    """
+    Raised when a dictionary is not available or a record cannot be decompressed
+    """
+
+def _zstd() -> Any:
+    # Imported on first use, the optional package is only bundled with dictionaries
+    try:
+        import zstandard
+    except ImportError:
+        raise ZstdDictionaryError("zstandard package is not installed")
+    return zstandard
+
+def get_dictionary_path(dictionary_id: int) -> str:
+    """
+    Returns the path of a dictionary file
+    :param dictionary_id: Dictionary id
+    :return: Dictionary file path
+    """
+    return os.path.join(ZSTD_DICTIONARY_DIR, f"{dictionary_id}{ZSTD_DICTIONARY_SUFFIX}")
+
+@lru_cache(maxsize=16)
+def load_dictionary(dictionary_id: int) -> Any:
+    """
+    Loads a trained dictionary, dictionaries are cached by the Lambda container
+    :param dictionary_id: Dictionary id
+    :return: zstd compression dictionary
+    :raises ZstdDictionaryError: If the dictionary is not available
+    """
+    zstandard = _zstd()
+    try:
+        with open(get_dictionary_path(dictionary_id), 'rb') as file:
+            dictionary = zstandard.ZstdCompressionDict(file.read())
+    except OSError as ex:
+        raise ZstdDictionaryError(f"Dictionary {dictionary_id} is not available: {ex}")
+
+    if dictionary.dict_id() != dictionary_id:
+        raise ZstdDictionaryError(
+            f"Dictionary file of {dictionary_id} has id {dictionary.dict_id()}")
+    return dictionary
+
+# Compressors and decompressors are not thread safe, handler threads of the
+# standalone server get their own
+_local = threading.local()
+
+def compress(value: bytes, dictionary_id: int) -> bytes:
+    """
+    Compresses a record value with a dictionary
+    :param value: Record value
+    :param dictionary_id: Dictionary id
+    :return: zstd frame
+    """
+    compressors = _local.__dict__.setdefault('compressors', {})
+    compressor = compressors.get(dictionary_id)
+    if compressor is None:
+        compressor = _zstd().ZstdCompressor(
+            level=ZSTD_DICTIONARY_LEVEL, dict_data=load_dictionary(dictionary_id),
+            write_checksum=False, write_content_size=True, write_dict_id=False)
+        compressors[dictionary_id] = compressor
+    return compressor.compress(value)
+
+def decompress(value: bytes, dictionary_id: int) -> bytes:
+    """
+    Decompresses a record value with a dictionary
+    :param value: zstd frame
+    :param dictionary_id: Dictionary id from the record header
+    :return: Record value
+    :raises ZstdDictionaryError: If the record cannot be decompressed
+    """
+    decompressors = _local.__dict__.setdefault('decompressors', {})
+    decompressor = decompressors.get(dictionary_id)
+    if decompressor is None:
+        decompressor = _zstd().ZstdDecompressor(dict_data=load_dictionary(dictionary_id))
+        decompressors[dictionary_id] = decompressor
+    try:
+        return decompressor.decompress(value)
+    except _zstd().ZstdError as ex:
+        raise ZstdDictionaryError(f"Malformed record: {ex}")
+
+def train_dictionary(samples: List[bytes], size: int,
+                     dictionary_id: Optional[int] = None) -> Any:
+    """
+    Trains a dictionary on sample record values
+    :param samples: Record values, e.g. Match events of the S3 archive
+    :param size: Max dictionary size in bytes
+    :param dictionary_id: Dictionary id, chosen by zstd if not given
+    :return: zstd compression dictionary
+    """
+    return _zstd().train_dictionary(size, samples, dict_id=dictionary_id or 0,
+                                    level=ZSTD_DICTIONARY_LEVEL)
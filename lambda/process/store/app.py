@@ -1,11 +1,22 @@
 import os
 import json
+import uuid
 import boto3
 from typing import Any, Dict
 from datetime import datetime, timezone
 
+from claim_check import get_claim_check, read_items
+from quarantine import QUARANTINED_INDEXES_FIELD, Quarantine
+from counters import COUNTERS_TABLE_NAME, add_event_counts, get_batch_keys, update_counters
+from batch_writer import BOTOCORE_MAX_ATTEMPTS, ParallelBatchWriter, get_client, get_executor
+from archive import write_archive
+
 S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME')
 DYNAMODB_TABLE_NAME = os.getenv('DYNAMODB_TABLE_NAME')
+# Workflow input field of the claim check of enriched data, see Enrich Lambda
+ENRICHED_CLAIM_CHECK_FIELD = 'enriched_claim_check'
+# Workflow input field of the claim check of counters, see Enrich Lambda
+COUNTERS_CLAIM_CHECK_FIELD = 'counters_claim_check'
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
@@ -19,39 +30,121 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 
     extra = {
         "s3_bucket": S3_BUCKET_NAME,
-        "dynamodb_table": DYNAMODB_TABLE_NAME
+        "dynamodb_table": DYNAMODB_TABLE_NAME,
+        "counters_table": COUNTERS_TABLE_NAME
     }
     print(f"Received Storage config: {extra}")
 
-    match_events = event['match_events']
-    enriched_data = event['enriched_data']
+    # Large batches are streamed from the claim-check objects of S3
+    claim_check = get_claim_check(event)
+    if claim_check is not None:
+        # Lines quarantined by the Enrich Lambda are skipped
+        quarantined_indexes = set(event.get(QUARANTINED_INDEXES_FIELD, []))
+        match_events = (item for index, item in enumerate(read_items(claim_check))
+                        if index not in quarantined_indexes)
+        enriched_data = {}
+        enriched_claim_check = get_claim_check(event, ENRICHED_CLAIM_CHECK_FIELD)
+        if enriched_claim_check is not None:
+            for item in read_items(enriched_claim_check):
+                enriched_data.update(json.loads(item))
+    else:
+        match_events = event['match_events']
+        enriched_data = event['enriched_data']
+
+    # Event counts per match of count-only event types
+    event_counts = event.get('event_counts', {})
+    if event_counts:
+        print(f"Received Match event counts: {event_counts}")
     
-    # Write enriched Match data to DynamoDB
+    # Match events without a valid key are quarantined
+    name = event.get('name') or str(uuid.uuid4())
+    quarantine = Quarantine('store', name)
+    stored_events = []
+    for item in match_events:
+        try:
+            stored_events.append(get_match_event(item))
+        except Exception as ex:
+            print(f"Error preparing Match data: {str(ex)}")
+            quarantine.add(item, ex)
+    quarantine.flush()
+    match_events = stored_events
+
+    # Add the counters of the batch, one update per match instead of per
+    # event. Retries of the batch are not counted twice: markers of Match
+    # events are keyed by their event_ids, markers of event counts of
+    # count-only event types by the batch name
+    counters = event.get('counters') or {}
+    counters_claim_check = get_claim_check(event, COUNTERS_CLAIM_CHECK_FIELD)
+    if counters_claim_check is not None:
+        for item in read_items(counters_claim_check):
+            counters.update(json.loads(item))
+    event_counters = {}
+    add_event_counts(event_counters, event_counts)
+    if (counters or event_counters) and COUNTERS_TABLE_NAME:
+        try:
+            client = get_client(BOTOCORE_MAX_ATTEMPTS)
+            extra = {
+                "matches": len(counters.keys() | event_counters.keys()),
+                "match_events": update_counters(client, counters, name,
+                                                get_batch_keys(match_events)),
+                "event_counts": update_counters(client, event_counters, name)
+            }
+            print(f"Updated Match counters: {extra}")
+        except Exception as ex:
+            print(f"Error updating Match counters in DynamoDB: {str(ex)}")
+            raise ex
+
+    if not match_events:
+        return {
+            "statusCode": 200,
+            "quarantined": len(quarantine)
+        }
+
+    # Write a batch of raw Match events to the partitions of the S3 archive
     try:
-        dynamodb = boto3.resource('dynamodb')
-        table = dynamodb.Table(DYNAMODB_TABLE_NAME)
-
-        with table.batch_writer() as batch:
-            for match_event in match_events:
-                event_id = match_event['event_id']
-                item = match_event | enriched_data.get(event_id, {})
-                batch.put_item(Item=item)
+        seasons = {
+            event_id: enriched_event.get('season')
+            for event_id, enriched_event in enriched_data.items()
+        }
+        archived = write_archive(boto3.client('s3'), S3_BUCKET_NAME, match_events,
+                                 seasons, name, get_executor())
+        extra = {
+            "objects": len(archived),
+            "bytes": sum(archived_object['bytes'] for archived_object in archived)
+        }
+        print(f"Archived Match events: {extra}")
     except Exception as ex:
-        print(f"Error writing Match data to DynamoDB: {str(ex)}")
+        print(f"Error writing Match events to S3 bucket: {str(ex)}")
         raise ex
-    
-    # Write a batch of raw Match events to S3 bucket
+
+    # Write enriched Match data to DynamoDB in parallel requests, errors of
+    # DynamoDB fail the batch to be retried. Match events are written last:
+    # the Consume Lambda confirms duplicates by stored Match events, their
+    # counters and archive objects are written
     try:
-        first_event_id = match_events[0]['event_id']
-        file_name = f"match_events_{first_event_id}.json"
-        s3 = boto3.client('s3')
-        s3.put_object(Bucket=S3_BUCKET_NAME,
-                      Key=file_name,
-                      Body=json.dumps(match_events).encode('utf-8'))
+        writer = ParallelBatchWriter(DYNAMODB_TABLE_NAME)
+        metrics = writer.write(
+            match_event | enriched_data.get(match_event['event_id'], {})
+            for match_event in match_events)
+        print(f"Wrote Match data to DynamoDB: {metrics}")
     except Exception as ex:
-        print(f"Error writing Match events to S3 bucket: {str(ex)}")
+        print(f"Error writing Match data to DynamoDB: {str(ex)}")
         raise ex
 
     return {
-        "statusCode": 200
+        "statusCode": 200,
+        "quarantined": len(quarantine)
     }
+
+def get_match_event(item: Any) -> Dict[str, Any]:
+    """
+    Returns a Match event of a batch
+    :param item: Match event or its JSON
+    :return: Match event
+    :raises ValueError: If the Match event has no valid event_id key
+    """
+    match_event = json.loads(item) if isinstance(item, str) else item
+    event_id = match_event.get('event_id')
+    if not isinstance(event_id, str) or not event_id:
+        raise ValueError(f"Invalid event_id: {event_id!r}")
+    return match_event
@@ -0,0 +1,186 @@
+import io
+import os
+import json
+import gzip
+from datetime import datetime, timezone
+from concurrent.futures import Executor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Raw Match events are archived as gzip NDJSON objects in a Hive-style
+# layout, queries and backfills read only the partitions they need:
+# <prefix>season=<season>/date=<UTC date>/match_id=<match_id>/<batch name>.ndjson.gz
+# A manifest per date and batch lists the objects written by the batch:
+# <prefix>_manifest/date=<UTC date>/<batch name>.json
+ARCHIVE_PREFIX = os.getenv('ARCHIVE_PREFIX', 'archive/')
+
+PARTITION_KEYS = ('season', 'date', 'match_id')
+# Partition value of Match events without a season or a valid timestamp
+DEFAULT_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+# Query engines skip prefixes starting with an underscore
+MANIFEST_DIR = '_manifest'
+ARCHIVE_SUFFIX = '.ndjson.gz'
+MANIFEST_SUFFIX = '.json'
+ARCHIVE_COMPRESS_LEVEL = 6
+
+def get_partition(match_event: Dict[str, Any], season: Optional[str]) -> Tuple[str, str, str]:
+    """
+    Returns the archive partition of a Match event
+    :param match_event: Match event
+    :param season: European league season of the Match event
+    :return: Season, UTC date and match_id
+    """
+    try:
+        date = datetime.strptime(match_event['timestamp'], "%Y-%m-%dT%H:%M:%S%z")
+        date = date.astimezone(timezone.utc).strftime("%Y-%m-%d")
+    except (KeyError, TypeError, ValueError):
+        date = DEFAULT_PARTITION
+    return season or DEFAULT_PARTITION, date, match_event['match_id']
+
+def get_partition_prefix(season: Optional[str] = None, date: Optional[str] = None,
+                         match_id: Optional[str] = None) -> str:
+    """
+    Returns the key prefix of a partition, up to the first value not given
+    :return: Key prefix
+    """
+    prefix = ARCHIVE_PREFIX
+    for key, value in zip(PARTITION_KEYS, (season, date, match_id)):
+        if value is None:
+            break
+        prefix += f"{key}={value}/"
+    return prefix
+
+def get_manifest_prefix(date: str) -> str:
+    """
+    Returns the key prefix of the manifests of a date
+    :param date: UTC date
+    :return: Key prefix
+    """
+    return f"{ARCHIVE_PREFIX}{MANIFEST_DIR}/date={date}/"
+
+def parse_partition(key: str) -> Dict[str, str]:
+    """
+    Returns the partition values of an archive object key
+    :param key: Object key
+    :return: Values by partition key
+    """
+    values = {}
+    for part in key[len(ARCHIVE_PREFIX):].split('/')[:-1]:
+        name, _, value = part.partition('=')
+        if name in PARTITION_KEYS:
+            values[name] = value
+    return values
+
+def write_archive(s3: Any, bucket: str, match_events: List[Dict[str, Any]],
+                  seasons: Dict[str, str], name: str,
+                  executor: Optional[Executor] = None) -> List[Dict[str, Any]]:
+    """
+    Writes raw Match events of a batch to their archive partitions
+    Objects of a partition are written in parallel, manifests after them
+    :param s3: S3 client
+    :param bucket: S3 bucket name
+    :param match_events: Raw Match events
+    :param seasons: Season by event_id
+    :param name: Batch name, the same name overwrites the objects of a retry
+    :param executor: Thread pool of parallel writes
+    :return: Written objects: key, partition values, Match events and bytes
+    """
+    partitions = {}
+    for match_event in match_events:
+        partition = get_partition(match_event, seasons.get(match_event['event_id']))
+        partitions.setdefault(partition, []).append(match_event)
+
+    def put_partition(partition: Tuple[str, str, str]) -> Dict[str, Any]:
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode='wb',
+                           compresslevel=ARCHIVE_COMPRESS_LEVEL, mtime=0) as file:
+            for match_event in partitions[partition]:
+                file.write(json.dumps(match_event).encode('utf-8'))
+                file.write(b'\n')
+        key = f"{get_partition_prefix(*partition)}{name}{ARCHIVE_SUFFIX}"
+        s3.put_object(Bucket=bucket, Key=key, Body=buffer.getvalue(),
+                      ContentEncoding='gzip', ContentType='application/x-ndjson')
+        return {
+            "key": key,
+            **dict(zip(PARTITION_KEYS, partition)),
+            "count": len(partitions[partition]),
+            "bytes": buffer.tell()
+        }
+
+    if executor is not None and len(partitions) > 1:
+        objects = list(executor.map(put_partition, partitions))
+    else:
+        objects = [put_partition(partition) for partition in partitions]
+
+    # Objects are listed in the manifest of their date once written
+    manifests = {}
+    for archived in objects:
+        manifests.setdefault(archived['date'], []).append(archived)
+    for date, date_objects in manifests.items():
+        s3.put_object(Bucket=bucket,
+                      Key=f"{get_manifest_prefix(date)}{name}{MANIFEST_SUFFIX}",
+                      Body=json.dumps({ "batch": name, "objects": date_objects }).encode('utf-8'),
+                      ContentType='application/json')
+    return objects
+
+def list_keys(s3: Any, bucket: str, prefix: str) -> Iterator[str]:
+    """
+    Lists object keys of a prefix
+    :return: Object keys
+    """
+    kwargs = { "Bucket": bucket, "Prefix": prefix }
+    while True:
+        response = s3.list_objects_v2(**kwargs)
+        for item in response.get('Contents', []):
+            yield item['Key']
+        if not response.get('IsTruncated'):
+            return
+        kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+def list_objects(s3: Any, bucket: str, seasons: Optional[Iterable[str]] = None,
+                 dates: Optional[Iterable[str]] = None,
+                 match_ids: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Lists archive objects of the partitions of a query
+    Dates are read from their manifests, seasons are listed by their
+    prefixes, other partitions are never listed
+    :param s3: S3 client
+    :param bucket: S3 bucket name
+    :param seasons: Seasons, all if not given
+    :param dates: UTC dates, all if not given
+    :param match_ids: Match ids, all if not given
+    :return: Objects: key and partition values
+    """
+    seasons = set(seasons) if seasons else None
+    match_ids = set(match_ids) if match_ids else None
+
+    def selected(archived: Dict[str, Any]) -> bool:
+        return ((seasons is None or archived['season'] in seasons) and
+                (match_ids is None or archived['match_id'] in match_ids))
+
+    if dates:
+        for date in dates:
+            for key in list_keys(s3, bucket, get_manifest_prefix(date)):
+                manifest = json.loads(s3.get_object(Bucket=bucket, Key=key)['Body'].read())
+                yield from (archived for archived in manifest['objects'] if selected(archived))
+        return
+
+    prefixes = [get_partition_prefix(season) for season in sorted(seasons)] if seasons \
+        else [get_partition_prefix()]
+    for prefix in prefixes:
+        for key in list_keys(s3, bucket, prefix):
+            if not key.endswith(ARCHIVE_SUFFIX):
+                continue
+            archived = { "key": key, **parse_partition(key) }
+            if selected(archived):
+                yield archived
+
+def read_match_events(s3: Any, bucket: str, key: str) -> Iterator[Dict[str, Any]]:
+    """
+    Streams the Match events of an archive object
+    :return: Match events
+    """
+    response = s3.get_object(Bucket=bucket, Key=key)
+    with gzip.GzipFile(fileobj=response['Body'], mode='rb') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,176 @@
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# Items of a batch are written by parallel BatchWriteItem requests of 25
+# items over one client and its connection pool, instead of one request
+# after another
+STORE_WRITE_WORKERS = int(os.getenv('STORE_WRITE_WORKERS', '8'))
+# Attempts of a request, unprocessed items and throttled requests are retried
+STORE_WRITE_MAX_ATTEMPTS = int(os.getenv('STORE_WRITE_MAX_ATTEMPTS', '8'))
+# Backoff of retries in seconds, doubled per attempt with full jitter
+STORE_WRITE_BASE_DELAY = float(os.getenv('STORE_WRITE_BASE_DELAY', '0.05'))
+STORE_WRITE_MAX_DELAY = float(os.getenv('STORE_WRITE_MAX_DELAY', '2.0'))
+
+MAX_BATCH_WRITE_ITEMS = 25
+THROTTLING_ERROR_CODES = frozenset({
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded'
+})
+
+# Attempts of botocore per request of clients without their own retries
+BOTOCORE_MAX_ATTEMPTS = 3
+
+_clients: Dict[int, Any] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+
+class BatchWriteError(Exception):
+    """
+    Items left unprocessed after all attempts
+    """
+
+def get_client(max_attempts: int = 1) -> Any:
+    """
+    Returns the DynamoDB client, reused by warm invocations
+    The client of a Table resource takes Python types, its connection pool
+    has a connection per worker. ParallelBatchWriter retries requests
+    itself, botocore retries on top would multiply its attempts and hide
+    throttles from its metrics
+    :param max_attempts: Attempts of botocore per request, 1 disables its retries
+    :return: DynamoDB client
+    """
+    client = _clients.get(max_attempts)
+    if client is None:
+        import boto3
+        from botocore.config import Config
+
+        config = Config(max_pool_connections=max(STORE_WRITE_WORKERS, 10),
+                        retries={ "mode": "standard", "total_max_attempts": max_attempts })
+        client = boto3.resource('dynamodb', config=config).meta.client
+        _clients[max_attempts] = client
+    return client
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Returns the writing thread pool, reused by warm invocations
+    :return: Thread pool
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=STORE_WRITE_WORKERS,
+                                       thread_name_prefix='write')
+    return _executor
+
+class ParallelBatchWriter:
+    """
+    Writes items to a DynamoDB table with parallel BatchWriteItem requests
+    Throttling raises a delay shared by the workers, which paces new
+    requests and decays while requests succeed
+    """
+    def __init__(self, table_name: str, key_names: Sequence[str] = ('event_id',),
+                 client: Any = None, executor: Optional[ThreadPoolExecutor] = None,
+                 max_attempts: int = STORE_WRITE_MAX_ATTEMPTS,
+                 base_delay: float = STORE_WRITE_BASE_DELAY,
+                 max_delay: float = STORE_WRITE_MAX_DELAY) -> None:
+        self.table_name = table_name
+        self.key_names = tuple(key_names)
+        self._client = client
+        self._executor = executor
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._delay = 0.0
+        self._lock = threading.Lock()
+
+    def write(self, items: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Writes items, the last item of a key wins like single puts
+        :param items: Items of the table
+        :return: Metrics: requests, items, retries, throttles and throughput
+        :raises BatchWriteError: If items are left unprocessed
+        """
+        # A request must not contain an item key twice
+        by_key = {}
+        for item in items:
+            by_key[tuple(item[name] for name in self.key_names)] = item
+        unique_items = list(by_key.values())
+        chunks = [unique_items[start:start + MAX_BATCH_WRITE_ITEMS]
+                  for start in range(0, len(unique_items), MAX_BATCH_WRITE_ITEMS)]
+
+        started = time.perf_counter()
+        executor = self._executor or get_executor()
+        results = list(executor.map(self._write_chunk, chunks))
+        seconds = time.perf_counter() - started
+
+        metrics = {
+            "items": len(unique_items),
+            "requests": sum(result["requests"] for result in results),
+            "retries": sum(result["requests"] for result in results) - len(chunks),
+            "throttles": sum(result["throttles"] for result in results),
+            "seconds": round(seconds, 3),
+            "items_per_second": round(len(unique_items) / seconds) if seconds else 0,
+            "max_request_ms": round(max((result["max_request_ms"] for result in results), default=0), 1)
+        }
+        unprocessed = sum(result["unprocessed"] for result in results)
+        if unprocessed:
+            raise BatchWriteError(f"Items left unprocessed: {unprocessed}, metrics: {metrics}")
+        return metrics
+
+    def _write_chunk(self, chunk: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Writes a chunk of items, retries unprocessed items and throttled requests
+        :param chunk: Up to 25 items
+        :return: Metrics of the chunk and the number of items left unprocessed
+        """
+        result = { "requests": 0, "throttles": 0, "max_request_ms": 0.0, "unprocessed": 0 }
+        requests = [{ "PutRequest": { "Item": item } } for item in chunk]
+        for attempt in range(self.max_attempts):
+            if attempt:
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))))
+            self._pace()
+
+            started = time.perf_counter()
+            result["requests"] += 1
+            try:
+                response = (self._client or get_client()).batch_write_item(
+                    RequestItems={ self.table_name: requests })
+                requests = response.get('UnprocessedItems', {}).get(self.table_name, [])
+            except Exception as ex:
+                code = getattr(ex, 'response', {}).get('Error', {}).get('Code')
+                if code not in THROTTLING_ERROR_CODES:
+                    raise ex
+            finally:
+                result["max_request_ms"] = max(result["max_request_ms"],
+                                               (time.perf_counter() - started) * 1000)
+
+            if not requests:
+                self._adapt(throttled=False)
+                return result
+            # Unprocessed items are throttled writes of the table or partition
+            result["throttles"] += 1
+            self._adapt(throttled=True)
+
+        result["unprocessed"] = len(requests)
+        return result
+
+    def _pace(self) -> None:
+        """
+        Waits the shared delay of throttled requests with jitter
+        """
+        delay = self._delay
+        if delay:
+            time.sleep(random.uniform(delay / 2, delay))
+
+    def _adapt(self, throttled: bool) -> None:
+        """
+        Raises the shared delay by half when throttled, halves it on success
+        """
+        with self._lock:
+            if throttled:
+                self._delay = min(self.max_delay, max(self.base_delay, self._delay * 1.5))
+            elif self._delay:
+                self._delay = self._delay / 2 if self._delay / 2 >= self.base_delay / 4 else 0.0
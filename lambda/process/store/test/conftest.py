@@ -0,0 +1,100 @@
+import io
+import os
+import sys
+import threading
+
+import pytest
+
+# Modules shared by the processing Lambdas are bundled next to their handlers,
+# tests import them from lambda/process/shared
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'shared'))
+
+class LocalS3:
+    """
+    Local S3 stand-in, keeps objects in memory and records listed prefixes
+    """
+    def __init__(self):
+        self.objects = {}
+        self.listed = []
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = bytes(Body)
+
+    def get_object(self, Bucket, Key):
+        return { "Body": io.BytesIO(self.objects[(Bucket, Key)]) }
+
+    def list_objects_v2(self, Bucket, Prefix, ContinuationToken=None):
+        self.listed.append(Prefix)
+        keys = sorted(key for bucket, key in self.objects
+                      if bucket == Bucket and key.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        response = { "Contents": [{ "Key": key } for key in keys[start:start + 2]] }
+        if start + 2 < len(keys):
+            response.update(IsTruncated=True, NextContinuationToken=str(start + 2))
+        return response
+
+class ThrottlingError(Exception):
+    def __init__(self):
+        super().__init__("Rate of requests exceeds the allowed throughput")
+        self.response = { "Error": { "Code": "ProvisionedThroughputExceededException" } }
+
+class LocalDynamoDB:
+    """
+    Local DynamoDB stand-in, leaves every other item unprocessed the first
+    time it is written and throttles every fifth request
+    """
+    def __init__(self):
+        self.items = {}
+        self.attempted = set()
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def batch_write_item(self, RequestItems):
+        (table, requests), = RequestItems.items()
+        assert len(requests) <= 25
+        keys = [request["PutRequest"]["Item"]["event_id"] for request in requests]
+        assert len(keys) == len(set(keys))
+        with self._lock:
+            self.requests += 1
+            request_number = self.requests
+        if request_number % 5 == 0:
+            raise ThrottlingError()
+
+        unprocessed = []
+        with self._lock:
+            for index, request in enumerate(requests):
+                item = request["PutRequest"]["Item"]
+                if index % 2 and item["event_id"] not in self.attempted:
+                    self.attempted.add(item["event_id"])
+                    unprocessed.append(request)
+                else:
+                    self.items[item["event_id"]] = item
+        return { "UnprocessedItems": { table: unprocessed } if unprocessed else {} }
+
+class ThrottledDynamoDB:
+    """
+    Local DynamoDB stand-in throttling every request
+    """
+    def batch_write_item(self, RequestItems):
+        raise ThrottlingError()
+
+@pytest.fixture
+def s3():
+    """
+    Local S3 client, lists two keys per page
+    """
+    return LocalS3()
+
+@pytest.fixture
+def dynamodb():
+    """
+    Local DynamoDB client leaving items unprocessed and throttling requests
+    """
+    return LocalDynamoDB()
+
+@pytest.fixture
+def throttled_dynamodb():
+    """
+    Local DynamoDB client throttling every request
+    """
+    return ThrottledDynamoDB()
@@ -0,0 +1,73 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from archive import list_objects, read_match_events, write_archive
+
+def make_match_event(match_id, timestamp):
+    return {
+        "event_id": str(uuid.uuid4()),
+        "match_id": match_id,
+        "event_type": "goal",
+        "team": "Team A",
+        "player": "Player 1",
+        "timestamp": timestamp
+    }
+
+def write_batches(s3):
+    batches = {
+        "topic-0-0-0": [
+            make_match_event("000001", "2024-10-15T14:30:00Z"),
+            make_match_event("000001", "2024-10-15T14:35:00Z"),
+            make_match_event("000002", "2024-10-15T23:30:00-02:00"),
+        ],
+        "topic-0-3-0": [
+            make_match_event("000003", "2024-05-01T18:00:00Z"),
+            make_match_event("000001", "2024-10-15T15:00:00Z"),
+        ]
+    }
+    seasons = {}
+    for match_events in batches.values():
+        for match_event in match_events:
+            seasons[match_event["event_id"]] = \
+                "2023-2024" if match_event["timestamp"] < "2024-07" else "2024-2025"
+    with ThreadPoolExecutor(4) as executor:
+        for name, match_events in batches.items():
+            write_archive(s3, "bucket", match_events, seasons, name, executor)
+    return batches
+
+def test_partitioned_layout(s3):
+    """
+    Tests that Match events are written to gzip NDJSON objects of their
+    season, UTC date and match partitions with a manifest per date
+    """
+    batches = write_batches(s3)
+
+    assert sorted(key for _, key in s3.objects) == [
+        "archive/_manifest/date=2024-05-01/topic-0-3-0.json",
+        "archive/_manifest/date=2024-10-15/topic-0-0-0.json",
+        "archive/_manifest/date=2024-10-15/topic-0-3-0.json",
+        "archive/_manifest/date=2024-10-16/topic-0-0-0.json",
+        "archive/season=2023-2024/date=2024-05-01/match_id=000003/topic-0-3-0.ndjson.gz",
+        "archive/season=2024-2025/date=2024-10-15/match_id=000001/topic-0-0-0.ndjson.gz",
+        "archive/season=2024-2025/date=2024-10-15/match_id=000001/topic-0-3-0.ndjson.gz",
+        "archive/season=2024-2025/date=2024-10-16/match_id=000002/topic-0-0-0.ndjson.gz",
+    ]
+    key = "archive/season=2024-2025/date=2024-10-15/match_id=000001/topic-0-0-0.ndjson.gz"
+    assert list(read_match_events(s3, "bucket", key)) == batches["topic-0-0-0"][:2]
+
+def test_partition_pruning(s3):
+    """
+    Tests that only manifests of the dates or prefixes of the seasons of a
+    query are listed
+    """
+    write_batches(s3)
+
+    by_date = list(list_objects(s3, "bucket", dates=["2024-10-15"], match_ids=["000001"]))
+    assert [archived["count"] for archived in by_date] == [2, 1]
+    assert s3.listed == ["archive/_manifest/date=2024-10-15/"]
+
+    s3.listed = []
+    by_season = list(list_objects(s3, "bucket", seasons=["2024-2025"], match_ids=["000002"]))
+    assert [archived["key"] for archived in by_season] == [
+        "archive/season=2024-2025/date=2024-10-16/match_id=000002/topic-0-0-0.ndjson.gz"]
+    assert set(s3.listed) == {"archive/season=2024-2025/"}
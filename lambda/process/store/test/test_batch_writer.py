@@ -0,0 +1,52 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import batch_writer
+from batch_writer import BatchWriteError, ParallelBatchWriter
+
+def make_items(count):
+    return [{ "event_id": str(uuid.uuid4()), "match_id": f"{index % 380:06d}" }
+            for index in range(count)]
+
+def test_parallel_write_with_retries(dynamodb):
+    """
+    Tests that all items are written over parallel requests, unprocessed
+    items and throttled requests are retried
+    """
+    writer = ParallelBatchWriter("table", client=dynamodb, executor=ThreadPoolExecutor(4),
+                                 base_delay=0.0001, max_delay=0.001)
+    items = make_items(1000)
+    items.append(dict(items[0], match_id="updated"))
+
+    metrics = writer.write(items)
+
+    assert len(dynamodb.items) == 1000 and dynamodb.items[items[0]["event_id"]]["match_id"] == "updated"
+    assert metrics["items"] == 1000 and metrics["requests"] == dynamodb.requests
+    assert metrics["throttles"] > 0 and metrics["retries"] == metrics["requests"] - 40
+
+def test_unprocessed_items_fail_the_batch(throttled_dynamodb):
+    """
+    Tests that items left unprocessed after all attempts fail the batch
+    """
+    writer = ParallelBatchWriter("table", client=throttled_dynamodb,
+                                 executor=ThreadPoolExecutor(2), max_attempts=3,
+                                 base_delay=0.0001, max_delay=0.001)
+    with pytest.raises(BatchWriteError):
+        writer.write(make_items(30))
+
+def test_writer_client_without_botocore_retries(monkeypatch):
+    """
+    Tests that the writer client leaves retries to ParallelBatchWriter while
+    the client of the counters keeps botocore retries
+    """
+    monkeypatch.setenv('AWS_DEFAULT_REGION', "us-east-1")
+    monkeypatch.setattr(batch_writer, '_clients', {})
+    writer_client = batch_writer.get_client()
+
+    assert writer_client is batch_writer.get_client()
+    assert writer_client.meta.config.retries["total_max_attempts"] == 1
+    counters_client = batch_writer.get_client(batch_writer.BOTOCORE_MAX_ATTEMPTS)
+    assert counters_client is not writer_client
+    assert counters_client.meta.config.retries["total_max_attempts"] == batch_writer.BOTOCORE_MAX_ATTEMPTS
@@ -0,0 +1,151 @@
+"""
+Rebuilds Match counters from the Match event table
+Counts stored Match events per match, team and player and overwrites those
+counter attributes of the counters table. Team and player counters of a
+match without stored Match events left are removed. Counters of count-only
+event types are kept, their Match events are not stored
+
+Run while the Store Lambda is paused, counts added during the backfill
+are overwritten
+
+Run: PYTHONPATH=../shared python backfill_counters.py --events-table TABLE
+     --counters-table TABLE [--segments N] [--match-ids ID,ID,...] [--dry-run]
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List
+
+import boto3
+
+from counters import (COUNTER_SEPARATOR, add_match_event, get_updates,
+                      is_scoped_counter)
+
+INDEX_NAME = 'MatchIdEventTypeIndex'
+# Attributes counted, names are escaped from DynamoDB reserved words
+PROJECTION = {
+    "ProjectionExpression": "#match_id, #event_type, #team, #player",
+    "ExpressionAttributeNames": {
+        "#match_id": "match_id",
+        "#event_type": "event_type",
+        "#team": "team",
+        "#player": "player"
+    }
+}
+
+def paginate(operation: Any, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Reads all pages of a Scan or Query
+    :param operation: Table scan or query method
+    :return: Items
+    """
+    while True:
+        response = operation(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def count_segment(table_name: str, segment: int, segments: int) -> Dict[str, Dict[str, int]]:
+    """
+    Counts the Match events of a scan segment
+    :return: Counts by attribute name per match_id
+    """
+    # Resources are not thread-safe, each segment gets its own
+    table = boto3.resource('dynamodb').Table(table_name)
+    counters = {}
+    for item in paginate(table.scan, Segment=segment, TotalSegments=segments, **PROJECTION):
+        add_match_event(counters, item)
+    return counters
+
+def count_matches(table: Any, match_ids: List[str]) -> Dict[str, Dict[str, int]]:
+    """
+    Counts the Match events of matches by the match_id index
+    :return: Counts by attribute name per match_id
+    """
+    # Matches without stored Match events get their stale counters removed
+    counters = { match_id: {} for match_id in match_ids }
+    for match_id in match_ids:
+        for item in paginate(table.query, IndexName=INDEX_NAME,
+                             KeyConditionExpression="#match_id = :match_id",
+                             ExpressionAttributeValues={ ":match_id": match_id },
+                             **PROJECTION):
+            add_match_event(counters, item)
+    return counters
+
+def merge(counters: Dict[str, Dict[str, int]], other: Dict[str, Dict[str, int]]) -> None:
+    """
+    Adds counts of another segment
+    """
+    for match_id, counts in other.items():
+        match_counts = counters.setdefault(match_id, {})
+        for name, count in counts.items():
+            match_counts[name] = match_counts.get(name, 0) + count
+
+def get_stale_counters(item: Dict[str, Any], counts: Dict[str, int]) -> List[str]:
+    """
+    Returns counters of a match item the rebuilt counts do not have
+    Team and player counters are of stored event types, so are the match
+    counters of their event types. Other match counters may be of count-only
+    event types and are kept
+    :param item: Match item of the counters table
+    :param counts: Rebuilt counts by attribute name
+    :return: Attribute names to remove
+    """
+    stale = [name for name in item if is_scoped_counter(name) and name not in counts]
+    event_types = { name.split(COUNTER_SEPARATOR, 1)[0] for name in stale }
+    stale.extend(event_type for event_type in sorted(event_types)
+                 if event_type in item and event_type not in counts)
+    return stale
+
+def rebuild_counters(table: Any, counters: Dict[str, Dict[str, int]]) -> Dict[str, int]:
+    """
+    Overwrites the counters of matches and removes their stale counters
+    :param table: Counters table resource
+    :param counters: Rebuilt counts by attribute name per match_id
+    :return: Number of updated matches and of removed counters
+    """
+    stats = { "matches": 0, "removed": 0 }
+    for match_id, counts in counters.items():
+        key = { "match_id": match_id }
+        for update in get_updates(counts, 'SET'):
+            table.update_item(Key=key, **update)
+        item = table.get_item(Key=key, ConsistentRead=True).get('Item', {})
+        stale = get_stale_counters(item, counts)
+        for update in get_updates(dict.fromkeys(stale, 0), 'REMOVE'):
+            table.update_item(Key=key, **update)
+        stats["matches"] += 1
+        stats["removed"] += len(stale)
+    return stats
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events-table', required=True)
+    parser.add_argument('--counters-table', required=True)
+    parser.add_argument('--segments', type=int, default=8,
+                        help="parallel scan segments of the event table")
+    parser.add_argument('--match-ids', help="comma-separated matches, all if not given")
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb')
+    if args.match_ids:
+        counters = count_matches(dynamodb.Table(args.events_table), args.match_ids.split(','))
+    else:
+        counters = {}
+        with ThreadPoolExecutor(max_workers=args.segments) as executor:
+            for segment_counters in executor.map(
+                    lambda segment: count_segment(args.events_table, segment, args.segments),
+                    range(args.segments)):
+                merge(counters, segment_counters)
+    print(f"Counted Match events of {len(counters)} matches")
+
+    if args.dry_run:
+        for match_id, counts in sorted(counters.items()):
+            print(f"{match_id}: {counts}")
+        return
+
+    stats = rebuild_counters(dynamodb.Table(args.counters_table), counters)
+    print(f"Rebuilt counters: {stats}")
+
+if __name__ == '__main__':
+    main()
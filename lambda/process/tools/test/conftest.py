@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+# Modules shared by the processing Lambdas are bundled next to their handlers,
+# tests import them from lambda/process/shared
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'shared'))
+
+class LocalTable:
+    """
+    Local DynamoDB Table stand-in of the counters table, applies SET and
+    REMOVE update expressions
+    """
+    def __init__(self, items=None):
+        self.items = items or {}
+
+    def get_item(self, Key, **kwargs):
+        item = self.items.get(Key["match_id"])
+        return { "Item": dict(item) } if item is not None else {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames,
+                    ExpressionAttributeValues=None):
+        item = self.items.setdefault(Key["match_id"], { "match_id": Key["match_id"] })
+        action, _, expression = UpdateExpression.partition(' ')
+        for clause in expression.split(', '):
+            name, _, value = clause.partition(' = ')
+            if action == 'SET':
+                item[ExpressionAttributeNames[name]] = ExpressionAttributeValues[value]
+            else:
+                assert action == 'REMOVE'
+                item.pop(ExpressionAttributeNames[name], None)
+
+@pytest.fixture
+def counters_table():
+    """
+    Local Table resource of the counters table
+    """
+    return LocalTable()
@@ -0,0 +1,35 @@
+import counters
+from backfill_counters import rebuild_counters
+
+def test_rebuild_removes_stale_counters(monkeypatch, counters_table):
+    """
+    Tests that a rebuild overwrites counters, removes team and player
+    counters and event types without stored Match events and keeps counters
+    of count-only event types
+    """
+    monkeypatch.setattr(counters, 'MAX_UPDATE_COUNTERS', 2)
+    counters_table.items = {
+        "000001": {
+            "match_id": "000001",
+            "pass": 40,
+            "goal": 3, "goal#team#Team A": 3,
+            "goal#player#Player 1": 2, "goal#player#Player 9": 1,
+            "foul": 1, "foul#team#Team B": 1, "foul#player#Player 2": 1
+        },
+        "000002": { "match_id": "000002", "card": 1, "card#team#Team A": 1 }
+    }
+
+    stats = rebuild_counters(counters_table, {
+        "000001": { "goal": 2, "goal#team#Team A": 2, "goal#player#Player 1": 2 },
+        "000002": {}
+    })
+
+    assert stats == { "matches": 2, "removed": 6 }
+    assert counters_table.items == {
+        "000001": {
+            "match_id": "000001",
+            "pass": 40,
+            "goal": 2, "goal#team#Team A": 2, "goal#player#Player 1": 2
+        },
+        "000002": { "match_id": "000002" }
+    }
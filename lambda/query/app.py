@@ -3,7 +3,8 @@ import json
 import boto3
 from typing import Any, Dict
 
-TABLE_NAME = os.getenv('DYNAMODB_TABLE_NAME')
+# Match counters, one item per match_id with a counter attribute per event type
+COUNTERS_TABLE_NAME = os.getenv('COUNTERS_TABLE_NAME')
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
@@ -35,23 +36,20 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         event_type = 'pass'
     print(f"Received match_id: {match_id}, event_type: {event_type}")
 
-    # Run DynamoDB query to get a count of event_type items
+    # Get the event_type counter of the match, the read cost is constant
+    # regardless of the number of Match events
     count: int = 0
     try:
         dynamodb = boto3.resource('dynamodb')
-        table = dynamodb.Table(TABLE_NAME)
+        table = dynamodb.Table(COUNTERS_TABLE_NAME)
 
-        response = table.query(
-            IndexName='MatchIdEventTypeIndex',
-            Select='COUNT',
-            KeyConditionExpression='match_id = :match_id AND event_type = :event_type',
-            ExpressionAttributeValues={
-                ':match_id': match_id,
-                ':event_type': event_type
-            }
+        response = table.get_item(
+            Key={ 'match_id': match_id },
+            ProjectionExpression='#count',
+            ExpressionAttributeNames={ '#count': event_type }
         )
         print(f"Data response: {response}")
-        count = response['Count']
+        count = int(response.get('Item', {}).get(event_type, 0))
     except Exception as ex:
         print(f"DynamoDB error: {ex}")
         raise ex # Internal server error
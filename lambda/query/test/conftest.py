@@ -0,0 +1,41 @@
+from decimal import Decimal
+
+import boto3
+import pytest
+
+class LocalTable:
+    """
+    Local DynamoDB Table stand-in of the counters table, numbers are read
+    as Decimal like the Table resource
+    """
+    def __init__(self):
+        self.items = {}
+        self.requests = []
+
+    def get_item(self, Key, ProjectionExpression, ExpressionAttributeNames):
+        self.requests.append(Key)
+        item = self.items.get(Key["match_id"])
+        if item is None:
+            return {}
+        names = [ExpressionAttributeNames.get(name, name)
+                 for name in ProjectionExpression.split(', ')]
+        return { "Item": { name: Decimal(item[name]) for name in names if name in item } }
+
+class LocalDynamoDB:
+    def __init__(self, table):
+        self.table = table
+        self.table_names = []
+
+    def Table(self, name):
+        self.table_names.append(name)
+        return self.table
+
+@pytest.fixture
+def counters_table(monkeypatch):
+    """
+    Local counters table of the DynamoDB resource
+    """
+    table = LocalTable()
+    dynamodb = LocalDynamoDB(table)
+    monkeypatch.setattr(boto3, 'resource', lambda service_name, **kwargs: dynamodb)
+    return table
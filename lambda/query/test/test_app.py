@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+import app
+
+@pytest.fixture(autouse=True)
+def counters(monkeypatch, counters_table):
+    monkeypatch.setattr(app, 'COUNTERS_TABLE_NAME', "counters")
+    counters_table.items["000001"] = { "match_id": "000001", "goal": 3, "pass": 412,
+                                       "goal#team#Team A": 2 }
+
+def get_count(match_id, path):
+    response = app.handler({
+        "path": f"/matches/{match_id}/{path}",
+        "pathParameters": { "match_id": match_id }
+    }, None)
+    assert response["statusCode"] == 200
+    return json.loads(response["body"])
+
+def test_counter_of_match(counters_table):
+    """
+    Tests that the count of an event type is read from the counter of the match
+    """
+    assert get_count("000001", "goals") == { "match_id": "000001", "event_type": "goal", "count": 3 }
+    assert get_count("000001", "passes")["count"] == 412
+    assert counters_table.requests == [{ "match_id": "000001" }] * 2
+
+def test_missing_match():
+    """
+    Tests that a match without counters has a count of 0
+    """
+    assert get_count("000002", "goals")["count"] == 0
+
+def test_missing_counter():
+    """
+    Tests that an event type without a counter of the match has a count of 0
+    """
+    assert get_count("000001", "cards") == { "match_id": "000001", "event_type": "cards", "count": 0 }
+
+def test_invalid_request():
+    """
+    Tests that a request without a match_id is rejected
+    """
+    response = app.handler({ "path": "/matches/goals", "pathParameters": None }, None)
+    assert response["statusCode"] == 400
@@ -1,3 +1,5 @@
+import * as fs from 'fs';
+import * as path from 'path';
 import * as cdk from 'aws-cdk-lib';
 import { Construct } from 'constructs';
 import * as ec2 from 'aws-cdk-lib/aws-ec2';
@@ -10,6 +12,19 @@ import { NetworkConfig } from './network-stack';
 import { MskConfig } from './msk-stack';
 import { StorageConfig } from './storage-stack';
 
+// Processing Lambdas and the modules they share, see processCode
+const PROCESS_DIR = "./lambda/process";
+// Tests, benchmarks and tools are not deployed
+const PROCESS_EXCLUDES = ["benchmark", "tools", "test", ".pytest_cache", "__pycache__"];
+
+// Copies a directory of lambda/process into an asset, without tests and caches
+function copyProcessDir(name: string, outputDir: string): void {
+  fs.cpSync(path.join(PROCESS_DIR, name), outputDir, {
+    recursive: true,
+    filter: (source: string) => !PROCESS_EXCLUDES.includes(path.basename(source))
+  });
+}
+
 interface AppStackProps extends cdk.StackProps {
   networkConfig: NetworkConfig;
   mskConfig: MskConfig;
@@ -18,6 +33,11 @@ interface AppStackProps extends cdk.StackProps {
   processingBatchSize: number;
   processingBatchWindow: number;
   maxProcessingTime: number;
+  consumeEventTypes: string[];
+  countOnlyEventTypes: string[];
+  processingMode: string;
+  processingShardBytes: number;
+  processingMaxConcurrency: number;
 }
 
 export class FootballMatchDataProcessorStack extends cdk.Stack {
@@ -29,16 +49,27 @@ export class FootballMatchDataProcessorStack extends cdk.Stack {
     const mskCluster = props.mskConfig.cluster;
     const mskEventTopicName = props.mskConfig.eventTopicName;
     const matchEventTable = props.storageConfig.matchEventTable;
+    const matchCounterTable = props.storageConfig.matchCounterTable;
     const matchEventBucket = props.storageConfig.matchEventBucket;
+    const claimCheckPrefix = props.storageConfig.claimCheckPrefix;
+    const quarantinePrefix = props.storageConfig.quarantinePrefix;
+
+    // Batches above the Step Functions payload limit are passed through S3,
+    // records failing to process are quarantined in S3
+    const processingEnvironment = {
+      CLAIM_CHECK_BUCKET: matchEventBucket.bucketName,
+      CLAIM_CHECK_PREFIX: claimCheckPrefix,
+      QUARANTINE_BUCKET: matchEventBucket.bucketName,
+      QUARANTINE_PREFIX: quarantinePrefix
+    };
 
     // Enrich Lambda function to enrich Match events
     // Executed as part of the Step function workflow for demonstration purposes
     const enrichLambda = new lambda.Function(this, "EnrichLambda", {
       runtime: lambda.Runtime.PYTHON_3_12,
       handler: "app.handler",
-      code: lambda.Code.fromAsset(
-        "./lambda/process/enrich"
-      ),
+      code: this.processCode("enrich"),
+      environment: processingEnvironment,
       memorySize: 512,
       timeout: cdk.Duration.seconds(
         props.maxProcessingTime
@@ -50,12 +81,12 @@ export class FootballMatchDataProcessorStack extends cdk.Stack {
     const storeLambda = new lambda.Function(this, "StoreLambda", {
       runtime: lambda.Runtime.PYTHON_3_12,
       handler: "app.handler",
-      code: lambda.Code.fromAsset(
-        "./lambda/process/store"
-      ),
+      code: this.processCode("store"),
       environment: {
         S3_BUCKET_NAME: matchEventBucket.bucketName,
-        DYNAMODB_TABLE_NAME: matchEventTable.tableName
+        DYNAMODB_TABLE_NAME: matchEventTable.tableName,
+        COUNTERS_TABLE_NAME: matchCounterTable.tableName,
+        ...processingEnvironment
       },
       memorySize: 512,
       timeout: cdk.Duration.seconds(
@@ -65,8 +96,15 @@ export class FootballMatchDataProcessorStack extends cdk.Stack {
     
     // Grant Store Lambda write access privileges
     matchEventTable.grantWriteData(storeLambda);
+    matchCounterTable.grantWriteData(storeLambda);
     matchEventBucket.grantWrite(storeLambda);
 
+    // Grant claim-check access: Consume writes batches, Enrich reads them and
+    // writes enriched data, Store reads both
+    matchEventBucket.grantReadWrite(enrichLambda, `${claimCheckPrefix}*`);
+    matchEventBucket.grantRead(storeLambda, `${claimCheckPrefix}*`);
+    matchEventBucket.grantPut(enrichLambda, `${quarantinePrefix}*`);
+
     // Step Function tasks
     const enrichTask = new tasks.LambdaInvoke(this, 'EnrichTask', {
       lambdaFunction: enrichLambda,
@@ -79,8 +117,14 @@ export class FootballMatchDataProcessorStack extends cdk.Stack {
     });
 
     // Step Function state machine
-    const workflowDefinition = enrichTask
-      .next(storeTask);
+    // Shards of a batch are enriched and stored in parallel, bounded by max concurrency
+    const processShards = new sfn.Map(this, 'ProcessShards', {
+      itemsPath: sfn.JsonPath.stringAt('$.shards'),
+      maxConcurrency: props.processingMaxConcurrency,
+      resultPath: sfn.JsonPath.DISCARD
+    });
+    processShards.itemProcessor(enrichTask.next(storeTask));
+    const workflowDefinition = processShards;
 
     const stateMachine = new cdk.aws_stepfunctions.StateMachine(this, 'StateMachine', {
       definitionBody: sfn.DefinitionBody.fromChainable(workflowDefinition),
@@ -88,15 +132,26 @@ export class FootballMatchDataProcessorStack extends cdk.Stack {
     });
 
     // Consume Lambda function to prepare Match events for Batch processing
-    // Uses Step Function State Machine to run the workflow of Batch processing
+    // Uses Step Function State Machine to run the workflow of Batch processing,
+    // or runs the Enrich and Store handlers in-process in the fused mode
+    const fused = props.processingMode === 'fused';
+    const dedupSnapshotKey = 'dedup/event-id-filter.bin.gz';
     const consumeLambda = new lambda.Function(this, "ConsumeLambda", {
       runtime: lambda.Runtime.PYTHON_3_12,
       handler: "app.handler",
-      code: lambda.Code.fromAsset(
-        "./lambda/process/consume"
-      ),
+      code: fused ? this.fusedConsumeCode() : this.processCode("consume"),
       environment: {
-        STATE_MACHINE_ARN: stateMachine.stateMachineArn
+        STATE_MACHINE_ARN: stateMachine.stateMachineArn,
+        CONSUME_EVENT_TYPES: props.consumeEventTypes.join(','),
+        CONSUME_COUNT_ONLY_EVENT_TYPES: props.countOnlyEventTypes.join(','),
+        PROCESSING_MODE: props.processingMode,
+        CONSUME_SHARD_BYTES: props.processingShardBytes.toString(),
+        S3_BUCKET_NAME: matchEventBucket.bucketName,
+        DYNAMODB_TABLE_NAME: matchEventTable.tableName,
+        COUNTERS_TABLE_NAME: matchCounterTable.tableName,
+        CONSUME_DEDUP_SNAPSHOT_BUCKET: matchEventBucket.bucketName,
+        CONSUME_DEDUP_SNAPSHOT_KEY: dedupSnapshotKey,
+        ...processingEnvironment
       },
       vpc: vpc, // Deploy the Lambda function in the same VPC as the MSK cluster
       vpcSubnets: {
@@ -120,6 +175,21 @@ export class FootballMatchDataProcessorStack extends cdk.Stack {
       })
     );
 
+    matchEventBucket.grantPut(consumeLambda, `${claimCheckPrefix}*`);
+    matchEventBucket.grantPut(consumeLambda, `${quarantinePrefix}*`);
+
+    // Grant deduplication access: Consume confirms seen event_ids in the table
+    // and shares its filter through an S3 snapshot
+    matchEventTable.grantReadData(consumeLambda);
+    matchEventBucket.grantReadWrite(consumeLambda, dedupSnapshotKey);
+
+    // Grant the fused Consume Lambda the write access of the Store Lambda
+    if (fused) {
+      matchEventTable.grantWriteData(consumeLambda);
+      matchCounterTable.grantWriteData(consumeLambda);
+      matchEventBucket.grantWrite(consumeLambda);
+    }
+
     // Grant Consume Lambda function permission to start the state machine
     stateMachine.grantStartExecution(consumeLambda);
     
@@ -134,4 +204,54 @@ export class FootballMatchDataProcessorStack extends cdk.Stack {
       })
     );
   }
+
+  // Code of a processing Lambda with the modules of lambda/process/shared
+  // bundled next to its handler, one source of modules shared by the Lambdas
+  private processCode(name: string): lambda.Code {
+    return lambda.Code.fromAsset(PROCESS_DIR, {
+      exclude: PROCESS_EXCLUDES,
+      assetHashType: cdk.AssetHashType.OUTPUT,
+      bundling: {
+        image: lambda.Runtime.PYTHON_3_12.bundlingImage,
+        command: [
+          "bash", "-c",
+          `cp -r ${name}/. shared/. /asset-output/ && rm -rf /asset-output/test`
+        ],
+        local: {
+          tryBundle(outputDir: string): boolean {
+            copyProcessDir(name, outputDir);
+            copyProcessDir("shared", outputDir);
+            return true;
+          }
+        }
+      }
+    });
+  }
+
+  // Consume Lambda code with the Enrich and Store Lambdas bundled into stages/,
+  // the stages import the shared modules of the Consume Lambda
+  private fusedConsumeCode(): lambda.Code {
+    return lambda.Code.fromAsset(PROCESS_DIR, {
+      exclude: PROCESS_EXCLUDES,
+      bundling: {
+        image: lambda.Runtime.PYTHON_3_12.bundlingImage,
+        command: [
+          "bash", "-c",
+          "cp -r consume/. shared/. /asset-output/ && mkdir -p /asset-output/stages && " +
+          "cp -r enrich store /asset-output/stages/ && " +
+          "rm -rf /asset-output/test /asset-output/stages/*/test"
+        ],
+        local: {
+          tryBundle(outputDir: string): boolean {
+            copyProcessDir("consume", outputDir);
+            copyProcessDir("shared", outputDir);
+            for (const stage of ["enrich", "store"]) {
+              copyProcessDir(stage, path.join(outputDir, "stages", stage));
+            }
+            return true;
+          }
+        }
+      }
+    });
+  }
 }
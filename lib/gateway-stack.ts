@@ -1,3 +1,6 @@
+import * as fs from 'fs';
+import * as path from 'path';
+import { execFileSync } from 'child_process';
 import * as cdk from 'aws-cdk-lib';
 import { Construct } from 'constructs';
 import * as iam from 'aws-cdk-lib/aws-iam';
@@ -12,6 +15,9 @@ interface GatewayStackProps extends cdk.StackProps {
   networkConfig: NetworkConfig;
   mskConfig: MskConfig;
   storageConfig: StorageConfig;
+
+  ingestDeliveryMode: string;
+  ingestWireFormat: string;
 }
 
 export class GatewayStack extends cdk.Stack {
@@ -22,16 +28,14 @@ export class GatewayStack extends cdk.Stack {
     const securityGroup = props.networkConfig.securityGroup;
     const mskCluster = props.mskConfig.cluster;
     const mskEventTopicName = props.mskConfig.eventTopicName;
-    const matchEventTable = props.storageConfig.matchEventTable;
+    const matchCounterTable = props.storageConfig.matchCounterTable;
 
     // Ingest Lambda function to ingest Match events
     const ingestLambda = new lambda.Function(this, "IngestLambda", {
       runtime: lambda.Runtime.PYTHON_3_13,
       handler: "app.handler",
       architecture: lambda.Architecture.ARM_64,
-      code: lambda.Code.fromAsset(
-        "./lambda/ingest"
-      ),
+      code: this.ingestCode(),
       // Deploy the function in the same VPC of MSK cluster
       vpc: vpc,
       vpcSubnets: vpc.selectSubnets({
@@ -41,7 +45,9 @@ export class GatewayStack extends cdk.Stack {
       securityGroups: [securityGroup],
       environment: {
         MSK_CLUSTER_ARN: mskCluster.attrArn,
-        MSK_TOPIC_NAME: mskEventTopicName
+        MSK_TOPIC_NAME: mskEventTopicName,
+        INGEST_DELIVERY_MODE: props.ingestDeliveryMode,
+        INGEST_WIRE_FORMAT: props.ingestWireFormat
       },
       memorySize: 256, // Actual memory consumption is about 100 MB
       timeout: cdk.Duration.seconds(30)
@@ -63,15 +69,16 @@ export class GatewayStack extends cdk.Stack {
       runtime: lambda.Runtime.PYTHON_3_12,
       handler: "app.handler",
       code: lambda.Code.fromAsset(
-        "./lambda/query"
+        "./lambda/query",
+        { exclude: ["test", ".pytest_cache", "__pycache__"] } // Tests are not deployed
       ),
       environment: {
-        DYNAMODB_TABLE_NAME: matchEventTable.tableName
+        COUNTERS_TABLE_NAME: matchCounterTable.tableName
       }
     });
 
     // Grant Query Lambda read access privileges
-    matchEventTable.grantReadData(queryLambda);
+    matchCounterTable.grantReadData(queryLambda);
     
     // API Gateway endpoint to ingest Match events
     const apiName = "FootballMatchDataProcessorApi";
@@ -90,6 +97,10 @@ export class GatewayStack extends cdk.Stack {
     const ingestResource = matchesResource.addResource('event');
     ingestResource.addMethod("POST", ingestLambdaIntegration);
 
+    // Create resource for the endpoint: POST matches/events
+    const ingestBatchResource = matchesResource.addResource('events');
+    ingestBatchResource.addMethod("POST", ingestLambdaIntegration);
+
     // Create resource for the endpoint: GET matches/{match_id}/goals
     const matchResource = matchesResource.addResource('{match_id}');
     const goalsResource = matchResource.addResource('goals');
@@ -99,4 +110,51 @@ export class GatewayStack extends cdk.Stack {
     const passesResource = matchResource.addResource('passes');
     passesResource.addMethod("GET", queryLambdaIntegration);
   }
+
+  // Ingest Lambda code with the patches of vendored packages applied,
+  // see lambda/ingest/patches, and the modules and trained zstd dictionaries
+  // it shares with the Consume Lambda copied from lambda/process/shared.
+  // Tests, benchmarks and the
+  // standalone server are not deployed. The asset is hashed by its bundled
+  // output, so editing only a patch or a shared module redeploys the Lambda
+  private ingestCode(): lambda.Code {
+    const lambdaDir = "./lambda";
+    const ingestDir = path.join(lambdaDir, "ingest");
+    const sharedDir = path.posix.join("process", "shared");
+    const sharedModules = ["wire_format.py", "zstd_dictionary.py"].map(name => path.posix.join(sharedDir, name));
+    const dictionariesDir = path.posix.join(sharedDir, "dictionaries");
+    const excluded = ["test", "benchmark", "server.py", "patches", ".pytest_cache"];
+    const notExcluded = (source: string) => !excluded.includes(path.basename(source));
+    return lambda.Code.fromAsset(lambdaDir, {
+      exclude: excluded,
+      assetHashType: cdk.AssetHashType.OUTPUT,
+      bundling: {
+        image: lambda.Runtime.PYTHON_3_13.bundlingImage,
+        command: [
+          "bash", "-c",
+          `cp -r ingest/. ${sharedModules.join(" ")} /asset-output/ && ` +
+          `if [ -d ${dictionariesDir} ]; then cp -r ${dictionariesDir} /asset-output/; fi && cd /asset-output && ` +
+          "for file in patches/*.patch; do patch -p1 --forward < \"$file\" || exit 1; done && " +
+          `rm -rf ${excluded.join(" ")}`
+        ],
+        local: {
+          tryBundle(outputDir: string): boolean {
+            fs.cpSync(ingestDir, outputDir, { recursive: true, filter: notExcluded });
+            for (const sharedModule of sharedModules) {
+              fs.copyFileSync(path.join(lambdaDir, sharedModule), path.join(outputDir, path.basename(sharedModule)));
+            }
+            if (fs.existsSync(path.join(lambdaDir, dictionariesDir))) {
+              fs.cpSync(path.join(lambdaDir, dictionariesDir), path.join(outputDir, "dictionaries"), { recursive: true });
+            }
+            const patchesDir = path.join(ingestDir, "patches");
+            for (const file of fs.readdirSync(patchesDir).filter(name => name.endsWith(".patch")).sort()) {
+              execFileSync("patch", ["-p1", "--forward", "-i", path.resolve(patchesDir, file)],
+                { cwd: outputDir, stdio: "inherit" });
+            }
+            return true;
+          }
+        }
+      }
+    });
+  }
 }
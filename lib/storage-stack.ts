@@ -12,6 +12,9 @@ interface StorageStackProps extends cdk.StackProps {
 export interface StorageConfig {
   matchEventBucket: s3.Bucket;
   matchEventTable: dynamodb.Table;
+  matchCounterTable: dynamodb.Table;
+  claimCheckPrefix: string;
+  quarantinePrefix: string;
 }
 
 export class StorageStack extends cdk.Stack {
@@ -30,6 +33,19 @@ export class StorageStack extends cdk.Stack {
       blockPublicAccess: s3.BlockPublicAccess.BLOCK_ALL,
     });
 
+    // Claim-check objects of large processing batches are read once
+    // by the workflow, they expire after a day
+    const claimCheckPrefix = 'claim-check/';
+    matchEventBucket.addLifecycleRule({
+      prefix: claimCheckPrefix,
+      expiration: cdk.Duration.days(1),
+      noncurrentVersionExpiration: cdk.Duration.days(1)
+    });
+
+    // Records failing to process are quarantined with their error for
+    // inspection and replay, they are kept until deleted
+    const quarantinePrefix = 'quarantine/';
+
     // DynamoDB table to store enriched Match events
     const matchEventTable = new dynamodb.Table(this, "MatchEventTable", {
       partitionKey: {
@@ -54,9 +70,23 @@ export class StorageStack extends cdk.Stack {
       projectionType: dynamodb.ProjectionType.ALL
     });
 
+    // DynamoDB table of Match counters, one item per match with a counter
+    // attribute per event type, team and player, added per batch.
+    // Markers of applied batches expire by TTL
+    const matchCounterTable = new dynamodb.Table(this, "MatchCounterTable", {
+      partitionKey: {
+        name: "match_id", type: dynamodb.AttributeType.STRING
+      },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      timeToLiveAttribute: "expires_at"
+    });
+
     this.config = {
       matchEventBucket,
-      matchEventTable
+      matchEventTable,
+      matchCounterTable,
+      claimCheckPrefix,
+      quarantinePrefix
     };
   }
 }
@@ -37,7 +37,7 @@ test('Storage Stack is created with correct bucket name', () => {
 
   const template = Template.fromStack(storageStack);
   template.hasResource('AWS::S3::Bucket', {});
-  template.hasResource('AWS::DynamoDB::Table', {});
+  template.resourceCountIs('AWS::DynamoDB::Table', 2);
 });
 
 test('MSK Stack is created with correct configuration', () => {
@@ -104,6 +104,8 @@ test('Gateway Stack is created with correct dependencies', () => {
     networkConfig: networkStack.config,
     mskConfig: mskStack.config,
     storageConfig: storageStack.config,
+    ingestDeliveryMode: 'leader',
+    ingestWireFormat: 'binary',
   });
 
   expect(gatewayStack).toBeDefined();
@@ -147,7 +149,15 @@ test('Application Stack is created with correct configurations', () => {
     processingBatchSize: 10,
     processingBatchWindow: 3,
     maxProcessingTime: 300,
+    consumeEventTypes: [],
+    countOnlyEventTypes: [],
+    processingMode: 'workflow',
+    processingShardBytes: 131072,
+    processingMaxConcurrency: 8,
   });
 
   expect(appStack).toBeDefined();
+
+  const template = Template.fromStack(appStack);
+  template.resourceCountIs('AWS::StepFunctions::StateMachine', 1);
 });